@@ -1,17 +1,25 @@
+import sys
 import numpy as np
-import tensorflow as tf
 import os
 import math
 import time
 from config import (
     NUM_GAMES_COMPARE,
+    COMPARE_TIME_PER_MOVE,
+    COMPARE_EARLY_STOP,
     SIMS_N,
     Model1_Path,
     Model2_Path,
     Model1_Name,
-    Model2_Name
+    Model2_Name,
+    EVAL_CACHE_SIZE,
+    REVIEW_BACKEND
 )
 from reversi_bitboard_cpp import ReversiBitboard
+from evaluators import load_evaluator, planes_from_boards
+from reversi_mcts_cpp import MCTS as MCTS_CPP, eval_cache
+
+BACKEND = 'daemon' if '--daemon' in sys.argv else REVIEW_BACKEND
 
 def _print_numpy_board(board_1d):
     print("  0 1 2 3 4 5 6 7")
@@ -24,16 +32,6 @@ def _print_numpy_board(board_1d):
             else: row_str += "🟩"
         print(row_str)
 
-def board_to_input_planes_tf(board_1d_tf, current_player_tf):
-    player_plane = tf.zeros((8, 8), dtype=tf.float32)
-    opponent_plane = tf.zeros((8, 8), dtype=tf.float32)
-    board_2d_tf = tf.reshape(board_1d_tf, (8, 8))
-    current_player_mask = tf.cast(tf.equal(board_2d_tf, current_player_tf), tf.float32)
-    opponent_player_mask = tf.cast(tf.equal(board_2d_tf, 3 - current_player_tf), tf.float32)
-    player_plane += current_player_mask
-    opponent_plane += opponent_player_mask
-    return tf.stack([player_plane, opponent_plane], axis=-1)
-
 class MCTSNode:
     def __init__(self, game_board: ReversiBitboard, player, parent=None, move=None, prior_p=0.0):
         self.game_board = game_board
@@ -63,25 +61,15 @@ class MCTS:
     def __init__(self, model, c_puct=1.41):
         self.model = model
         self.c_puct = c_puct
-        self._predict_graph = tf.function(
-            self._predict_internal,
-            input_signature=[
-                tf.TensorSpec(shape=[64], dtype=tf.int8),
-                tf.TensorSpec(shape=(), dtype=tf.int8)
-            ]
-        )
-
-    def _predict_internal(self, board_tensor, player_tensor):
-        input_planes = board_to_input_planes_tf(board_tensor, player_tensor)
-        input_tensor_batch = tf.expand_dims(input_planes, axis=0)
-        policy, value = self.model(input_tensor_batch, training=False)
-        return policy[0], value[0][0]
-
-    def _predict(self, board, player):
-        board_tensor = tf.convert_to_tensor(board, dtype=tf.int8)
-        player_tensor = tf.convert_to_tensor(player, dtype=tf.int8)
-        policy, value = self._predict_graph(board_tensor, player_tensor)
-        return policy.numpy(), value.numpy()
+
+    def _predict(self, game_board, player):
+        cached = eval_cache.lookup(self.model.cache_key, game_board.black_board, game_board.white_board, player)
+        if cached is not None:
+            return cached
+        policy, value = self.model._predict_planes_cpp(planes_from_boards(game_board.board_to_numpy(), player))
+        policy, value = np.asarray(policy)[0], float(np.asarray(value)[0])
+        eval_cache.insert(self.model.cache_key, game_board.black_board, game_board.white_board, player, policy, value)
+        return policy, value
 
     def search(self, game_board: ReversiBitboard, player, num_simulations):
         self.root = MCTSNode(game_board, player)
@@ -107,7 +95,7 @@ class MCTS:
             if not sim_game_board.is_game_over():
                 valid_moves = sim_game_board.get_legal_moves()
                 if valid_moves:
-                    policy, value = self._predict(sim_game_board.board_to_numpy(), sim_player)
+                    policy, value = self._predict(sim_game_board, sim_player)
                     masked_policy = {move: policy[move] for move in valid_moves}
                     policy_sum = sum(masked_policy.values())
                     if policy_sum > 0:
@@ -128,7 +116,7 @@ class MCTS:
                 else:
                     pass_player = 3 - sim_player
                     if sim_game_board.get_legal_moves():
-                        _, value = self._predict(sim_game_board.board_to_numpy(), pass_player)
+                        _, value = self._predict(sim_game_board, pass_player)
                         value = -value
                     else:
                         winner = sim_game_board.get_winner()
@@ -147,16 +135,37 @@ class MCTS:
         return best_move, self.root.children[best_move].n_visits, self.root.children[best_move].q_value
 
 class MCTS_AIPlayer:
-    def __init__(self, model_path, name, sims_per_move):
-        self.model = tf.keras.models.load_model(model_path)
-        self.mcts = MCTS(self.model)
+    def __init__(self, model_path, name, sims_per_move, time_per_move=COMPARE_TIME_PER_MOVE, early_stop=COMPARE_EARLY_STOP):
+        self.model = load_evaluator(model_path, BACKEND)
         self.name = name
         self.sims_per_move = sims_per_move
-        print(f"Initialized AI '{name}'. Model: {model_path}, SimsN: {sims_per_move}")
+        self.time_per_move = time_per_move
+        self.early_stop = early_stop
+        self.total_sims = 0
+        self.total_moves = 0
+        if time_per_move > 0:
+            self.mcts = MCTS_CPP(self.model)
+            print(f"Initialized AI '{name}'. Model: {model_path}, {time_per_move}s per move")
+        elif early_stop:
+            self.mcts = MCTS_CPP(self.model)
+            print(f"Initialized AI '{name}'. Model: {model_path}, SimsN: {sims_per_move} (early stop)")
+        else:
+            self.mcts = MCTS(self.model)
+            print(f"Initialized AI '{name}'. Model: {model_path}, SimsN: {sims_per_move}")
 
+    # Time-controlled players search until the clock runs out, so a faster
+    # backend or model gets more simulations per move.
     def choose_move(self, game_board: ReversiBitboard, player, verbose=False):
-        best_move, visits, q_value = self.mcts.search(game_board, player, self.sims_per_move)
-        return best_move, visits, q_value
+        if self.time_per_move <= 0 and not self.early_stop:
+            return self.mcts.search(game_board, player, self.sims_per_move)
+        sims_per_move = self.sims_per_move if self.time_per_move <= 0 else 0
+        children = self.mcts.search(game_board, player, sims_per_move, time_limit=self.time_per_move, early_stop=self.early_stop).children
+        self.total_sims += self.mcts.simulations_done
+        self.total_moves += 1
+        if not children:
+            return None, 0, 0
+        best_move = max(children.keys(), key=lambda move: children[move].n_visits)
+        return best_move, children[best_move].n_visits, children[best_move].q_value
 
 def simulate_game(player1_ai, player2_ai, verbose=False, black_thinks_like_white=False):
     game_board = ReversiBitboard()
@@ -279,7 +288,13 @@ def run_comparison(model1_path, model1_name, model2_path, model2_name, num_games
     print("\n\nSimulation finish")
     print(f"Total: {end_time - start_time:.2f} sec")
     print("\n--- Results ---")
-    print(f"SimsN : {SIMS_N}")
+    if COMPARE_TIME_PER_MOVE > 0:
+        print(f"Time per move : {COMPARE_TIME_PER_MOVE}s")
+    else:
+        print(f"SimsN : {SIMS_N}")
+    if COMPARE_TIME_PER_MOVE > 0 or COMPARE_EARLY_STOP:
+        for ai in (ai1, ai2):
+            print(f"{ai.name} ave sims per move: {ai.total_sims / max(ai.total_moves, 1):.1f}")
     print(f"{ai1.name} wins: {wins[ai1.name]}")
     print(f"{ai2.name} wins: {wins[ai2.name]}")
     print(f"Draw: {wins['Draw']}")
@@ -297,6 +312,8 @@ def run_comparison(model1_path, model1_name, model2_path, model2_name, num_games
         print(f"{ai2.name} ave Q num: {np.mean(all_q_values_ai2):.4f}")
     else:
         print(f"No Q num data of {ai2.name}")
+    if eval_cache.enabled:
+        print(f"Eval cache: {eval_cache.stats()}")
     print("-----------------")
 
     if wins[ai1.name] > wins[ai2.name]:
@@ -307,6 +324,7 @@ def run_comparison(model1_path, model1_name, model2_path, model2_name, num_games
         return "Draw"
 
 if __name__ == "__main__":
+    eval_cache.resize(EVAL_CACHE_SIZE)
 
     winner_name = run_comparison(Model1_Path, Model1_Name, Model2_Path, Model2_Name, NUM_GAMES_COMPARE, SIMS_N, game_verbose=False, black_thinks_like_white=True)
     print(f"Winner: {winner_name}")
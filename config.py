@@ -8,12 +8,30 @@ TRAINED_MODEL_SAVE_PATH = f'{MODELS_DIR}/18G_07-25-25.h5'
 
 NUM_PARALLEL_GAMES = 8
 SIMS_N = 10
+PLAYOUT_CAP_FULL_PROBABILITY = 1.0  # Playout cap randomization: chance a move gets the full SIMS_N search and is recorded, the others get PLAYOUT_CAP_FAST_SIMS without noise and are played greedily, not recorded
+PLAYOUT_CAP_FAST_SIMS = 2
 C_PUCT = 2.0
 TOTAL_GAMES = 100
 TRAINING_HOURS = 0
 SAVE_DATA_EVERY_N_GAMES = 100
 VS_RANDOM = False
 MCTS_PREDICT_BATCH_SIZE = 2
+MCTS_VIRTUAL_LOSS = 1.0
+MCTS_TT_SIZE = 0  # Transposition table entries (rounded down to a power of two), 0 disables
+MCTS_TT_SHARE_STATS = False
+MCTS_EARLY_STOP = False  # End a search once the most visited move can no longer be overtaken or is the only move
+MCTS_GUMBEL_ACTIONS = 0  # >0: Gumbel root search (sequential halving over this many sampled moves) trained on its improved policy, 0 uses PUCT visits
+EVAL_CACHE_SIZE = 0  # Process-wide NN evaluation cache entries (symmetry-canonical, LRU), 0 disables
+SELF_PLAY_MODE = 'local'  # 'local': model per game, 'persistent': model per worker, 'server': one shared evaluator process, 'lockstep': all games in one process
+INFERENCE_MAX_BATCH_SIZE = 256
+INFERENCE_MAX_WAIT_MS = 5.0
+LOCKSTEP_GAMES = 128
+ENDGAME_SOLVER_EMPTIES = 0  # Self-play plays out positions with this many empty squares or fewer with the exact solver (and MCTS solves such leaves), 0 disables
+INFERENCE_BACKEND = 'keras'  # 'keras', 'tflite' (XNNPACK CPU, converted next to the .h5 on first use), 'numpy', 'daemon' (model_daemon.py)
+TFLITE_NUM_THREADS = 1
+TFLITE_VARIANT = ''  # '' (float32), 'float16' or 'int8' (from export_tflite.py)
+MODEL_DAEMON_SOCKET = '/tmp/reversi_model_daemon.sock'
+MODEL_DAEMON_BACKEND = 'keras'  # Backend the daemon loads models with
 
 # trainModel
 EPOCHS = 50
@@ -27,10 +45,23 @@ NUMS_TO_SHOW = 5
 # Review
 Model_Path = f'{MODELS_DIR}/17G_07-25-25.h5'
 R_SIMS_N = 4
+R_SEARCH_THREADS = 4  # reviewHuman.py: C++ tree-parallel search threads, 0 uses the Python searcher
+R_SEARCH_BATCH_SIZE = 16
+R_TIME_LIMIT = 0.0  # reviewHuman.py: seconds per AI move with the C++ searcher, 0 searches R_SIMS_N simulations
+REVIEW_BACKEND = 'numpy'  # Inference backend of review.py, reviewHuman.py and compare_models.py (see INFERENCE_BACKEND), `--daemon` overrides
 Play_Games_Num = 1000
 
+# export_tflite
+EXPORT_MODEL_PATH = SELF_PLAY_MODEL_PATH
+EXPORT_CALIBRATION_SAMPLES = 500
+EXPORT_VALIDATION_SAMPLES = 2000
+EXPORT_MAX_POLICY_KL = 0.02
+EXPORT_MAX_VALUE_MAE = 0.02
+
 # compare_models
 NUM_GAMES_COMPARE = 100
+COMPARE_TIME_PER_MOVE = 0.0  # Seconds per move (C++ searcher) instead of SIMS_N simulations, 0 disables
+COMPARE_EARLY_STOP = False  # Searches with the C++ searcher and stops them once the move is decided (see MCTS_EARLY_STOP)
 Model1_Path = f'{MODELS_DIR}/15G_07-23-25.h5'
 Model2_Path = f'{MODELS_DIR}/16G_07-24-25.h5'
 Model1_Name = "15G"
@@ -0,0 +1,248 @@
+#include "batch_board.h"
+#include <algorithm>
+#include <cstring>
+#include <stdexcept>
+#include <string>
+
+BatchBoard::BatchBoard(py::ssize_t size) : black(size), white(size), player(size) {
+    std::fill(black.mutable_data(), black.mutable_data() + size, ReversiBitboard::BLACK_INIT_BOARD);
+    std::fill(white.mutable_data(), white.mutable_data() + size, ReversiBitboard::WHITE_INIT_BOARD);
+    std::fill(player.mutable_data(), player.mutable_data() + size, 1);
+}
+
+BatchBoard::BatchBoard(Bitboards black_boards, Bitboards white_boards, Players players)
+    : black(black_boards.size()), white(white_boards.size()), player(players.size()) {
+    if (black_boards.ndim() != 1 || white_boards.ndim() != 1 || players.ndim() != 1 ||
+        black_boards.size() != white_boards.size() || black_boards.size() != players.size()) {
+        throw std::invalid_argument("black, white and player must be 1-D arrays of the same length");
+    }
+    py::ssize_t n = size();
+    for (py::ssize_t i = 0; i < n; ++i) {
+        int8_t p = players.data()[i];
+        if (p != 1 && p != 2) throw std::invalid_argument("player must be 1 or 2 (index " + std::to_string(i) + ")");
+        if (black_boards.data()[i] & white_boards.data()[i]) throw std::invalid_argument("black and white overlap (index " + std::to_string(i) + ")");
+    }
+    std::memcpy(black.mutable_data(), black_boards.data(), n * sizeof(uint64_t));
+    std::memcpy(white.mutable_data(), white_boards.data(), n * sizeof(uint64_t));
+    std::memcpy(player.mutable_data(), players.data(), n * sizeof(int8_t));
+}
+
+ReversiBitboard BatchBoard::board(py::ssize_t index) const {
+    if (index < 0) index += size();
+    if (index < 0 || index >= size()) throw py::index_error("BatchBoard index out of range");
+    ReversiBitboard result;
+    result.black_board = black.data()[index];
+    result.white_board = white.data()[index];
+    result.current_player = player.data()[index];
+    return result;
+}
+
+BatchBoard BatchBoard::copy() const {
+    return BatchBoard(black, white, player);
+}
+
+py::array_t<uint64_t> BatchBoard::legal_moves() const {
+    py::ssize_t n = size();
+    py::array_t<uint64_t> result(n);
+    const uint64_t* b = black.data();
+    const uint64_t* w = white.data();
+    const int8_t* p = player.data();
+    uint64_t* out = result.mutable_data();
+    py::gil_scoped_release release;
+    for (py::ssize_t i = 0; i < n; ++i) {
+        out[i] = p[i] == 1 ? generate_legal_moves(b[i], w[i]) : generate_legal_moves(w[i], b[i]);
+    }
+    return result;
+}
+
+py::array_t<bool> BatchBoard::legal_mask() const {
+    py::ssize_t n = size();
+    py::array_t<bool> result({n, py::ssize_t(ReversiBitboard::BOARD_SIZE)});
+    const uint64_t* b = black.data();
+    const uint64_t* w = white.data();
+    const int8_t* p = player.data();
+    bool* out = result.mutable_data();
+    py::gil_scoped_release release;
+    for (py::ssize_t i = 0; i < n; ++i) {
+        uint64_t moves = p[i] == 1 ? generate_legal_moves(b[i], w[i]) : generate_legal_moves(w[i], b[i]);
+        bool* row = out + i * ReversiBitboard::BOARD_SIZE;
+        for (int square = 0; square < ReversiBitboard::BOARD_SIZE; ++square) {
+            row[square] = (moves >> square) & 1;
+        }
+    }
+    return result;
+}
+
+void BatchBoard::apply_moves(py::array_t<int32_t, py::array::c_style | py::array::forcecast> moves) {
+    py::ssize_t n = size();
+    if (moves.size() != n) throw std::invalid_argument("apply_moves needs one move per position");
+    const int32_t* m = moves.data();
+    uint64_t* b = black.mutable_data();
+    uint64_t* w = white.mutable_data();
+    int8_t* p = player.mutable_data();
+    std::vector<uint64_t> flips(n, 0ULL);
+    py::ssize_t illegal = -1;
+    {
+        py::gil_scoped_release release;
+        for (py::ssize_t i = 0; i < n; ++i) {
+            if (m[i] == -1) {
+                // A pass is only legal when the side to move has no move.
+                uint64_t legal = p[i] == 1 ? generate_legal_moves(b[i], w[i]) : generate_legal_moves(w[i], b[i]);
+                if (legal != 0ULL) {
+                    illegal = i;
+                    break;
+                }
+                continue;
+            }
+            if (m[i] < 0 || m[i] >= ReversiBitboard::BOARD_SIZE || ((b[i] | w[i]) >> m[i]) & 1) {
+                illegal = i;
+                break;
+            }
+            flips[i] = p[i] == 1 ? generate_flips(m[i], b[i], w[i]) : generate_flips(m[i], w[i], b[i]);
+            if (flips[i] == 0ULL) {
+                illegal = i;
+                break;
+            }
+        }
+        if (illegal < 0) {
+            for (py::ssize_t i = 0; i < n; ++i) {
+                if (m[i] != -1) {
+                    uint64_t placed = flips[i] | (1ULL << m[i]);
+                    if (p[i] == 1) {
+                        b[i] |= placed;
+                        w[i] ^= flips[i];
+                    } else {
+                        w[i] |= placed;
+                        b[i] ^= flips[i];
+                    }
+                }
+                p[i] = 3 - p[i];
+            }
+        }
+    }
+    if (illegal >= 0) {
+        throw std::invalid_argument("illegal move " + std::to_string(m[illegal]) + " at index " + std::to_string(illegal));
+    }
+}
+
+py::array_t<bool> BatchBoard::is_game_over() const {
+    py::ssize_t n = size();
+    py::array_t<bool> result(n);
+    const uint64_t* b = black.data();
+    const uint64_t* w = white.data();
+    bool* out = result.mutable_data();
+    py::gil_scoped_release release;
+    for (py::ssize_t i = 0; i < n; ++i) {
+        out[i] = generate_legal_moves(b[i], w[i]) == 0ULL && generate_legal_moves(w[i], b[i]) == 0ULL;
+    }
+    return result;
+}
+
+py::array_t<int32_t> BatchBoard::disc_counts() const {
+    py::ssize_t n = size();
+    py::array_t<int32_t> result({n, py::ssize_t(2)});
+    const uint64_t* b = black.data();
+    const uint64_t* w = white.data();
+    int32_t* out = result.mutable_data();
+    py::gil_scoped_release release;
+    for (py::ssize_t i = 0; i < n; ++i) {
+        out[2 * i] = __builtin_popcountll(b[i]);
+        out[2 * i + 1] = __builtin_popcountll(w[i]);
+    }
+    return result;
+}
+
+py::array_t<int8_t> BatchBoard::winners() const {
+    py::ssize_t n = size();
+    py::array_t<int8_t> result(n);
+    const uint64_t* b = black.data();
+    const uint64_t* w = white.data();
+    int8_t* out = result.mutable_data();
+    py::gil_scoped_release release;
+    for (py::ssize_t i = 0; i < n; ++i) {
+        int black_count = __builtin_popcountll(b[i]);
+        int white_count = __builtin_popcountll(w[i]);
+        out[i] = black_count > white_count ? 1 : (white_count > black_count ? 2 : 0);
+    }
+    return result;
+}
+
+BatchBoard BatchBoard::transform(py::array_t<int8_t, py::array::c_style | py::array::forcecast> symmetries) const {
+    py::ssize_t n = size();
+    if (symmetries.size() != 1 && symmetries.size() != n) {
+        throw std::invalid_argument("transform needs one symmetry or one per position");
+    }
+    const int8_t* s = symmetries.data();
+    for (py::ssize_t i = 0; i < symmetries.size(); ++i) {
+        if (s[i] < 0 || s[i] >= ReversiBitboard::NUM_SYMMETRIES) throw std::invalid_argument("symmetry must be in [0, 8)");
+    }
+    BatchBoard result(n);
+    const uint64_t* b = black.data();
+    const uint64_t* w = white.data();
+    uint64_t* out_b = result.black.mutable_data();
+    uint64_t* out_w = result.white.mutable_data();
+    std::memcpy(result.player.mutable_data(), player.data(), n * sizeof(int8_t));
+    py::ssize_t stride = symmetries.size() == 1 ? 0 : 1;
+    py::gil_scoped_release release;
+    for (py::ssize_t i = 0; i < n; ++i) {
+        out_b[i] = transform_bitboard(s[i * stride], b[i]);
+        out_w[i] = transform_bitboard(s[i * stride], w[i]);
+    }
+    return result;
+}
+
+std::pair<BatchBoard, py::array_t<int8_t>> BatchBoard::canonical() const {
+    py::ssize_t n = size();
+    BatchBoard result(n);
+    py::array_t<int8_t> symmetries(n);
+    const uint64_t* b = black.data();
+    const uint64_t* w = white.data();
+    uint64_t* out_b = result.black.mutable_data();
+    uint64_t* out_w = result.white.mutable_data();
+    int8_t* out_s = symmetries.mutable_data();
+    std::memcpy(result.player.mutable_data(), player.data(), n * sizeof(int8_t));
+    {
+        py::gil_scoped_release release;
+        for (py::ssize_t i = 0; i < n; ++i) {
+            int symmetry = canonical_symmetry(b[i], w[i]);
+            out_s[i] = static_cast<int8_t>(symmetry);
+            out_b[i] = transform_bitboard(symmetry, b[i]);
+            out_w[i] = transform_bitboard(symmetry, w[i]);
+        }
+    }
+    return {std::move(result), symmetries};
+}
+
+py::array_t<uint64_t> BatchBoard::hashes() const {
+    py::ssize_t n = size();
+    py::array_t<uint64_t> result(n);
+    const uint64_t* b = black.data();
+    const uint64_t* w = white.data();
+    const int8_t* p = player.data();
+    uint64_t* out = result.mutable_data();
+    py::gil_scoped_release release;
+    for (py::ssize_t i = 0; i < n; ++i) {
+        out[i] = zobrist_hash(b[i], w[i], p[i]);
+    }
+    return result;
+}
+
+py::array_t<float> BatchBoard::planes() const {
+    py::ssize_t n = size();
+    py::array_t<float> result({n, py::ssize_t(8), py::ssize_t(8), py::ssize_t(2)});
+    const uint64_t* b = black.data();
+    const uint64_t* w = white.data();
+    const int8_t* p = player.data();
+    float* out = result.mutable_data();
+    py::gil_scoped_release release;
+    for (py::ssize_t i = 0; i < n; ++i) {
+        uint64_t own = p[i] == 1 ? b[i] : w[i];
+        uint64_t opponent = p[i] == 1 ? w[i] : b[i];
+        float* planes = out + i * 2 * ReversiBitboard::BOARD_SIZE;
+        for (int square = 0; square < ReversiBitboard::BOARD_SIZE; ++square) {
+            planes[2 * square] = static_cast<float>((own >> square) & 1);
+            planes[2 * square + 1] = static_cast<float>((opponent >> square) & 1);
+        }
+    }
+    return result;
+}
@@ -0,0 +1,52 @@
+#ifndef BATCH_BOARD_H
+#define BATCH_BOARD_H
+
+#include "reversi_bitboard.h"
+#include <utility>
+#include <pybind11/pybind11.h>
+#include <pybind11/numpy.h>
+
+namespace py = pybind11;
+
+// Many positions held as NumPy arrays of black/white bitboards and side to
+// move (1 black, 2 white). Every method handles the whole batch in one call
+// with the GIL released; `black`, `white` and `player` are views that Python
+// can read and write.
+class BatchBoard {
+public:
+    using Bitboards = py::array_t<uint64_t, py::array::c_style | py::array::forcecast>;
+    using Players = py::array_t<int8_t, py::array::c_style | py::array::forcecast>;
+
+    explicit BatchBoard(py::ssize_t size);
+    BatchBoard(Bitboards black, Bitboards white, Players player);
+
+    py::ssize_t size() const { return black.size(); }
+    ReversiBitboard board(py::ssize_t index) const;
+    BatchBoard copy() const;
+
+    py::array_t<uint64_t> legal_moves() const;
+    // Legal moves as a [N, 64] boolean mask, e.g. for masking policies.
+    py::array_t<bool> legal_mask() const;
+    // Plays one move per position in place; -1 passes, which is only legal when
+    // the side to move has no move. Raises without changing anything when a
+    // move is not legal.
+    void apply_moves(py::array_t<int32_t, py::array::c_style | py::array::forcecast> moves);
+    py::array_t<bool> is_game_over() const;
+    // [N, 2] disc counts of black and white.
+    py::array_t<int32_t> disc_counts() const;
+    // 0 draw, 1 black, 2 white, decided by disc count.
+    py::array_t<int8_t> winners() const;
+
+    // `symmetries` holds one symmetry for all positions or one per position.
+    BatchBoard transform(py::array_t<int8_t, py::array::c_style | py::array::forcecast> symmetries) const;
+    std::pair<BatchBoard, py::array_t<int8_t>> canonical() const;
+    py::array_t<uint64_t> hashes() const;
+    // float32 [N, 8, 8, 2] network input planes, side to move first.
+    py::array_t<float> planes() const;
+
+    py::array_t<uint64_t> black;
+    py::array_t<uint64_t> white;
+    py::array_t<int8_t> player;
+};
+
+#endif // BATCH_BOARD_H
@@ -0,0 +1,171 @@
+#include "endgame_solver.h"
+#include <algorithm>
+
+namespace {
+
+const int MAX_SCORE = ReversiBitboard::BOARD_SIZE;
+// Near the leaves ordering and table lookups cost more than the nodes they save.
+const int ORDER_MIN_EMPTIES = 5;
+const int TT_MIN_EMPTIES = 5;
+const uint64_t CORNERS = 0x8100000000000081ULL;
+
+uint64_t mix64(uint64_t x) {
+    x ^= x >> 30;
+    x *= 0xbf58476d1ce4e5b9ULL;
+    x ^= x >> 27;
+    x *= 0x94d049bb133111ebULL;
+    x ^= x >> 31;
+    return x;
+}
+
+inline int final_score(uint64_t player_board, uint64_t enemy_board) {
+    return __builtin_popcountll(player_board) - __builtin_popcountll(enemy_board);
+}
+
+} // namespace
+
+EndgameSolver::EndgameSolver(size_t tt_size) : table_size(1), index_mask(0) {
+    while (table_size * 2 <= tt_size) {
+        table_size *= 2;
+    }
+}
+
+// The table is allocated on the first solve, so a solver that is never used costs nothing.
+void EndgameSolver::allocate() {
+    entries.resize(table_size);
+    index_mask = table_size - 1;
+    clear();
+}
+
+void EndgameSolver::clear() {
+    for (auto& entry : entries) {
+        entry = Entry{0ULL, 0ULL, static_cast<int8_t>(-MAX_SCORE), static_cast<int8_t>(MAX_SCORE), -1};
+    }
+    nodes = 0;
+    tt_hits = 0;
+}
+
+EndgameSolver::Entry& EndgameSolver::slot(uint64_t player_board, uint64_t enemy_board) {
+    return entries[mix64(player_board ^ mix64(enemy_board)) & index_mask];
+}
+
+// Fastest first: moves leaving the opponent the fewest replies go first,
+// corners are preferred and the table move goes before everything.
+int EndgameSolver::order_moves(uint64_t moves, uint64_t player_board, uint64_t enemy_board, int tt_move, int* ordered) const {
+    int keys[ReversiBitboard::BOARD_SIZE];
+    int count = 0;
+    for (; moves != 0ULL; moves &= moves - 1ULL) {
+        int move = __builtin_ctzll(moves);
+        int key;
+        if (move == tt_move) {
+            key = -MAX_SCORE;
+        } else {
+            uint64_t move_mask = 1ULL << move;
+            uint64_t flips = generate_flips(move, player_board, enemy_board);
+            key = 2 * __builtin_popcountll(generate_legal_moves(enemy_board ^ flips, player_board | flips | move_mask));
+            if (move_mask & CORNERS) key -= 3;
+        }
+        int i = count++;
+        for (; i > 0 && keys[i - 1] > key; --i) {
+            keys[i] = keys[i - 1];
+            ordered[i] = ordered[i - 1];
+        }
+        keys[i] = key;
+        ordered[i] = move;
+    }
+    return count;
+}
+
+int EndgameSolver::search(uint64_t player_board, uint64_t enemy_board, int alpha, int beta, bool passed) {
+    nodes++;
+    uint64_t moves = generate_legal_moves(player_board, enemy_board);
+    if (moves == 0ULL) {
+        if (passed) return final_score(player_board, enemy_board);
+        return -search(enemy_board, player_board, -beta, -alpha, true);
+    }
+
+    int empties = __builtin_popcountll(~(player_board | enemy_board));
+    Entry* entry = nullptr;
+    int tt_move = -1;
+    if (empties >= TT_MIN_EMPTIES) {
+        entry = &slot(player_board, enemy_board);
+        if (entry->player_board == player_board && entry->enemy_board == enemy_board) {
+            tt_hits++;
+            if (entry->lower >= beta || entry->lower == entry->upper) return entry->lower;
+            if (entry->upper <= alpha) return entry->upper;
+            alpha = std::max(alpha, static_cast<int>(entry->lower));
+            beta = std::min(beta, static_cast<int>(entry->upper));
+            tt_move = entry->best_move;
+        }
+    }
+
+    int ordered[ReversiBitboard::BOARD_SIZE];
+    int count = 0;
+    if (empties >= ORDER_MIN_EMPTIES) {
+        count = order_moves(moves, player_board, enemy_board, tt_move, ordered);
+    } else {
+        for (; moves != 0ULL; moves &= moves - 1ULL) {
+            ordered[count++] = __builtin_ctzll(moves);
+        }
+    }
+
+    int best_score = -MAX_SCORE - 1;
+    int best_move = ordered[0];
+    for (int i = 0; i < count; ++i) {
+        uint64_t flips = generate_flips(ordered[i], player_board, enemy_board);
+        int score = -search(enemy_board ^ flips, player_board | flips | (1ULL << ordered[i]),
+                            -beta, -std::max(alpha, best_score), false);
+        if (score > best_score) {
+            best_score = score;
+            best_move = ordered[i];
+            if (score >= beta) break;
+        }
+    }
+
+    if (entry != nullptr) {
+        int lower = best_score > alpha ? best_score : -MAX_SCORE;
+        int upper = best_score < beta ? best_score : MAX_SCORE;
+        if (entry->player_board == player_board && entry->enemy_board == enemy_board) {
+            lower = std::max(lower, static_cast<int>(entry->lower));
+            upper = std::min(upper, static_cast<int>(entry->upper));
+        }
+        *entry = Entry{player_board, enemy_board, static_cast<int8_t>(lower), static_cast<int8_t>(upper), static_cast<int8_t>(best_move)};
+    }
+    return best_score;
+}
+
+EndgameResult EndgameSolver::solve(uint64_t player_board, uint64_t enemy_board, bool exact) {
+    if (entries.empty()) allocate();
+    long long start_nodes = nodes;
+    int alpha = exact ? -MAX_SCORE - 1 : -1;
+    int beta = exact ? MAX_SCORE + 1 : 1;
+    EndgameResult result{0, -1, 0};
+
+    uint64_t moves = generate_legal_moves(player_board, enemy_board);
+    if (moves == 0ULL) {
+        result.score = search(player_board, enemy_board, alpha, beta, false);
+    } else {
+        int ordered[ReversiBitboard::BOARD_SIZE];
+        int count = order_moves(moves, player_board, enemy_board, -1, ordered);
+        result.score = -MAX_SCORE - 1;
+        for (int i = 0; i < count; ++i) {
+            uint64_t flips = generate_flips(ordered[i], player_board, enemy_board);
+            int score = -search(enemy_board ^ flips, player_board | flips | (1ULL << ordered[i]),
+                                -beta, -std::max(alpha, result.score), false);
+            if (score > result.score) {
+                result.score = score;
+                result.best_move = ordered[i];
+                if (score >= beta) break;
+            }
+        }
+    }
+    result.nodes = nodes - start_nodes;
+    return result;
+}
+
+EndgameResult EndgameSolver::solve(const ReversiBitboard& board, bool exact) {
+    if (board.current_player == 1) {
+        return solve(board.black_board, board.white_board, exact);
+    }
+    return solve(board.white_board, board.black_board, exact);
+}
@@ -0,0 +1,56 @@
+#ifndef ENDGAME_SOLVER_H
+#define ENDGAME_SOLVER_H
+
+#include "reversi_bitboard.h"
+#include <cstddef>
+#include <cstdint>
+#include <vector>
+
+struct EndgameResult {
+    // Final disc difference (side to move minus opponent) under perfect play.
+    int score;
+    // Best move for the side to move, -1 when it has to pass.
+    int best_move;
+    long long nodes;
+};
+
+// Exact endgame search: fail-soft negamax alpha-beta over raw bitboards with
+// fastest-first move ordering (fewest opponent replies, corners first) and a
+// direct-mapped table of score bounds. Positions are keyed as (own, opponent)
+// discs, so the side to move needs no separate key.
+class EndgameSolver {
+public:
+    explicit EndgameSolver(size_t tt_size = 1 << 20);
+
+    // exact=false searches the window (-1, 1): the sign of the score (win, draw
+    // or loss) is exact but its size is not, which is much faster.
+    EndgameResult solve(uint64_t player_board, uint64_t enemy_board, bool exact = true);
+    EndgameResult solve(const ReversiBitboard& board, bool exact = true);
+    void clear();
+
+    size_t capacity() const { return table_size; }
+
+    long long nodes = 0;
+    long long tt_hits = 0;
+
+private:
+    struct Entry {
+        uint64_t player_board;
+        uint64_t enemy_board;
+        int8_t lower;
+        int8_t upper;
+        int8_t best_move;
+    };
+
+    std::vector<Entry> entries;
+    size_t table_size;
+    size_t index_mask;
+
+    void allocate();
+
+    int search(uint64_t player_board, uint64_t enemy_board, int alpha, int beta, bool passed);
+    int order_moves(uint64_t moves, uint64_t player_board, uint64_t enemy_board, int tt_move, int* ordered) const;
+    Entry& slot(uint64_t player_board, uint64_t enemy_board);
+};
+
+#endif // ENDGAME_SOLVER_H
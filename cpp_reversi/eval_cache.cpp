@@ -0,0 +1,88 @@
+#include "eval_cache.h"
+#include <algorithm>
+#include <cstring>
+
+EvalCache& EvalCache::instance() {
+    static EvalCache cache;
+    return cache;
+}
+
+size_t EvalCache::KeyHash::operator()(const Key& key) const {
+    uint64_t h = key.black_board * 0x9e3779b97f4a7c15ULL;
+    h ^= (key.white_board + 0x632be59bd9b4e019ULL + (h << 6) + (h >> 2));
+    h ^= (key.model_key + static_cast<uint64_t>(key.player) + (h << 6) + (h >> 2));
+    return static_cast<size_t>(h);
+}
+
+EvalCache::Key EvalCache::canonical_key(uint64_t model_key, uint64_t black_board, uint64_t white_board, int player, int& symmetry) {
+    symmetry = canonical_symmetry(black_board, white_board);
+    return Key{model_key, transform_bitboard(symmetry, black_board), transform_bitboard(symmetry, white_board), player};
+}
+
+void EvalCache::resize(size_t max_entries) {
+    std::lock_guard<std::mutex> lock(mutex);
+    capacity = max_entries;
+    while (entries.size() > capacity) {
+        index.erase(entries.back().key);
+        entries.pop_back();
+        evictions++;
+    }
+}
+
+void EvalCache::clear() {
+    std::lock_guard<std::mutex> lock(mutex);
+    entries.clear();
+    index.clear();
+    hits = misses = inserts = evictions = 0;
+}
+
+size_t EvalCache::size() {
+    std::lock_guard<std::mutex> lock(mutex);
+    return entries.size();
+}
+
+bool EvalCache::lookup(uint64_t model_key, uint64_t black_board, uint64_t white_board, int player, float* policy, float& value) {
+    if (!enabled()) return false;
+    int symmetry;
+    Key key = canonical_key(model_key, black_board, white_board, player, symmetry);
+
+    std::lock_guard<std::mutex> lock(mutex);
+    auto it = index.find(key);
+    if (it == index.end()) {
+        misses++;
+        return false;
+    }
+    hits++;
+    entries.splice(entries.begin(), entries, it->second);
+    const Entry& entry = *it->second;
+    for (int square = 0; square < 64; ++square) {
+        policy[square] = entry.policy[transform_square(symmetry, square)];
+    }
+    value = entry.value;
+    return true;
+}
+
+void EvalCache::insert(uint64_t model_key, uint64_t black_board, uint64_t white_board, int player, const float* policy, float value) {
+    if (!enabled()) return;
+    int symmetry;
+    Key key = canonical_key(model_key, black_board, white_board, player, symmetry);
+
+    std::lock_guard<std::mutex> lock(mutex);
+    auto it = index.find(key);
+    if (it != index.end()) {
+        entries.splice(entries.begin(), entries, it->second);
+        return;
+    }
+    entries.push_front(Entry{key, {}, value});
+    Entry& entry = entries.front();
+    for (int square = 0; square < 64; ++square) {
+        entry.policy[transform_square(symmetry, square)] = policy[square];
+    }
+    index[key] = entries.begin();
+    inserts++;
+    while (entries.size() > capacity) {
+        index.erase(entries.back().key);
+        entries.pop_back();
+        evictions++;
+    }
+}
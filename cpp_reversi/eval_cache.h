@@ -0,0 +1,62 @@
+#ifndef EVAL_CACHE_H
+#define EVAL_CACHE_H
+
+#include <cstdint>
+#include <cstddef>
+#include <list>
+#include <mutex>
+#include <unordered_map>
+#include "reversi_bitboard.h"
+
+// Process-wide LRU cache of network outputs. Positions are stored in the
+// canonical form of their 8-fold symmetry group, so a position and its
+// rotations/reflections share one entry; policies are mapped back through the
+// symmetry on lookup. `model_key` keeps the outputs of different models apart.
+class EvalCache {
+public:
+    static EvalCache& instance();
+
+    void resize(size_t max_entries);
+    void clear();
+    bool enabled() const { return capacity > 0; }
+
+    bool lookup(uint64_t model_key, uint64_t black_board, uint64_t white_board, int player, float* policy, float& value);
+    void insert(uint64_t model_key, uint64_t black_board, uint64_t white_board, int player, const float* policy, float value);
+
+    size_t size();
+    size_t max_entries() const { return capacity; }
+
+    long long hits = 0;
+    long long misses = 0;
+    long long inserts = 0;
+    long long evictions = 0;
+
+private:
+    struct Key {
+        uint64_t model_key;
+        uint64_t black_board;
+        uint64_t white_board;
+        int player;
+        bool operator==(const Key& other) const {
+            return model_key == other.model_key && black_board == other.black_board &&
+                   white_board == other.white_board && player == other.player;
+        }
+    };
+    struct KeyHash {
+        size_t operator()(const Key& key) const;
+    };
+    struct Entry {
+        Key key;
+        float policy[64];
+        float value;
+    };
+
+    size_t capacity = 0;
+    std::list<Entry> entries;  // most recently used first
+    std::unordered_map<Key, std::list<Entry>::iterator, KeyHash> index;
+    std::mutex mutex;
+
+    static Key canonical_key(uint64_t model_key, uint64_t black_board, uint64_t white_board, int player, int& symmetry);
+};
+
+#endif // EVAL_CACHE_H
@@ -4,157 +4,1146 @@
 #include <vector>
 #include <limits>
 #include <iostream>
+#include <stdexcept>
+#include <thread>
+#include <mutex>
+#include <condition_variable>
+#include <deque>
+#include <exception>
 #include <pybind11/stl.h>
 
 namespace py = pybind11;
 
+// Gumbel search: sigma(q) = (GUMBEL_C_VISIT + max child visits) * GUMBEL_C_SCALE * q, with q rescaled to [0, 1].
+static const double GUMBEL_C_VISIT = 50.0;
+static const double GUMBEL_C_SCALE = 1.0;
+// Root exploration noise with add_noise outside a Gumbel search: P = (1 - eps) * P + eps * Dir(alpha).
+static const double DIRICHLET_ALPHA = 0.3;
+static const double DIRICHLET_EPSILON = 0.25;
+
 // MCTSNode Implementation
-MCTSNode::MCTSNode(ReversiBitboard board, int p, std::shared_ptr<MCTSNode> parent_node, int m, double prior)
-    : game_board(board), player(p), parent(parent_node), move(m), prior_p(prior), 
-      n_visits(0), q_value(0.0), sum_value(0.0) {
-    is_game_over = game_board.is_game_over();
+ReversiBitboard MCTSNode::to_board() const {
+    ReversiBitboard board;
+    board.black_board = black_board;
+    board.white_board = white_board;
+    board.current_player = player;
+    return board;
 }
 
-double MCTSNode::ucb_score(double c_puct) const {
-    if (n_visits == 0) {
+// Pending visits count as losses for the player choosing this node, so
+// parallel selections in one batch spread over different leaves.
+double MCTSNode::ucb_score(double c_puct, double virtual_loss, int parent_visits) const {
+    int pending = virtual_loss > 0.0 ? pending_visits : 0;
+    int visits = n_visits + pending;
+    if (visits == 0) {
         return std::numeric_limits<double>::infinity();
     }
-    if (auto p = parent.lock()) {
-        return -q_value + c_puct * prior_p * std::sqrt(static_cast<double>(p->n_visits)) / (1 + n_visits);
+    double q = pending > 0 ? (sum_value + virtual_loss * pending) / visits : q_value();
+    if (parent == NONE) {
+        return -q;
+    }
+    return -q + c_puct * prior_p * std::sqrt(static_cast<double>(parent_visits)) / (1 + visits);
+}
+
+void MCTSNode::update(double value) {
+    n_visits++;
+    sum_value += static_cast<float>(value);
+}
+
+// NodePool Implementation
+uint32_t NodePool::add_node(const ReversiBitboard& board, int player, uint32_t parent, int move, double prior) {
+    MCTSNode node;
+    node.black_board = board.black_board;
+    node.white_board = board.white_board;
+    node.prior_p = static_cast<float>(prior);
+    node.sum_value = 0.0f;
+    node.n_visits = 0;
+    node.pending_visits = 0;
+    node.parent = parent;
+    node.first_edge = MCTSNode::NONE;
+    node.num_edges = 0;
+    node.move = static_cast<int8_t>(move);
+    node.player = static_cast<uint8_t>(player);
+    node.is_game_over = board.is_game_over();
+    node.is_solved = node.is_game_over;
+    node.solved_value = 0;
+    if (node.is_game_over) {
+        int own = __builtin_popcountll(player == 1 ? board.black_board : board.white_board);
+        int opponent = __builtin_popcountll(player == 1 ? board.white_board : board.black_board);
+        node.solved_value = static_cast<int8_t>((own > opponent) - (own < opponent));
     }
-    return -q_value;
+    nodes.push_back(node);
+    return static_cast<uint32_t>(nodes.size() - 1);
 }
 
-std::shared_ptr<MCTSNode> MCTSNode::select_child(double c_puct) {
-    std::shared_ptr<MCTSNode> best_child = nullptr;
+void NodePool::add_edges(uint32_t parent, const std::vector<int>& moves, const std::vector<double>& priors) {
+    if (moves.empty()) return;
+    nodes[parent].first_edge = static_cast<uint32_t>(edges.size());
+    nodes[parent].num_edges = static_cast<uint8_t>(moves.size());
+    for (size_t i = 0; i < moves.size(); ++i) {
+        edges.push_back(MCTSEdge{static_cast<float>(priors[i]), MCTSNode::NONE, static_cast<int8_t>(moves[i])});
+    }
+}
+
+uint32_t NodePool::materialize(uint32_t parent, uint32_t edge) {
+    if (edges[edge].child != MCTSNode::NONE) return edges[edge].child;
+    ReversiBitboard board = nodes[parent].to_board();
+    board.apply_move(edges[edge].move);
+    uint32_t child = add_node(board, board.current_player, parent, edges[edge].move, edges[edge].prior);
+    edges[edge].child = child;
+    return child;
+}
+
+// Edges without a child node have no visits and score infinitely high, like
+// unvisited children, so the first of them is taken.
+uint32_t NodePool::select_child(uint32_t index, double c_puct, double virtual_loss) {
+    const MCTSNode& node = nodes[index];
+    int parent_visits = node.n_visits + (virtual_loss > 0.0 ? node.pending_visits : 0);
+    uint32_t best_edge = node.first_edge;
     double max_score = -std::numeric_limits<double>::infinity();
-    for (auto const& [move, child] : children) {
-        double score = child->ucb_score(c_puct);
+    for (uint32_t edge = node.first_edge; edge < node.first_edge + node.num_edges; ++edge) {
+        if (edges[edge].child == MCTSNode::NONE) {
+            best_edge = edge;
+            break;
+        }
+        double score = nodes[edges[edge].child].ucb_score(c_puct, virtual_loss, parent_visits);
         if (score > max_score) {
             max_score = score;
-            best_child = child;
+            best_edge = edge;
         }
     }
-    return best_child;
+    return materialize(index, best_edge);
 }
 
-std::vector<int> MCTSNode::get_legal_moves() {
-    if (!_legal_moves_calculated) {
-        _legal_moves = game_board.get_legal_moves();
-        _legal_moves_calculated = true;
-    }
-    return _legal_moves;
+std::vector<int> NodePool::get_legal_moves(uint32_t index) const {
+    return nodes[index].to_board().get_legal_moves();
 }
 
-bool MCTSNode::is_fully_expanded() {
-    return children.size() > 0 && children.size() == get_legal_moves().size();
+std::vector<int> NodePool::principal_variation(uint32_t index) const {
+    std::vector<int> moves;
+    while (nodes[index].is_expanded()) {
+        const MCTSNode& node = nodes[index];
+        uint32_t best_child = MCTSNode::NONE;
+        int best_visits = 0;
+        for (uint32_t edge = node.first_edge; edge < node.first_edge + node.num_edges; ++edge) {
+            uint32_t child = edges[edge].child;
+            if (child != MCTSNode::NONE && nodes[child].n_visits > best_visits) {
+                best_visits = nodes[child].n_visits;
+                best_child = child;
+            }
+        }
+        if (best_child == MCTSNode::NONE) break;
+        moves.push_back(nodes[best_child].move);
+        index = best_child;
+    }
+    return moves;
 }
 
-void MCTSNode::update(double value) {
-    n_visits++;
-    sum_value += value;
-    q_value = sum_value / n_visits;
+// A model without a `cache_key` gets a new one stored on the object. An address
+// would be reused by the next model allocated there, which would then read this
+// one's cached outputs.
+static uint64_t model_cache_key(py::object& model) {
+    static std::atomic<uint64_t> next_key{1};
+    if (!py::hasattr(model, "cache_key")) {
+        try {
+            model.attr("cache_key") = py::int_(next_key++);
+        } catch (py::error_already_set&) {
+            throw std::invalid_argument("the model needs a cache_key attribute for the evaluation cache");
+        }
+    }
+    return model.attr("cache_key").cast<uint64_t>();
 }
 
 // MCTS Implementation
-MCTS::MCTS(py::object model, double c_puct, int batch_size) 
-    : model(model), c_puct(c_puct), batch_size(batch_size), root(nullptr) {}
+MCTS::MCTS(py::object model, double c_puct, int batch_size, double virtual_loss,
+           size_t tt_size, bool tt_share_stats, const std::string& tt_replacement, int num_threads, int endgame_empties, int gumbel_actions)
+    : reused_visits(0), duplicate_leaves(0), solved_leaves(0), terminal_leaves(0), wasted_evaluations(0), model(model), c_puct(c_puct), batch_size(batch_size), virtual_loss(virtual_loss),
+      num_threads(std::max(1, num_threads)), pool(std::make_shared<NodePool>()), root(MCTSNode::NONE), tt(nullptr), tt_share_stats(tt_share_stats),
+      cache_key(model_cache_key(model)),
+      endgame_empties(endgame_empties), endgame_solver(nullptr), gumbel_actions(gumbel_actions), rng(std::random_device{}()),
+      stop_requested(false), simulations(0), current_best_move(-1), time_limit(0.0), max_nodes(0), progress_interval(0.1), next_progress(0.0), early_stop(false) {
+    if (tt_size > 0) {
+        tt = std::make_unique<TranspositionTable>(tt_size, tt_replacement);
+    }
+    if (endgame_empties > 0) {
+        // Leaf solves are null-window searches of at most endgame_empties squares,
+        // so a small table does; every tree in lockstep self-play has its own.
+        endgame_solver = std::make_unique<EndgameSolver>(static_cast<size_t>(1) << std::min(20, endgame_empties + 4));
+    }
+}
+
+void MCTS::clear_transposition_table() {
+    if (tt) tt->clear();
+}
+
+// Writes the float32 8x8x2 input planes of a node: side to move first, opponent second.
+static void write_input_planes(const MCTSNode& node, float* planes) {
+    uint64_t own = node.player == 1 ? node.black_board : node.white_board;
+    uint64_t opponent = node.player == 1 ? node.white_board : node.black_board;
+    for (int square = 0; square < ReversiBitboard::BOARD_SIZE; ++square) {
+        planes[2 * square] = static_cast<float>((own >> square) & 1);
+        planes[2 * square + 1] = static_cast<float>((opponent >> square) & 1);
+    }
+}
 
-void MCTS::batch_predict(const std::vector<std::shared_ptr<MCTSNode>>& leaf_nodes) {
+// Models exposing `_predict_planes_cpp` get the planes written straight into one
+// reused buffer; others get int8 boards and players through `_predict_internal_cpp`.
+BatchOutput MCTS::evaluate_leaves(py::object& model, const std::vector<const MCTSNode*>& leaf_nodes, py::array_t<float>& planes_buffer) {
+    const py::ssize_t num_leaves = static_cast<py::ssize_t>(leaf_nodes.size());
+    const py::ssize_t plane_size = 2 * ReversiBitboard::BOARD_SIZE;
+    py::tuple result;
+    if (py::hasattr(model, "_predict_planes_cpp")) {
+        if (planes_buffer.ndim() != 4 || planes_buffer.shape(0) < num_leaves) {
+            planes_buffer = py::array_t<float>({num_leaves, py::ssize_t(8), py::ssize_t(8), py::ssize_t(2)});
+        }
+        float* planes = planes_buffer.mutable_data();
+        for (py::ssize_t i = 0; i < num_leaves; ++i) {
+            write_input_planes(*leaf_nodes[i], planes + i * plane_size);
+        }
+        py::array_t<float> planes_view({num_leaves, py::ssize_t(8), py::ssize_t(8), py::ssize_t(2)}, planes, planes_buffer);
+        result = model.attr("_predict_planes_cpp")(planes_view);
+    } else {
+        py::array_t<int8_t> board_batch({num_leaves, py::ssize_t(ReversiBitboard::BOARD_SIZE)});
+        py::array_t<int32_t> player_batch(num_leaves);
+        int8_t* boards = board_batch.mutable_data();
+        int32_t* players = player_batch.mutable_data();
+        for (py::ssize_t i = 0; i < num_leaves; ++i) {
+            const MCTSNode& node = *leaf_nodes[i];
+            for (int square = 0; square < ReversiBitboard::BOARD_SIZE; ++square) {
+                boards[i * ReversiBitboard::BOARD_SIZE + square] =
+                    ((node.black_board >> square) & 1) ? 1 : (((node.white_board >> square) & 1) ? 2 : 0);
+            }
+            players[i] = node.player;
+        }
+        result = model.attr("_predict_internal_cpp")(board_batch, player_batch);
+    }
+
+    BatchOutput output;
+    output.policy = result[0].cast<py::array_t<float, py::array::c_style | py::array::forcecast>>();
+    output.value = result[1].cast<py::array_t<float, py::array::c_style | py::array::forcecast>>();
+    if (output.policy.size() != num_leaves * ReversiBitboard::BOARD_SIZE || output.value.size() != num_leaves) {
+        throw std::runtime_error("model returned outputs that do not match the batch size");
+    }
+    return output;
+}
+
+// Legal moves of a node with their priors renormalised from the network policy.
+static void masked_priors(const MCTSNode& node, const float* policy, std::vector<int>& moves, std::vector<double>& priors) {
+    moves = node.to_board().get_legal_moves();
+    priors.clear();
+    if (moves.empty()) return;
+
+    float sum_policy = 0.0f;
+    for (int move : moves) {
+        sum_policy += policy[move];
+    }
+    if (sum_policy <= 1e-9) sum_policy = 1.0;
+
+    priors.reserve(moves.size());
+    for (int move : moves) {
+        priors.push_back(policy[move] / sum_policy);
+    }
+}
+
+void MCTS::expand_node(uint32_t node, const float* policy) {
+    NodePool& nodes = *pool;
+    if (nodes[node].is_expanded()) return;
+    std::vector<int> valid_moves;
+    std::vector<double> priors;
+    masked_priors(nodes[node], policy, valid_moves, priors);
+    nodes.add_edges(node, valid_moves, priors);
+    if (node == root && root_noise_pending) add_root_noise();
+}
+
+// Noise waits until the root has edges, i.e. after its first evaluation
+// unless the root was reused already expanded.
+void MCTS::start_root_noise(bool add_noise) {
+    restore_root_priors();
+    root_noise_pending = add_noise && !gumbel.active;
+    if (root_noise_pending && (*pool)[root].is_expanded()) add_root_noise();
+}
+
+void MCTS::add_root_noise() {
+    root_noise_pending = false;
+    NodePool& nodes = *pool;
+    const MCTSNode& root_node = nodes[root];
+    if (root_node.num_edges < 2) return;
+    root_network_priors.resize(root_node.num_edges);
+    for (uint32_t i = 0; i < root_node.num_edges; ++i) {
+        root_network_priors[i] = nodes.edges[root_node.first_edge + i].prior;
+    }
+    std::gamma_distribution<double> gamma_distribution(DIRICHLET_ALPHA, 1.0);
+    std::vector<double> noise(root_node.num_edges);
+    double sum_noise = 0.0;
+    for (double& sample : noise) {
+        sample = gamma_distribution(rng);
+        sum_noise += sample;
+    }
+    if (sum_noise <= 0.0) return;
+    for (uint32_t i = 0; i < root_node.num_edges; ++i) {
+        MCTSEdge& edge = nodes.edges[root_node.first_edge + i];
+        edge.prior = static_cast<float>((1.0 - DIRICHLET_EPSILON) * edge.prior + DIRICHLET_EPSILON * noise[i] / sum_noise);
+        if (edge.child != MCTSNode::NONE) nodes[edge.child].prior_p = edge.prior;
+    }
+}
+
+// A root searched again gets its network priors back first, so noise is
+// mixed in once per search instead of compounding.
+void MCTS::restore_root_priors() {
+    if (root_network_priors.empty()) return;
+    NodePool& nodes = *pool;
+    const MCTSNode& root_node = nodes[root];
+    for (uint32_t i = 0; i < root_node.num_edges; ++i) {
+        MCTSEdge& edge = nodes.edges[root_node.first_edge + i];
+        edge.prior = root_network_priors[i];
+        if (edge.child != MCTSNode::NONE) nodes[edge.child].prior_p = edge.prior;
+    }
+    root_network_priors.clear();
+}
+
+// Backup, releasing the pending visits added during selection
+void MCTS::backup(uint32_t node, double value) {
+    NodePool& nodes = *pool;
+    double current_value = value;
+    for (uint32_t temp_node = node; temp_node != MCTSNode::NONE; temp_node = nodes[temp_node].parent) {
+        MCTSNode& n = nodes[temp_node];
+        n.pending_visits--;
+        n.update(current_value);
+        if (tt && tt_share_stats) {
+            tt->add_visit(n.black_board, n.white_board, n.player, current_value);
+        }
+        current_value = -current_value;
+    }
+}
+
+// Leaves near the end of the game, other than the root (which needs children),
+// are backed up with their exact result and never expanded, so later visits
+// reuse the stored result.
+bool MCTS::is_solvable(uint32_t node) const {
+    const MCTSNode& n = (*pool)[node];
+    return endgame_solver && node != root && __builtin_popcountll(~(n.black_board | n.white_board)) <= endgame_empties;
+}
+
+// Only win, draw or loss is needed as a value, so the solver runs with a null window.
+int MCTS::solve_leaf(const MCTSNode& leaf) {
+    uint64_t own = leaf.player == 1 ? leaf.black_board : leaf.white_board;
+    uint64_t opponent = leaf.player == 1 ? leaf.white_board : leaf.black_board;
+    std::lock_guard<std::mutex> lock(solver_mutex);
+    int score = endgame_solver->solve(own, opponent, false).score;
+    return (score > 0) - (score < 0);
+}
+
+// Backs up finished games and solvable endgame leaves without the model.
+bool MCTS::evaluate_exact(uint32_t node) {
+    MCTSNode& n = (*pool)[node];
+    if (!n.is_solved) {
+        if (!is_solvable(node)) return false;
+        n.solved_value = static_cast<int8_t>(solve_leaf(n));
+        n.is_solved = true;
+    }
+    if (n.is_game_over) {
+        terminal_leaves++;
+    } else {
+        solved_leaves++;
+    }
+    backup(node, n.solved_value);
+    return true;
+}
+
+// Expands and backs up a leaf from a stored evaluation instead of the network.
+// With shared statistics the value backed up is the mean over all visits the
+// position has received anywhere in the tree, when there are any.
+bool MCTS::evaluate_from_table(uint32_t node) {
+    const MCTSNode& n = (*pool)[node];
+    const TTEntry* entry = tt->probe(n.black_board, n.white_board, n.player);
+    if (entry == nullptr) return false;
+    double value = entry->value;
+    if (tt_share_stats && entry->n_visits > 0) {
+        value = entry->sum_value / entry->n_visits;
+    }
+    float policy[ReversiBitboard::BOARD_SIZE];
+    std::copy(entry->policy, entry->policy + ReversiBitboard::BOARD_SIZE, policy);
+    expand_node(node, policy);
+    backup(node, value);
+    return true;
+}
+
+bool MCTS::evaluate_from_cache(uint32_t node) {
+    const MCTSNode& n = (*pool)[node];
+    float policy[ReversiBitboard::BOARD_SIZE];
+    float value;
+    if (!EvalCache::instance().lookup(cache_key, n.black_board, n.white_board, n.player, policy, value)) {
+        return false;
+    }
+    if (tt) {
+        tt->store(n.black_board, n.white_board, n.player, policy, value);
+    }
+    expand_node(node, policy);
+    backup(node, value);
+    return true;
+}
+
+void MCTS::expand_and_backup(const std::vector<uint32_t>& leaf_nodes, const float* policy_batch, const float* value_batch) {
+    EvalCache& eval_cache = EvalCache::instance();
+    for (size_t i = 0; i < leaf_nodes.size(); ++i) {
+        uint32_t node = leaf_nodes[i];
+        const float* policy = policy_batch + i * ReversiBitboard::BOARD_SIZE;
+        const MCTSNode& n = (*pool)[node];
+        if (tt) {
+            tt->store(n.black_board, n.white_board, n.player, policy, value_batch[i]);
+        }
+        if (eval_cache.enabled()) {
+            eval_cache.insert(cache_key, n.black_board, n.white_board, n.player, policy, value_batch[i]);
+        }
+        expand_node(node, policy);
+        backup(node, value_batch[i]);
+    }
+}
+
+void MCTS::revert_pending(const std::vector<uint32_t>& leaf_nodes) {
+    NodePool& nodes = *pool;
+    for (uint32_t node : leaf_nodes) {
+        for (uint32_t temp_node = node; temp_node != MCTSNode::NONE; temp_node = nodes[temp_node].parent) {
+            nodes[temp_node].pending_visits--;
+        }
+    }
+}
+
+void MCTS::batch_predict(const std::vector<uint32_t>& leaf_nodes) {
     if (leaf_nodes.empty()) return;
 
+    std::vector<const MCTSNode*> leaf_ptrs;
+    for (uint32_t node : leaf_nodes) {
+        leaf_ptrs.push_back(&(*pool)[node]);
+    }
+
+    py::gil_scoped_acquire acquire;
+    BatchOutput output;
+    try {
+        output = evaluate_leaves(model, leaf_ptrs, planes_buffer);
+    } catch (...) {
+        revert_pending(leaf_nodes);
+        throw;
+    }
+
+    py::gil_scoped_release release;
+    expand_and_backup(leaf_nodes, output.policy.data(), output.value.data());
+}
+
+static bool same_position(const MCTSNode& node, const ReversiBitboard& board, int player) {
+    return node.black_board == board.black_board && node.white_board == board.white_board && node.player == player;
+}
+
+// Looks for the position among the current root and the next two plies, which
+// covers both one searcher per game and one searcher per side.
+uint32_t MCTS::find_subtree(const ReversiBitboard& board, int player) const {
+    if (root == MCTSNode::NONE) return MCTSNode::NONE;
+    const NodePool& nodes = *pool;
+    if (same_position(nodes[root], board, player)) return root;
+    const MCTSNode& root_node = nodes[root];
+    for (uint32_t edge = root_node.first_edge; edge < root_node.first_edge + root_node.num_edges; ++edge) {
+        uint32_t child = nodes.edges[edge].child;
+        if (child != MCTSNode::NONE && same_position(nodes[child], board, player)) return child;
+    }
+    for (uint32_t edge = root_node.first_edge; edge < root_node.first_edge + root_node.num_edges; ++edge) {
+        uint32_t child = nodes.edges[edge].child;
+        if (child == MCTSNode::NONE) continue;
+        const MCTSNode& child_node = nodes[child];
+        for (uint32_t child_edge = child_node.first_edge; child_edge < child_node.first_edge + child_node.num_edges; ++child_edge) {
+            uint32_t grandchild = nodes.edges[child_edge].child;
+            if (grandchild != MCTSNode::NONE && same_position(nodes[grandchild], board, player)) return grandchild;
+        }
+    }
+    return MCTSNode::NONE;
+}
+
+// Copies the subtree under `index` into a fresh pool, breadth first so that
+// edge blocks stay contiguous. Everything outside the subtree is dropped
+// with the old pool.
+void MCTS::promote_to_root(uint32_t index) {
+    if (index == root) {
+        reused_visits = (*pool)[root].n_visits;
+        return;
+    }
+    const NodePool& old_nodes = *pool;
+    auto new_pool = std::make_shared<NodePool>();
+    NodePool& new_nodes = *new_pool;
+
+    new_nodes.nodes.push_back(old_nodes[index]);
+    new_nodes[0].parent = MCTSNode::NONE;
+    std::vector<uint32_t> old_indices = {index};
+    for (uint32_t next = 0; next < new_nodes.size(); ++next) {
+        const MCTSNode& old_node = old_nodes[old_indices[next]];
+        if (!old_node.is_expanded()) continue;
+        new_nodes[next].first_edge = static_cast<uint32_t>(new_nodes.edges.size());
+        for (uint32_t edge = old_node.first_edge; edge < old_node.first_edge + old_node.num_edges; ++edge) {
+            MCTSEdge new_edge = old_nodes.edges[edge];
+            if (new_edge.child != MCTSNode::NONE) {
+                new_nodes.nodes.push_back(old_nodes[new_edge.child]);
+                new_nodes.nodes.back().parent = next;
+                old_indices.push_back(new_edge.child);
+                new_edge.child = static_cast<uint32_t>(new_nodes.size() - 1);
+            }
+            new_nodes.edges.push_back(new_edge);
+        }
+    }
+
+    pool = new_pool;
+    root = 0;
+    reused_visits = (*pool)[root].n_visits;
+    root_network_priors.clear();
+}
+
+void MCTS::new_root(const ReversiBitboard& board, int player) {
+    pool = std::make_shared<NodePool>();
+    root = pool->add_node(board, player, MCTSNode::NONE, -1, 0.0);
+    reused_visits = 0;
+    root_network_priors.clear();
+}
+
+void MCTS::prepare_root(ReversiBitboard& board, int player) {
+    uint32_t subtree = find_subtree(board, player);
+    if (subtree != MCTSNode::NONE) {
+        promote_to_root(subtree);
+    } else {
+        new_root(board, player);
+    }
+    // A leaf solved in an earlier search was never expanded, but the root needs
+    // children, so it starts over from the network.
+    MCTSNode& root_node = (*pool)[root];
+    if (root_node.is_solved && !root_node.is_game_over) {
+        root_node.is_solved = false;
+        root_node.n_visits = 0;
+        root_node.sum_value = 0.0;
+        reused_visits = 0;
+    }
+}
+
+void MCTS::advance(int move) {
+    if (root == MCTSNode::NONE) return;
+    gumbel = GumbelRoot();
+    const MCTSNode& root_node = (*pool)[root];
+    for (uint32_t edge = root_node.first_edge; edge < root_node.first_edge + root_node.num_edges; ++edge) {
+        uint32_t child = pool->edges[edge].child;
+        if (child != MCTSNode::NONE && (*pool)[child].move == move) {
+            promote_to_root(child);
+            return;
+        }
+    }
+    ReversiBitboard new_board = root_node.to_board();
+    new_board.apply_move(move);
+    new_root(new_board, new_board.current_player);
+}
+
+void MCTS::reset() {
+    gumbel = GumbelRoot();
+    pool = std::make_shared<NodePool>();
+    root = MCTSNode::NONE;
+    reused_visits = 0;
+    root_network_priors.clear();
+}
+
+// Descends from the root to a leaf. A node whose only move is a pass gets its
+// forced pass edge on the way down, so the model never sees it.
+uint32_t MCTS::select_leaf() {
+    NodePool& nodes = *pool;
+    uint32_t node = root;
+    if (gumbel.active && nodes[root].is_expanded()) {
+        node = nodes.materialize(root, gumbel.schedule[gumbel.next]);
+    }
+    while (!nodes[node].is_solved) {
+        if (!nodes[node].is_expanded()) {
+            if (nodes[node].to_board().get_legal_moves_bitboard() != 0ULL || is_solvable(node)) break;
+            nodes.add_edges(node, {-1}, {1.0});
+        }
+        node = nodes.select_child(node, c_puct, virtual_loss);
+    }
+    return node;
+}
+
+void MCTS::count_wasted(uint32_t node) {
+    const MCTSNode& n = (*pool)[node];
+    if (n.is_game_over || n.to_board().get_legal_moves_bitboard() == 0ULL) {
+        wasted_evaluations++;
+    }
+}
+
+// Selects up to max_leaves distinct leaves. Selecting a leaf that is already
+// waiting in the batch ends collection early instead of evaluating it twice.
+int MCTS::collect_leaves(int max_leaves, std::vector<uint32_t>& leaf_nodes) {
+    NodePool& nodes = *pool;
+    int collected = 0;
+    while (collected < max_leaves) {
+        // A Gumbel search takes its root moves from the halving schedule, and a
+        // new phase needs the values of the previous one.
+        bool scheduled = gumbel.active && nodes[root].is_expanded();
+        if (scheduled && gumbel.next >= gumbel.schedule.size()) {
+            if (nodes[root].pending_visits > 0) break;
+            next_gumbel_phase();
+        }
+        uint32_t node = select_leaf();
+
+        if (nodes[node].pending_visits > 0) {
+            duplicate_leaves++;
+            break;
+        }
+
+        for (uint32_t temp_node = node; temp_node != MCTSNode::NONE; temp_node = nodes[temp_node].parent) {
+            nodes[temp_node].pending_visits++;
+        }
+        collected++;
+        if (scheduled) gumbel.next++;
+        if (evaluate_exact(node)) {
+            continue;
+        }
+        if (tt && evaluate_from_table(node)) {
+            continue;
+        }
+        if (EvalCache::instance().enabled() && evaluate_from_cache(node)) {
+            continue;
+        }
+        count_wasted(node);
+        leaf_nodes.push_back(node);
+    }
+    return collected;
+}
+
+double MCTS::elapsed() const {
+    return std::chrono::duration<double>(std::chrono::steady_clock::now() - search_start).count();
+}
+
+bool MCTS::budget_exhausted() const {
+    return stop_requested || (time_limit > 0.0 && elapsed() >= time_limit) || (max_nodes > 0 && pool->size() >= max_nodes);
+}
+
+int MCTS::root_best_move() const {
+    const MCTSNode& root_node = (*pool)[root];
+    if (gumbel.started) {
+        std::vector<double> scores = gumbel_scores();
+        uint32_t best = gumbel.candidates[0];
+        for (uint32_t candidate : gumbel.candidates) {
+            if (scores[candidate] > scores[best]) best = candidate;
+        }
+        return pool->edges[root_node.first_edge + best].move;
+    }
+    int best_move = -1;
+    int best_visits = -1;
+    for (uint32_t edge = root_node.first_edge; edge < root_node.first_edge + root_node.num_edges; ++edge) {
+        uint32_t child = pool->edges[edge].child;
+        if (child != MCTSNode::NONE && (*pool)[child].n_visits > best_visits) {
+            best_visits = (*pool)[child].n_visits;
+            best_move = (*pool)[child].move;
+        }
+    }
+    return best_move;
+}
+
+bool MCTS::move_decided(int remaining) const {
+    const MCTSNode& root_node = (*pool)[root];
+    if (!root_node.is_expanded()) return false;
+    if (root_node.num_edges == 1) {
+        uint32_t child = pool->edges[root_node.first_edge].child;
+        return child != MCTSNode::NONE && (*pool)[child].n_visits > 0;
+    }
+    // Sequential halving does not pick the most visited move.
+    if (gumbel.active) return false;
+    int best_visits = 0;
+    int second_visits = 0;
+    for (uint32_t edge = root_node.first_edge; edge < root_node.first_edge + root_node.num_edges; ++edge) {
+        uint32_t child = pool->edges[edge].child;
+        int visits = child != MCTSNode::NONE ? (*pool)[child].n_visits : 0;
+        if (visits > best_visits) {
+            second_visits = best_visits;
+            best_visits = visits;
+        } else if (visits > second_visits) {
+            second_visits = visits;
+        }
+    }
+    return best_visits - second_visits > remaining;
+}
+
+// Every visit to the root after its first went through a child and added
+// minus the child's value, so the children's sums give back the first one.
+double MCTS::root_network_value() const {
+    const MCTSNode& root_node = (*pool)[root];
+    double value = root_node.sum_value;
+    for (uint32_t edge = root_node.first_edge; edge < root_node.first_edge + root_node.num_edges; ++edge) {
+        uint32_t child = pool->edges[edge].child;
+        if (child != MCTSNode::NONE) value += (*pool)[child].sum_value;
+    }
+    return value;
+}
+
+// Unvisited moves get the mixed value: the network value of the root averaged
+// with the prior-weighted Q of the visited moves.
+std::vector<double> MCTS::completed_q_values() const {
+    const MCTSNode& root_node = (*pool)[root];
+    std::vector<double> q_values(root_node.num_edges, 0.0);
+    std::vector<bool> visited(root_node.num_edges, false);
+    double visited_prior = 0.0;
+    double weighted_q = 0.0;
+    int total_visits = 0;
+    for (uint32_t i = 0; i < root_node.num_edges; ++i) {
+        const MCTSEdge& edge = pool->edges[root_node.first_edge + i];
+        if (edge.child == MCTSNode::NONE || (*pool)[edge.child].n_visits == 0) continue;
+        const MCTSNode& child = (*pool)[edge.child];
+        visited[i] = true;
+        q_values[i] = -child.q_value();
+        visited_prior += edge.prior;
+        weighted_q += edge.prior * q_values[i];
+        total_visits += child.n_visits;
+    }
+    double mixed_value = root_network_value();
+    if (total_visits > 0 && visited_prior > 0.0) {
+        mixed_value = (mixed_value + total_visits * weighted_q / visited_prior) / (1 + total_visits);
+    }
+    for (uint32_t i = 0; i < root_node.num_edges; ++i) {
+        if (!visited[i]) q_values[i] = mixed_value;
+    }
+    return q_values;
+}
+
+static double max_child_visits(const NodePool& nodes, const MCTSNode& node) {
+    int max_visits = 0;
+    for (uint32_t edge = node.first_edge; edge < node.first_edge + node.num_edges; ++edge) {
+        uint32_t child = nodes.edges[edge].child;
+        if (child != MCTSNode::NONE) max_visits = std::max(max_visits, nodes[child].n_visits);
+    }
+    return max_visits;
+}
+
+std::vector<double> MCTS::gumbel_scores() const {
+    const MCTSNode& root_node = (*pool)[root];
+    std::vector<double> scores = completed_q_values();
+    double sigma_scale = (GUMBEL_C_VISIT + max_child_visits(*pool, root_node)) * GUMBEL_C_SCALE;
+    for (uint32_t i = 0; i < root_node.num_edges; ++i) {
+        double log_prior = std::log(std::max(static_cast<double>(pool->edges[root_node.first_edge + i].prior), 1e-12));
+        double noise = i < gumbel.noise.size() ? gumbel.noise[i] : 0.0;
+        scores[i] = noise + log_prior + sigma_scale * (scores[i] + 1.0) / 2.0;
+    }
+    return scores;
+}
+
+py::array_t<float> MCTS::improved_policy() const {
+    py::array_t<float> policy(ReversiBitboard::BOARD_SIZE);
+    float* policy_data = policy.mutable_data();
+    std::fill(policy_data, policy_data + ReversiBitboard::BOARD_SIZE, 0.0f);
+    if (root == MCTSNode::NONE || !(*pool)[root].is_expanded()) return policy;
+
+    const MCTSNode& root_node = (*pool)[root];
+    std::vector<double> logits = completed_q_values();
+    double sigma_scale = (GUMBEL_C_VISIT + max_child_visits(*pool, root_node)) * GUMBEL_C_SCALE;
+    for (uint32_t i = 0; i < root_node.num_edges; ++i) {
+        double log_prior = std::log(std::max(static_cast<double>(pool->edges[root_node.first_edge + i].prior), 1e-12));
+        logits[i] = log_prior + sigma_scale * (logits[i] + 1.0) / 2.0;
+    }
+    double max_logit = *std::max_element(logits.begin(), logits.end());
+    double sum = 0.0;
+    for (double& logit : logits) {
+        logit = std::exp(logit - max_logit);
+        sum += logit;
+    }
+    for (uint32_t i = 0; i < root_node.num_edges; ++i) {
+        int move = pool->edges[root_node.first_edge + i].move;
+        if (move >= 0) policy_data[move] = static_cast<float>(logits[i] / sum);
+    }
+    return policy;
+}
+
+// Clears the Gumbel state of the previous search; the candidates are drawn
+// once the root has been expanded.
+void MCTS::start_gumbel(int num_simulations, bool add_noise) {
+    gumbel = GumbelRoot();
+    if (gumbel_actions <= 0) return;
+    gumbel.active = true;
+    gumbel.sample_noise = add_noise;
+    gumbel.budget = (*pool)[root].is_expanded() ? num_simulations : num_simulations - 1;
+}
+
+// The first call samples the top-k moves by Gumbel noise + log prior; every
+// later one keeps the better half by Gumbel score. Each phase hands out an
+// equal share of the budget to every candidate, round robin; once a single
+// candidate is left it gets whatever budget remains.
+void MCTS::next_gumbel_phase() {
+    const MCTSNode& root_node = (*pool)[root];
+    if (!gumbel.started) {
+        gumbel.started = true;
+        gumbel.noise.assign(root_node.num_edges, 0.0);
+        if (gumbel.sample_noise) {
+            std::extreme_value_distribution<double> gumbel_distribution(0.0, 1.0);
+            for (double& noise : gumbel.noise) noise = gumbel_distribution(rng);
+        }
+        std::vector<double> scores(root_node.num_edges);
+        for (uint32_t i = 0; i < root_node.num_edges; ++i) {
+            gumbel.candidates.push_back(i);
+            scores[i] = gumbel.noise[i] + std::log(std::max(static_cast<double>(pool->edges[root_node.first_edge + i].prior), 1e-12));
+        }
+        std::stable_sort(gumbel.candidates.begin(), gumbel.candidates.end(), [&](uint32_t a, uint32_t b) { return scores[a] > scores[b]; });
+        // m = min(gumbel_actions, legal moves, budget): a candidate the budget cannot visit is never compared.
+        gumbel.candidates.resize(std::min<size_t>({gumbel.candidates.size(), static_cast<size_t>(gumbel_actions),
+                                                   static_cast<size_t>(std::max(1, gumbel.budget))}));
+        gumbel.num_phases = std::max(1, static_cast<int>(std::ceil(std::log2(gumbel.candidates.size()))));
+    } else {
+        std::vector<double> scores = gumbel_scores();
+        std::stable_sort(gumbel.candidates.begin(), gumbel.candidates.end(), [&](uint32_t a, uint32_t b) { return scores[a] > scores[b]; });
+        gumbel.candidates.resize((gumbel.candidates.size() + 1) / 2);
+        gumbel.phase++;
+    }
+
+    int visits_per_candidate = 1;
+    if (gumbel.phase < gumbel.num_phases) {
+        visits_per_candidate = std::max(1, gumbel.budget / (gumbel.num_phases * static_cast<int>(gumbel.candidates.size())));
+    }
+    gumbel.schedule.clear();
+    gumbel.next = 0;
+    for (int visit = 0; visit < visits_per_candidate; ++visit) {
+        for (uint32_t candidate : gumbel.candidates) {
+            gumbel.schedule.push_back(root_node.first_edge + candidate);
+        }
+    }
+}
+
+void MCTS::update_progress(int done, py::object& progress) {
+    simulations = done;
+    current_best_move = root_best_move();
+    if (progress.is_none() || elapsed() < next_progress) return;
+    next_progress = elapsed() + progress_interval;
     py::gil_scoped_acquire acquire;
-    std::vector<py::array> board_batch_list;
-    for(const auto& node : leaf_nodes) {
-        board_batch_list.push_back(py::cast(node->game_board.board_to_numpy()));
+    progress(done, elapsed(), static_cast<int>(current_best_move));
+}
+
+NodeRef MCTS::search(ReversiBitboard& board, int player, int num_simulations, bool add_noise,
+                     double time_limit, size_t max_nodes, py::object progress, double progress_interval, bool early_stop) {
+    if (num_simulations <= 0 && time_limit <= 0.0 && max_nodes == 0) {
+        throw std::invalid_argument("search needs num_simulations, time_limit or max_nodes");
     }
-    py::array board_batch = py::cast(board_batch_list);
-    
-    std::vector<int> player_batch;
-    for(const auto& node : leaf_nodes) {
-        player_batch.push_back(node->player);
+    if (gumbel_actions > 0 && num_simulations <= 0) {
+        throw std::invalid_argument("a Gumbel search needs num_simulations");
     }
+    if (num_simulations <= 0) num_simulations = std::numeric_limits<int>::max();
+    this->time_limit = time_limit;
+    this->max_nodes = max_nodes;
+    this->progress_interval = progress_interval;
+    this->early_stop = early_stop;
+    next_progress = progress_interval;
+    search_start = std::chrono::steady_clock::now();
+    stop_requested = false;
+    simulations = 0;
 
-    py::tuple result = model.attr("_predict_internal_cpp")(board_batch, py::cast(player_batch));
-    py::array_t<float> policy_batch = result[0].cast<py::array_t<float>>();
-    py::array_t<float> value_batch_py = result[1].cast<py::array_t<float>>();
-    auto value_batch_unchecked = value_batch_py.unchecked<1>();
-    auto policy_proxy = policy_batch.unchecked<2>();
+    prepare_root(board, player);
+    start_gumbel(num_simulations, add_noise);
+    current_best_move = root_best_move();
+    if (tt) tt->new_search();
+    start_root_noise(add_noise);
 
-    std::vector<float> value_batch(leaf_nodes.size());
-    for(size_t i = 0; i < leaf_nodes.size(); ++i) {
-        value_batch[i] = value_batch_unchecked(i);
+    if (num_threads > 1 && !gumbel.active) {
+        search_parallel(num_simulations, progress);
+        return NodeRef{pool, root};
     }
 
     py::gil_scoped_release release;
+    std::vector<uint32_t> leaf_nodes;
+    for (int done = 0; done < num_simulations && !budget_exhausted(); ) {
+        int max_leaves = std::min(batch_size, num_simulations - done);
+        done += collect_leaves(max_leaves, leaf_nodes);
+        batch_predict(leaf_nodes);
+        leaf_nodes.clear();
+        update_progress(done, progress);
+        if (early_stop && move_decided(num_simulations - done)) break;
+    }
 
-    for (size_t i = 0; i < leaf_nodes.size(); ++i) {
-        auto node = leaf_nodes[i];
-        double value = value_batch[i];
-
-        std::vector<int> valid_moves = node->get_legal_moves();
-        if (!valid_moves.empty()) {
-            std::map<int, float> policy_map;
-            float sum_policy = 0.0f;
-            for (int move : valid_moves) {
-                float p = policy_proxy(i, move);
-                policy_map[move] = p;
-                sum_policy += p;
+    return NodeRef{pool, root};
+}
+
+struct Evaluation {
+    uint32_t node;
+    float value;
+    float policy[ReversiBitboard::BOARD_SIZE];
+};
+
+// State shared by the threads of one parallel search. A single mutex guards
+// the tree, the transposition table and both queues.
+struct ParallelSearch {
+    std::mutex mutex;
+    std::condition_variable worker_cv;
+    std::condition_variable evaluator_cv;
+    std::deque<uint32_t> queued;
+    std::vector<uint32_t> evaluating;
+    std::deque<Evaluation> evaluated;
+    int max_in_flight = 0;
+    // Simulations to run; lowered to `started` when the search budget runs out.
+    int target = 0;
+    int started = 0;
+    int completed = 0;
+    int in_flight = 0;
+    int waiting_workers = 0;
+    std::exception_ptr error;
+};
+
+// Tree-parallel search. num_threads workers descend the tree under virtual
+// loss, queue leaves and expand/back up the evaluated ones; the calling thread
+// only batches queued leaves into model calls and holds the GIL just for those.
+void MCTS::search_parallel(int num_simulations, py::object& progress) {
+    ParallelSearch state;
+    state.target = num_simulations;
+    // Room for one batch under evaluation while the workers fill the next one.
+    state.max_in_flight = 2 * batch_size;
+    {
+        py::gil_scoped_release release;
+        std::vector<std::thread> workers;
+        for (int i = 0; i < num_threads; ++i) {
+            workers.emplace_back(&MCTS::parallel_worker, this, std::ref(state));
+        }
+        parallel_evaluator(state, progress);
+        for (auto& worker : workers) {
+            worker.join();
+        }
+    }
+
+    if (state.error) {
+        std::vector<uint32_t> unfinished(state.queued.begin(), state.queued.end());
+        unfinished.insert(unfinished.end(), state.evaluating.begin(), state.evaluating.end());
+        for (const Evaluation& evaluation : state.evaluated) {
+            unfinished.push_back(evaluation.node);
+        }
+        revert_pending(unfinished);
+        std::rethrow_exception(state.error);
+    }
+}
+
+void MCTS::parallel_worker(ParallelSearch& state) {
+    NodePool& nodes = *pool;
+    EvalCache& eval_cache = EvalCache::instance();
+    std::vector<int> moves;
+    std::vector<double> priors;
+    std::unique_lock<std::mutex> lock(state.mutex);
+    try {
+        while (!state.error && state.completed < state.target) {
+            if (!state.evaluated.empty()) {
+                Evaluation evaluation = state.evaluated.front();
+                state.evaluated.pop_front();
+                MCTSNode leaf = nodes[evaluation.node];
+
+                // Move generation runs without the lock.
+                lock.unlock();
+                masked_priors(leaf, evaluation.policy, moves, priors);
+                if (eval_cache.enabled()) {
+                    eval_cache.insert(cache_key, leaf.black_board, leaf.white_board, leaf.player, evaluation.policy, evaluation.value);
+                }
+                lock.lock();
+
+                if (tt) {
+                    tt->store(leaf.black_board, leaf.white_board, leaf.player, evaluation.policy, evaluation.value);
+                }
+                if (!nodes[evaluation.node].is_expanded()) {
+                    nodes.add_edges(evaluation.node, moves, priors);
+                    if (evaluation.node == root && root_noise_pending) add_root_noise();
+                }
+                backup(evaluation.node, evaluation.value);
+                state.in_flight--;
+                state.completed++;
+                state.worker_cv.notify_all();
+                if (state.completed >= state.target) state.evaluator_cv.notify_one();
+                continue;
             }
-            if (sum_policy <= 1e-9) sum_policy = 1.0;
-
-            for (int move : valid_moves) {
-                if (node->children.find(move) == node->children.end()) {
-                    ReversiBitboard new_board = node->game_board;
-                    new_board.apply_move(move);
-                    double prior = policy_map[move] / sum_policy;
-                    node->children[move] = std::make_shared<MCTSNode>(new_board, new_board.current_player, node, move, prior);
+
+            if (state.started < state.target && state.in_flight < state.max_in_flight) {
+                uint32_t node = select_leaf();
+
+                if (nodes[node].pending_visits == 0) {
+                    for (uint32_t temp_node = node; temp_node != MCTSNode::NONE; temp_node = nodes[temp_node].parent) {
+                        nodes[temp_node].pending_visits++;
+                    }
+                    state.started++;
+                    if (is_solvable(node) && !nodes[node].is_solved) {
+                        // The solve runs without the tree lock; the pending visit keeps other workers off this leaf.
+                        MCTSNode leaf = nodes[node];
+                        lock.unlock();
+                        int value = solve_leaf(leaf);
+                        lock.lock();
+                        nodes[node].solved_value = static_cast<int8_t>(value);
+                        nodes[node].is_solved = true;
+                    }
+                    if (evaluate_exact(node) || (tt && evaluate_from_table(node)) || (eval_cache.enabled() && evaluate_from_cache(node))) {
+                        state.completed++;
+                        if (state.completed >= state.target) state.evaluator_cv.notify_one();
+                        continue;
+                    }
+                    count_wasted(node);
+                    state.queued.push_back(node);
+                    state.in_flight++;
+                    if (static_cast<int>(state.queued.size()) >= batch_size) state.evaluator_cv.notify_one();
+                    continue;
                 }
+                // The leaf is already in flight: wait for an evaluation to change the tree.
+                duplicate_leaves++;
             }
+
+            state.waiting_workers++;
+            state.evaluator_cv.notify_one();
+            state.worker_cv.wait(lock);
+            state.waiting_workers--;
         }
+    } catch (...) {
+        if (!state.error) state.error = std::current_exception();
+    }
+    state.worker_cv.notify_all();
+    state.evaluator_cv.notify_one();
+}
+
+// Sends a batch as soon as it is full, or earlier when no worker can add to it.
+// Between batches it checks the search budget and reports progress.
+void MCTS::parallel_evaluator(ParallelSearch& state, py::object& progress) {
+    std::vector<MCTSNode> batch_nodes;
+    std::vector<const MCTSNode*> leaf_ptrs;
+    std::vector<float> policy_batch;
+    std::vector<float> value_batch;
+    auto batch_ready = [&] {
+        return state.error || state.completed >= state.target ||
+               static_cast<int>(state.queued.size()) >= batch_size ||
+               (!state.queued.empty() && (state.waiting_workers == num_threads || state.started >= state.target));
+    };
+    while (true) {
+        int done;
+        {
+            std::unique_lock<std::mutex> lock(state.mutex);
+            state.evaluator_cv.wait_for(lock, std::chrono::milliseconds(10), batch_ready);
+            if (state.started < state.target &&
+                (budget_exhausted() || (early_stop && move_decided(state.target - state.completed)))) {
+                state.target = state.started;
+                state.worker_cv.notify_all();
+            }
+            simulations = state.completed;
+            current_best_move = root_best_move();
+            if (state.error || state.completed >= state.target) return;
 
-        // Backup
-        double current_value = value;
-        std::shared_ptr<MCTSNode> temp_node = node;
-        while(temp_node != nullptr) {
-            temp_node->update(current_value);
-            current_value = -current_value;
-            if(auto p = temp_node->parent.lock()) {
-                temp_node = p;
-            } else {
-                break;
+            done = state.completed;
+            state.evaluating.clear();
+            batch_nodes.clear();
+            if (batch_ready()) {
+                while (!state.queued.empty() && static_cast<int>(state.evaluating.size()) < batch_size) {
+                    state.evaluating.push_back(state.queued.front());
+                    batch_nodes.push_back((*pool)[state.queued.front()]);
+                    state.queued.pop_front();
+                }
             }
         }
+
+        if (!progress.is_none() && elapsed() >= next_progress) {
+            next_progress = elapsed() + progress_interval;
+            try {
+                py::gil_scoped_acquire acquire;
+                progress(done, elapsed(), static_cast<int>(current_best_move));
+            } catch (...) {
+                std::lock_guard<std::mutex> lock(state.mutex);
+                state.error = std::current_exception();
+                state.worker_cv.notify_all();
+                return;
+            }
+        }
+        if (batch_nodes.empty()) continue;
+
+        leaf_ptrs.clear();
+        for (const MCTSNode& node : batch_nodes) {
+            leaf_ptrs.push_back(&node);
+        }
+        try {
+            py::gil_scoped_acquire acquire;
+            BatchOutput output = evaluate_leaves(model, leaf_ptrs, planes_buffer);
+            policy_batch.assign(output.policy.data(), output.policy.data() + output.policy.size());
+            value_batch.assign(output.value.data(), output.value.data() + output.value.size());
+        } catch (...) {
+            std::lock_guard<std::mutex> lock(state.mutex);
+            state.error = std::current_exception();
+            state.worker_cv.notify_all();
+            return;
+        }
+
+        std::lock_guard<std::mutex> lock(state.mutex);
+        for (size_t i = 0; i < state.evaluating.size(); ++i) {
+            Evaluation evaluation;
+            evaluation.node = state.evaluating[i];
+            evaluation.value = value_batch[i];
+            std::copy(policy_batch.begin() + i * ReversiBitboard::BOARD_SIZE,
+                      policy_batch.begin() + (i + 1) * ReversiBitboard::BOARD_SIZE, evaluation.policy);
+            state.evaluated.push_back(evaluation);
+        }
+        state.evaluating.clear();
+        state.worker_cv.notify_all();
     }
 }
 
-std::shared_ptr<MCTSNode> MCTS::search(ReversiBitboard& board, int player, int num_simulations, bool add_noise) {
-    if (root == nullptr || root->game_board.black_board != board.black_board || root->game_board.white_board != board.white_board) {
-        root = std::make_shared<MCTSNode>(board, player);
+std::vector<NodeRef> search_lockstep(py::object model, const std::vector<std::shared_ptr<MCTS>>& searches, std::vector<ReversiBitboard>& boards, const std::vector<int>& players, const std::vector<int>& num_simulations, const std::vector<bool>& add_noise, bool early_stop) {
+    size_t num_games = searches.size();
+    if (boards.size() != num_games || players.size() != num_games || num_simulations.size() != num_games || add_noise.size() != num_games) {
+        throw std::invalid_argument("search_lockstep: searches, boards, players, num_simulations and add_noise must have the same length");
     }
 
-    if (add_noise) {
-        // This part is simplified. A full implementation would apply noise to the root's priors after a first prediction.
+    for (size_t g = 0; g < num_games; ++g) {
+        searches[g]->prepare_root(boards[g], players[g]);
+        searches[g]->start_gumbel(num_simulations[g], add_noise[g]);
+        searches[g]->simulations = 0;
+        if (searches[g]->tt) searches[g]->tt->new_search();
+        searches[g]->start_root_noise(add_noise[g]);
     }
 
-    std::vector<std::shared_ptr<MCTSNode>> leaf_nodes;
-    for (int i = 0; i < num_simulations; ++i) {
-        std::shared_ptr<MCTSNode> node = root;
-
-        while (node->is_fully_expanded() && !node->is_game_over) {
-            node = node->select_child(c_puct);
+    // Every step takes up to batch_size leaves from each tree and evaluates
+    // all of them with a single model call.
+    std::vector<int> remaining(num_simulations);
+    std::vector<int> done(num_games, 0);
+    std::vector<std::vector<uint32_t>> game_leaves(num_games);
+    std::vector<const MCTSNode*> leaf_ptrs;
+    py::array_t<float> planes_buffer;
+    while (true) {
+        leaf_ptrs.clear();
+        for (size_t g = 0; g < num_games; ++g) {
+            game_leaves[g].clear();
+            if (remaining[g] > 0) {
+                int max_leaves = std::min(searches[g]->batch_size, remaining[g]);
+                int collected = searches[g]->collect_leaves(max_leaves, game_leaves[g]);
+                remaining[g] -= collected;
+                done[g] += collected;
+            }
+            for (uint32_t node : game_leaves[g]) {
+                leaf_ptrs.push_back(&(*searches[g]->pool)[node]);
+            }
         }
+        // A step can be resolved without the model (table, cache, exact values).
+        if (!leaf_ptrs.empty()) {
+            BatchOutput output;
+            try {
+                output = MCTS::evaluate_leaves(model, leaf_ptrs, planes_buffer);
+            } catch (...) {
+                for (size_t g = 0; g < num_games; ++g) {
+                    searches[g]->revert_pending(game_leaves[g]);
+                }
+                throw;
+            }
 
-        leaf_nodes.push_back(node);
+            py::gil_scoped_release release;
+            size_t offset = 0;
+            for (size_t g = 0; g < num_games; ++g) {
+                if (game_leaves[g].empty()) continue;
+                searches[g]->expand_and_backup(game_leaves[g], output.policy.data() + offset * ReversiBitboard::BOARD_SIZE, output.value.data() + offset);
+                offset += game_leaves[g].size();
+            }
+        }
 
-        if (leaf_nodes.size() >= static_cast<size_t>(batch_size)) {
-            batch_predict(leaf_nodes);
-            leaf_nodes.clear();
+        bool searching = false;
+        for (size_t g = 0; g < num_games; ++g) {
+            searches[g]->simulations = done[g];
+            searches[g]->current_best_move = searches[g]->root_best_move();
+            if (early_stop && remaining[g] > 0 && searches[g]->move_decided(remaining[g])) {
+                remaining[g] = 0;
+            }
+            searching = searching || remaining[g] > 0;
         }
-    }
-    if (!leaf_nodes.empty()) {
-        batch_predict(leaf_nodes);
+        if (!searching) break;
     }
 
-    return root;
-}
\ No newline at end of file
+    std::vector<NodeRef> roots;
+    for (const auto& search : searches) {
+        roots.push_back(NodeRef{search->pool, search->root});
+    }
+    return roots;
+}
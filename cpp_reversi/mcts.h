@@ -2,55 +2,249 @@
 #define MCTS_H
 
 #include "reversi_bitboard.h"
+#include "transposition_table.h"
+#include "eval_cache.h"
+#include "endgame_solver.h"
 #include <vector>
 #include <string>
-#include <map>
 #include <memory>
+#include <atomic>
+#include <chrono>
+#include <mutex>
+#include <random>
+#include <cstdint>
 #include <pybind11/pybind11.h>
 #include <pybind11/numpy.h>
 
 namespace py = pybind11;
 
-class MCTSNode : public std::enable_shared_from_this<MCTSNode> {
-public:
-    ReversiBitboard game_board;
-    int player;
-    std::weak_ptr<MCTSNode> parent;
-    int move;
-    double prior_p;
-    std::map<int, std::shared_ptr<MCTSNode>> children;
-    int n_visits;
-    double q_value;
-    double sum_value;
-    bool is_game_over = false;
-
-    MCTSNode(ReversiBitboard board, int p, std::shared_ptr<MCTSNode> parent_node = nullptr, int m = -1, double prior = 0.0);
-
-    double ucb_score(double c_puct) const;
-    std::shared_ptr<MCTSNode> select_child(double c_puct);
-    bool is_fully_expanded();
+// Compact search node stored by value in a NodePool. Only the two bitboards and
+// the side to move are kept (no move history). Expanding a node only records
+// its moves as a contiguous block of edges; the child node behind an edge is
+// built the first time selection takes it. A side without moves gets a
+// single pass edge (move -1).
+struct MCTSNode {
+    static const uint32_t NONE = 0xffffffffu;
+
+    uint64_t black_board;
+    uint64_t white_board;
+    float prior_p;
+    float sum_value;
+    int32_t n_visits;
+    // Simulations that passed through this node and are still waiting for their evaluation.
+    int32_t pending_visits;
+    uint32_t parent;
+    uint32_t first_edge;
+    uint8_t num_edges;
+    int8_t move;
+    uint8_t player;
+    bool is_game_over;
+    // Exact result (-1, 0, 1 for the side to move): set from the discs when the
+    // game is over, and once the endgame solver has searched this node.
+    bool is_solved;
+    int8_t solved_value;
+
+    double q_value() const { return n_visits > 0 ? static_cast<double>(sum_value) / n_visits : 0.0; }
+    bool is_expanded() const { return num_edges > 0; }
+    ReversiBitboard to_board() const;
+    double ucb_score(double c_puct, double virtual_loss, int parent_visits) const;
     void update(double value);
-    std::vector<int> get_legal_moves();
+};
 
-private:
-    std::vector<int> _legal_moves;
-    bool _legal_moves_calculated = false;
+struct MCTSEdge {
+    float prior;
+    // Index of the child node, NONE until the edge is first selected.
+    uint32_t child;
+    int8_t move;
+};
+
+class NodePool {
+public:
+    std::vector<MCTSNode> nodes;
+    std::vector<MCTSEdge> edges;
+
+    MCTSNode& operator[](uint32_t index) { return nodes[index]; }
+    const MCTSNode& operator[](uint32_t index) const { return nodes[index]; }
+    size_t size() const { return nodes.size(); }
+    size_t bytes() const { return nodes.capacity() * sizeof(MCTSNode) + edges.capacity() * sizeof(MCTSEdge); }
+
+    uint32_t add_node(const ReversiBitboard& board, int player, uint32_t parent, int move, double prior);
+    // Appends one edge per move as a contiguous block and links it to `parent`.
+    void add_edges(uint32_t parent, const std::vector<int>& moves, const std::vector<double>& priors);
+    // Picks the edge with the best UCB score and returns its child node, building it on first use.
+    uint32_t select_child(uint32_t index, double c_puct, double virtual_loss);
+    uint32_t materialize(uint32_t parent, uint32_t edge);
+    std::vector<int> get_legal_moves(uint32_t index) const;
+    // Moves along the most visited children, starting below `index`.
+    std::vector<int> principal_variation(uint32_t index) const;
+};
+
+struct ParallelSearch;
+
+// Model outputs for one batch, read in place from the arrays the model returned.
+// Must be destroyed with the GIL held.
+struct BatchOutput {
+    py::array_t<float, py::array::c_style | py::array::forcecast> policy;
+    py::array_t<float, py::array::c_style | py::array::forcecast> value;
+};
+
+// Python-facing handle on a node. It keeps its pool alive, so handles from an
+// earlier search stay valid after the tree has been rebuilt or compacted.
+struct NodeRef {
+    std::shared_ptr<NodePool> pool;
+    uint32_t index;
+
+    const MCTSNode& node() const { return (*pool)[index]; }
+};
+
+// Root state of a Gumbel search (Danihelka et al., "Policy improvement by
+// planning with Gumbel", 2022): the sampled candidate moves and the visits
+// sequential halving still has to hand out in the current phase.
+struct GumbelRoot {
+    bool active = false;
+    bool started = false;
+    bool sample_noise = false;
+    int budget = 0;
+    int phase = 0;
+    int num_phases = 0;
+    // Gumbel(0, 1) noise per root edge, zero without add_noise.
+    std::vector<double> noise;
+    // Root edges still in the running.
+    std::vector<uint32_t> candidates;
+    std::vector<uint32_t> schedule;
+    size_t next = 0;
 };
 
 class MCTS {
 public:
-    MCTS(py::object model, double c_puct = 1.41, int batch_size = 8);
+    // gumbel_actions > 0 replaces PUCT at the root with Gumbel top-k sampling of
+    // that many moves and sequential halving over them; the rest of the tree still uses PUCT.
+    MCTS(py::object model, double c_puct = 1.41, int batch_size = 8, double virtual_loss = 1.0,
+         size_t tt_size = 0, bool tt_share_stats = false, const std::string& tt_replacement = "visits", int num_threads = 1,
+         int endgame_empties = 0, int gumbel_actions = 0);
+
+    // Runs until num_simulations (<= 0: no limit), time_limit seconds (0: none) or
+    // max_nodes tree nodes (0: none) is reached, or until stop() is called.
+    // progress(simulations, elapsed_seconds, best_move) is called every progress_interval seconds.
+    // With early_stop it also ends once the move is decided (see move_decided).
+    // add_noise mixes Dirichlet noise into the root priors; a Gumbel search samples
+    // its Gumbel noise only with add_noise instead. It needs num_simulations and runs on the calling thread.
+    NodeRef search(ReversiBitboard& board, int player, int num_simulations, bool add_noise,
+                   double time_limit = 0.0, size_t max_nodes = 0, py::object progress = py::none(), double progress_interval = 0.1,
+                   bool early_stop = false);
+    // Ends the running search after the simulations in flight; safe to call from any thread.
+    void stop() { stop_requested = true; }
+    // Live values of the running (or last) search, safe to read from any thread.
+    int simulations_done() const { return simulations; }
+    int best_move() const { return current_best_move; }
+    // softmax(log prior + sigma(completed Q)) over the root moves, as a 64-entry policy target.
+    py::array_t<float> improved_policy() const;
+    // Moves the root to the child reached by `move`, keeping its subtree and freeing the siblings.
+    void advance(int move);
+    void reset();
 
-    std::shared_ptr<MCTSNode> search(ReversiBitboard& board, int player, int num_simulations, bool add_noise);
+    size_t node_count() const { return pool->size(); }
+    size_t tree_bytes() const { return pool->bytes(); }
+    const TranspositionTable* transposition_table() const { return tt.get(); }
+    void clear_transposition_table();
+
+    // Visits the root already had when the last search started (0 when the tree was rebuilt).
+    int reused_visits;
+    // Selections that hit a leaf already waiting in the current batch.
+    long long duplicate_leaves;
+    // Leaves valued by the endgame solver instead of the model.
+    long long solved_leaves;
+    // Finished games reached by selection, scored from the disc counts.
+    long long terminal_leaves;
+    // Model evaluations spent on finished games or positions with only a pass; should stay 0.
+    long long wasted_evaluations;
 
 private:
     py::object model;
     double c_puct;
     int batch_size;
-    std::shared_ptr<MCTSNode> root;
+    double virtual_loss;
+    // Selection threads used by search(); 1 keeps the search on the calling thread.
+    int num_threads;
+    std::shared_ptr<NodePool> pool;
+    uint32_t root;
+    // Reused NHWC input planes for models with a planes entry point.
+    py::array_t<float> planes_buffer;
+    // Optional table sharing NN outputs (and, with tt_share_stats, visit statistics) across transpositions.
+    std::unique_ptr<TranspositionTable> tt;
+    bool tt_share_stats;
+    // Identifies the model in the process-wide EvalCache: its `cache_key` attribute, assigned if missing.
+    uint64_t cache_key;
+    // Leaves with at most this many empty squares are solved exactly; 0 disables the solver.
+    int endgame_empties;
+    std::unique_ptr<EndgameSolver> endgame_solver;
+    std::mutex solver_mutex;
+    int gumbel_actions;
+    GumbelRoot gumbel;
+    std::mt19937_64 rng;
+    bool root_noise_pending = false;
+    // Root edge priors from the network while the root carries Dirichlet noise.
+    std::vector<float> root_network_priors;
+
+    std::atomic<bool> stop_requested;
+    std::atomic<int> simulations;
+    std::atomic<int> current_best_move;
+    std::chrono::steady_clock::time_point search_start;
+    double time_limit;
+    size_t max_nodes;
+    double progress_interval;
+    double next_progress;
+    bool early_stop;
+
+    double elapsed() const;
+    bool budget_exhausted() const;
+    int root_best_move() const;
+    // True when the root has a single move that has been tried, or when the most
+    // visited child stays ahead even if every remaining simulation goes to the runner-up.
+    bool move_decided(int remaining) const;
+    // Root value the model gave before any child was visited.
+    double root_network_value() const;
+    // Q of every root edge from the root's point of view; unvisited edges get the mixed value estimate.
+    std::vector<double> completed_q_values() const;
+    // Gumbel score of every root edge: noise + log prior + sigma(completed Q).
+    std::vector<double> gumbel_scores() const;
+    void start_gumbel(int num_simulations, bool add_noise);
+    void start_root_noise(bool add_noise);
+    void add_root_noise();
+    void restore_root_priors();
+    void next_gumbel_phase();
+    // Publishes the search state and calls the progress callback when it is due. Takes the GIL only for the callback.
+    void update_progress(int done, py::object& progress);
 
-    void expand_and_backup(const std::vector<std::shared_ptr<MCTSNode>>& search_path, const py::array_t<float>& policy_batch, const std::vector<float>& value_batch);
-    void batch_predict(const std::vector<std::shared_ptr<MCTSNode>>& leaf_nodes);
+    uint32_t find_subtree(const ReversiBitboard& board, int player) const;
+    void promote_to_root(uint32_t index);
+    void new_root(const ReversiBitboard& board, int player);
+
+    // Runs the model on the leaves; the caller must hold the GIL.
+    static BatchOutput evaluate_leaves(py::object& model, const std::vector<const MCTSNode*>& leaf_nodes, py::array_t<float>& planes_buffer);
+    void prepare_root(ReversiBitboard& board, int player);
+    uint32_t select_leaf();
+    void count_wasted(uint32_t node);
+    int collect_leaves(int max_leaves, std::vector<uint32_t>& leaf_nodes);
+    void revert_pending(const std::vector<uint32_t>& leaf_nodes);
+    void expand_node(uint32_t node, const float* policy);
+    void backup(uint32_t node, double value);
+    bool is_solvable(uint32_t node) const;
+    int solve_leaf(const MCTSNode& leaf);
+    bool evaluate_exact(uint32_t node);
+    bool evaluate_from_table(uint32_t node);
+    bool evaluate_from_cache(uint32_t node);
+    void expand_and_backup(const std::vector<uint32_t>& leaf_nodes, const float* policy_batch, const float* value_batch);
+    void batch_predict(const std::vector<uint32_t>& leaf_nodes);
+    void search_parallel(int num_simulations, py::object& progress);
+    void parallel_worker(ParallelSearch& state);
+    void parallel_evaluator(ParallelSearch& state, py::object& progress);
+
+    friend std::vector<NodeRef> search_lockstep(py::object model, const std::vector<std::shared_ptr<MCTS>>& searches, std::vector<ReversiBitboard>& boards, const std::vector<int>& players, const std::vector<int>& num_simulations, const std::vector<bool>& add_noise, bool early_stop);
 };
 
-#endif // MCTS_H
\ No newline at end of file
+// Runs one search per game in lockstep, batching the leaves of all trees into one model call per step.
+// num_simulations is given per game.
+std::vector<NodeRef> search_lockstep(py::object model, const std::vector<std::shared_ptr<MCTS>>& searches, std::vector<ReversiBitboard>& boards, const std::vector<int>& players, const std::vector<int>& num_simulations, const std::vector<bool>& add_noise, bool early_stop = false);
+
+#endif // MCTS_H
@@ -1,32 +1,153 @@
 #include <pybind11/pybind11.h>
 #include <pybind11/stl.h>
 #include <pybind11/numpy.h>
+#include <algorithm>
 #include "mcts.h"
 
 namespace py = pybind11;
 
 PYBIND11_MODULE(reversi_mcts_cpp, m) {
     m.doc() = "MCTS module implemented in C++";
+    m.attr("NODE_BYTES") = sizeof(MCTSNode);
+    m.attr("EDGE_BYTES") = sizeof(MCTSEdge);
 
-    py::class_<MCTSNode, std::shared_ptr<MCTSNode>>(m, "MCTSNode")
-        .def(py::init<ReversiBitboard, int, std::shared_ptr<MCTSNode>, int, double>(), 
-             py::arg("board"), py::arg("player"), py::arg("parent") = nullptr, 
-             py::arg("move") = -1, py::arg("prior_p") = 0.0)
-        .def_readonly("player", &MCTSNode::player)
-        .def_readonly("move", &MCTSNode::move)
-        .def_readonly("n_visits", &MCTSNode::n_visits)
-        .def_readonly("q_value", &MCTSNode::q_value)
-        .def("get_legal_moves", &MCTSNode::get_legal_moves)
-        .def_property_readonly("children", [](MCTSNode &self) {
+    py::class_<NodeRef>(m, "MCTSNode")
+        .def_property_readonly("player", [](const NodeRef &self) { return static_cast<int>(self.node().player); })
+        .def_property_readonly("move", [](const NodeRef &self) { return static_cast<int>(self.node().move); })
+        .def_property_readonly("n_visits", [](const NodeRef &self) { return self.node().n_visits; })
+        .def_property_readonly("q_value", [](const NodeRef &self) { return self.node().q_value(); })
+        .def_property_readonly("prior_p", [](const NodeRef &self) { return self.node().prior_p; })
+        .def_property_readonly("is_game_over", [](const NodeRef &self) { return self.node().is_game_over; })
+        .def_property_readonly("is_solved", [](const NodeRef &self) { return self.node().is_solved; })
+        .def_property_readonly("black_board", [](const NodeRef &self) { return self.node().black_board; })
+        .def_property_readonly("white_board", [](const NodeRef &self) { return self.node().white_board; })
+        .def("get_legal_moves", [](const NodeRef &self) { return self.pool->get_legal_moves(self.index); })
+        // Children selection has reached; moves that were never selected have no node yet.
+        .def_property_readonly("children", [](const NodeRef &self) {
             py::dict children_dict;
-            for (auto const& [move, child_ptr] : self.children) {
-                children_dict[py::cast(move)] = py::cast(child_ptr);
+            const MCTSNode& node = self.node();
+            for (uint32_t edge = node.first_edge; edge < node.first_edge + node.num_edges; ++edge) {
+                uint32_t child = self.pool->edges[edge].child;
+                if (child == MCTSNode::NONE) continue;
+                children_dict[py::cast(static_cast<int>((*self.pool)[child].move))] = py::cast(NodeRef{self.pool, child});
             }
             return children_dict;
+        })
+        // Per-square statistics of the children as 64-entry arrays; q is from
+        // the point of view of the side to move here. Passes are not included.
+        .def("child_stats", [](const NodeRef &self, bool principal_variation) {
+            py::array_t<int32_t> visits(ReversiBitboard::BOARD_SIZE);
+            py::array_t<float> q_values(ReversiBitboard::BOARD_SIZE);
+            py::array_t<float> priors(ReversiBitboard::BOARD_SIZE);
+            py::array_t<bool> legal(ReversiBitboard::BOARD_SIZE);
+            int32_t* visits_data = visits.mutable_data();
+            float* q_data = q_values.mutable_data();
+            float* prior_data = priors.mutable_data();
+            bool* legal_data = legal.mutable_data();
+            std::fill(visits_data, visits_data + ReversiBitboard::BOARD_SIZE, 0);
+            std::fill(q_data, q_data + ReversiBitboard::BOARD_SIZE, 0.0f);
+            std::fill(prior_data, prior_data + ReversiBitboard::BOARD_SIZE, 0.0f);
+            uint64_t legal_moves = self.node().to_board().get_legal_moves_bitboard();
+            for (int square = 0; square < ReversiBitboard::BOARD_SIZE; ++square) {
+                legal_data[square] = (legal_moves >> square) & 1;
+            }
+            const MCTSNode& node = self.node();
+            for (uint32_t index = node.first_edge; index < node.first_edge + node.num_edges; ++index) {
+                const MCTSEdge& edge = self.pool->edges[index];
+                if (edge.move < 0) continue;
+                prior_data[edge.move] = edge.prior;
+                if (edge.child == MCTSNode::NONE) continue;
+                const MCTSNode& child = (*self.pool)[edge.child];
+                visits_data[edge.move] = child.n_visits;
+                q_data[edge.move] = static_cast<float>(-child.q_value());
+            }
+            py::dict stats;
+            stats["visits"] = visits;
+            stats["q_values"] = q_values;
+            stats["priors"] = priors;
+            stats["legal"] = legal;
+            if (principal_variation) {
+                stats["principal_variation"] = self.pool->principal_variation(self.index);
+            }
+            return stats;
+        }, py::arg("principal_variation") = false);
+
+    py::class_<EvalCache, std::unique_ptr<EvalCache, py::nodelete>>(m, "EvalCache")
+        .def("resize", &EvalCache::resize, py::arg("max_entries"), "Sets the entry limit (0 disables the cache)")
+        .def("clear", &EvalCache::clear)
+        .def_property_readonly("enabled", &EvalCache::enabled)
+        .def("lookup", [](EvalCache &self, uint64_t model_key, uint64_t black_board, uint64_t white_board, int player) -> py::object {
+            py::array_t<float> policy(ReversiBitboard::BOARD_SIZE);
+            float value;
+            if (!self.lookup(model_key, black_board, white_board, player, policy.mutable_data(), value)) {
+                return py::none();
+            }
+            return py::make_tuple(policy, value);
+        }, py::arg("model_key"), py::arg("black_board"), py::arg("white_board"), py::arg("player"))
+        .def("insert", [](EvalCache &self, uint64_t model_key, uint64_t black_board, uint64_t white_board, int player,
+                          py::array_t<float, py::array::c_style | py::array::forcecast> policy, float value) {
+            if (policy.size() != ReversiBitboard::BOARD_SIZE) {
+                throw std::invalid_argument("policy must have 64 entries");
+            }
+            self.insert(model_key, black_board, white_board, player, policy.data(), value);
+        }, py::arg("model_key"), py::arg("black_board"), py::arg("white_board"), py::arg("player"), py::arg("policy"), py::arg("value"))
+        .def("stats", [](EvalCache &self) {
+            py::dict stats;
+            long long lookups = self.hits + self.misses;
+            stats["hits"] = self.hits;
+            stats["misses"] = self.misses;
+            stats["hit_rate"] = lookups > 0 ? static_cast<double>(self.hits) / lookups : 0.0;
+            stats["inserts"] = self.inserts;
+            stats["evictions"] = self.evictions;
+            stats["entries"] = self.size();
+            stats["max_entries"] = self.max_entries();
+            return stats;
         });
+    m.attr("eval_cache") = py::cast(&EvalCache::instance(), py::return_value_policy::reference);
 
     py::class_<MCTS, std::shared_ptr<MCTS>>(m, "MCTS")
-        .def(py::init<py::object, double, int>(), py::arg("model"), py::arg("c_puct") = 1.41, py::arg("batch_size") = 8)
-        .def("search", &MCTS::search, py::arg("board"), py::arg("player"), py::arg("num_simulations"), py::arg("add_noise") = false,
-            py::return_value_policy::reference_internal);
-}
\ No newline at end of file
+        .def(py::init<py::object, double, int, double, size_t, bool, const std::string&, int, int, int>(), py::arg("model"), py::arg("c_puct") = 1.41,
+             py::arg("batch_size") = 8, py::arg("virtual_loss") = 1.0, py::arg("tt_size") = 0, py::arg("tt_share_stats") = false,
+             py::arg("tt_replacement") = "visits", py::arg("num_threads") = 1, py::arg("endgame_empties") = 0,
+             py::arg("gumbel_actions") = 0)
+        .def("search", &MCTS::search, py::arg("board"), py::arg("player"), py::arg("num_simulations") = 0, py::arg("add_noise") = false,
+             py::arg("time_limit") = 0.0, py::arg("max_nodes") = 0, py::arg("progress") = py::none(), py::arg("progress_interval") = 0.1,
+             py::arg("early_stop") = false)
+        .def("stop", &MCTS::stop, "Ends the running search early; callable from another thread")
+        .def_property_readonly("simulations_done", &MCTS::simulations_done, "Simulations the last search ran, fewer than asked when it stopped early")
+        .def_property_readonly("best_move", &MCTS::best_move, "Most visited root move, or the sequential halving winner of a Gumbel search")
+        .def("improved_policy", &MCTS::improved_policy, "softmax(log prior + sigma(completed Q)) over the root moves of the last search")
+        .def("advance", &MCTS::advance, py::arg("move"))
+        .def("reset", &MCTS::reset)
+        .def_property_readonly("node_count", &MCTS::node_count)
+        .def_property_readonly("tree_bytes", &MCTS::tree_bytes)
+        .def_readonly("reused_visits", &MCTS::reused_visits)
+        .def_readonly("duplicate_leaves", &MCTS::duplicate_leaves)
+        .def_readonly("solved_leaves", &MCTS::solved_leaves)
+        .def_readonly("terminal_leaves", &MCTS::terminal_leaves)
+        .def_readonly("wasted_evaluations", &MCTS::wasted_evaluations)
+        .def("clear_transposition_table", &MCTS::clear_transposition_table)
+        .def("tt_stats", [](const MCTS &self) {
+            py::dict stats;
+            const TranspositionTable* tt = self.transposition_table();
+            if (tt == nullptr) return stats;
+            long long probes = tt->hits + tt->misses;
+            stats["hits"] = tt->hits;
+            stats["misses"] = tt->misses;
+            stats["hit_rate"] = probes > 0 ? static_cast<double>(tt->hits) / probes : 0.0;
+            stats["stores"] = tt->stores;
+            stats["evictions"] = tt->evictions;
+            stats["entries"] = tt->size();
+            stats["capacity"] = tt->capacity();
+            return stats;
+        });
+
+    m.def("search_lockstep", &search_lockstep, py::arg("model"), py::arg("searches"), py::arg("boards"), py::arg("players"),
+          py::arg("num_simulations"), py::arg("add_noise"), py::arg("early_stop") = false,
+          "Searches several games at once, evaluating the leaves of all trees with one model call per step; num_simulations is one count per game or one for all");
+    m.def("search_lockstep", [](py::object model, const std::vector<std::shared_ptr<MCTS>>& searches, std::vector<ReversiBitboard>& boards,
+                                const std::vector<int>& players, int num_simulations, const std::vector<bool>& add_noise, bool early_stop) {
+              return search_lockstep(model, searches, boards, players, std::vector<int>(searches.size(), num_simulations), add_noise, early_stop);
+          }, py::arg("model"), py::arg("searches"), py::arg("boards"), py::arg("players"),
+          py::arg("num_simulations"), py::arg("add_noise"), py::arg("early_stop") = false);
+}
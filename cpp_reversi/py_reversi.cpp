@@ -2,6 +2,8 @@
 #include <pybind11/stl.h>
 #include <pybind11/numpy.h>
 #include "reversi_bitboard.h"
+#include "batch_board.h"
+#include "endgame_solver.h"
 
 namespace py = pybind11;
 
@@ -31,6 +33,10 @@ int transform_transpose_anti_py(int move_idx) {
 
 PYBIND11_MODULE(reversi_bitboard_cpp, m) {
     m.doc() = "pybind11 plugin for ReversiBitboard";
+    m.def("move_generator", &move_generator_name, "Move generation path in use: 'avx2' or 'scalar'");
+    m.attr("NUM_SYMMETRIES") = static_cast<int>(ReversiBitboard::NUM_SYMMETRIES);
+    m.def("transform_square", &transform_square, py::arg("symmetry"), py::arg("square"));
+    m.def("transform_bitboard", &transform_bitboard, py::arg("symmetry"), py::arg("board"));
 
     py::class_<ReversiBitboard>(m, "ReversiBitboard")
         .def(py::init<>())
@@ -97,8 +103,48 @@ PYBIND11_MODULE(reversi_bitboard_cpp, m) {
         .def("flip_vertical", &ReversiBitboard::flip_vertical)
         .def("transpose_main", &ReversiBitboard::transpose_main)
         .def("transpose_anti", &ReversiBitboard::transpose_anti)
+        .def("transform", &ReversiBitboard::transform, py::arg("symmetry"))
+        .def("canonical", &ReversiBitboard::canonical, "Returns (canonical board, symmetry); map moves with transform_square(symmetry, move)")
+        .def("hash", &ReversiBitboard::hash, "64-bit Zobrist hash of the discs and the side to move")
         ;
 
+    py::class_<BatchBoard>(m, "BatchBoard")
+        .def(py::init<py::ssize_t>(), py::arg("size"), "`size` copies of the initial position, black to move")
+        .def(py::init<BatchBoard::Bitboards, BatchBoard::Bitboards, BatchBoard::Players>(), py::arg("black"), py::arg("white"), py::arg("player"))
+        .def("__len__", &BatchBoard::size)
+        .def("__getitem__", &BatchBoard::board, py::arg("index"))
+        .def("copy", &BatchBoard::copy)
+        .def_readonly("black", &BatchBoard::black)
+        .def_readonly("white", &BatchBoard::white)
+        .def_readonly("player", &BatchBoard::player)
+        .def("legal_moves", &BatchBoard::legal_moves)
+        .def("legal_mask", &BatchBoard::legal_mask)
+        .def("apply_moves", &BatchBoard::apply_moves, py::arg("moves"))
+        .def("is_game_over", &BatchBoard::is_game_over)
+        .def("disc_counts", &BatchBoard::disc_counts)
+        .def("winners", &BatchBoard::winners)
+        .def("transform", &BatchBoard::transform, py::arg("symmetries"))
+        .def("canonical", &BatchBoard::canonical, "Returns (canonical boards, symmetry per position)")
+        .def("hashes", &BatchBoard::hashes)
+        .def("planes", &BatchBoard::planes);
+
+    py::class_<EndgameResult>(m, "EndgameResult")
+        .def_readonly("score", &EndgameResult::score)
+        .def_readonly("best_move", &EndgameResult::best_move)
+        .def_readonly("nodes", &EndgameResult::nodes);
+
+    py::class_<EndgameSolver>(m, "EndgameSolver")
+        .def(py::init<size_t>(), py::arg("tt_size") = 1 << 20)
+        .def("solve", [](EndgameSolver &self, const ReversiBitboard &board, bool exact) {
+            py::gil_scoped_release release;
+            return self.solve(board, exact);
+        }, py::arg("board"), py::arg("exact") = true,
+           "Perfect-play disc difference for the side to move and its best move; exact=False only decides win/draw/loss")
+        .def("clear", &EndgameSolver::clear)
+        .def_property_readonly("capacity", &EndgameSolver::capacity)
+        .def_readonly("nodes", &EndgameSolver::nodes)
+        .def_readonly("tt_hits", &EndgameSolver::tt_hits);
+
     m.def("transform_policy_horizontal", &transform_horizontal_py, "Transforms a policy index for horizontal flip");
     m.def("transform_policy_vertical", &transform_vertical_py, "Transforms a policy index for vertical flip");
     m.def("transform_policy_transpose_main", &transform_transpose_main_py, "Transforms a policy index for main diagonal transpose");
@@ -1,5 +1,8 @@
 #include "reversi_bitboard.h"
 #include <iostream>
+#ifdef REVERSI_AVX2
+#include <immintrin.h>
+#endif
 
 ReversiBitboard::ReversiBitboard() {
     reset();
@@ -12,59 +15,162 @@ void ReversiBitboard::reset() {
     passed_last_turn = false;
 }
 
-uint64_t ReversiBitboard::_calculate_flips(int move_bit, uint64_t player_board, uint64_t enemy_board) const {
-    uint64_t move_mask = 1ULL << move_bit;
-    uint64_t total_flip_mask = 0ULL;
-    const int directions[] = {-9, -8, -7, -1, 1, 7, 8, 9};
-
-    for (int shift : directions) {
-        uint64_t line = 0ULL;
-        uint64_t current = move_mask;
-        for (int i = 0; i < BOARD_LENGTH; ++i) {
-            if ((shift == 1 || shift == -7 || shift == 9) && (current & R_MASK)) {
-                break;
-            }
-            if ((shift == -1 || shift == 7 || shift == -9) && (current & L_MASK)) {
-                break;
-            }
-            if (shift > 0) {
-                current <<= shift;
-            } else {
-                current >>= -shift;
-            }
-            if (!(current & ALL_MASK)) {
-                line = 0ULL;
-                break;
-            }
+// Move generation works on whole bitboards: a run of enemy discs is grown from
+// every own disc (legal moves) or from the move square (flips) by shifting the
+// board one step in a direction at a time. The four shift amounts cover the
+// eight directions, once as a left and once as a right shift. Horizontal and
+// diagonal runs use enemy discs off the A and H files only, which stops a
+// shift from wrapping into the next row.
+namespace {
 
-            if ((current & enemy_board)) {
-                line |= current;
-            } else if ((current & player_board)) {
-                total_flip_mask |= line;
-                break;
-            } else {
-                line = 0ULL;
-                break;
-            }
+const int SHIFTS[4] = {1, 8, 9, 7};
+const uint64_t INNER_FILES = 0x7e7e7e7e7e7e7e7eULL;
+const uint64_t ENEMY_MASKS[4] = {INNER_FILES, ~0ULL, INNER_FILES, INNER_FILES};
+
+// Kogge-Stone fill: own discs extended through contiguous enemy discs in log2(6) steps.
+inline uint64_t fill_left(uint64_t gen, uint64_t pro, int shift) {
+    gen |= pro & (gen << shift);
+    pro &= pro << shift;
+    gen |= pro & (gen << (2 * shift));
+    pro &= pro << (2 * shift);
+    gen |= pro & (gen << (4 * shift));
+    return gen;
+}
+
+inline uint64_t fill_right(uint64_t gen, uint64_t pro, int shift) {
+    gen |= pro & (gen >> shift);
+    pro &= pro >> shift;
+    gen |= pro & (gen >> (2 * shift));
+    pro &= pro >> (2 * shift);
+    gen |= pro & (gen >> (4 * shift));
+    return gen;
+}
+
+uint64_t legal_moves_scalar(uint64_t player, uint64_t enemy) {
+    uint64_t empty = ~(player | enemy);
+    uint64_t moves = 0ULL;
+    for (int d = 0; d < 4; ++d) {
+        uint64_t pro = enemy & ENEMY_MASKS[d];
+        moves |= ((fill_left(player, pro, SHIFTS[d]) & pro) << SHIFTS[d]);
+        moves |= ((fill_right(player, pro, SHIFTS[d]) & pro) >> SHIFTS[d]);
+    }
+    return moves & empty;
+}
+
+uint64_t flips_scalar(uint64_t move, uint64_t player, uint64_t enemy) {
+    uint64_t flips = 0ULL;
+    for (int d = 0; d < 4; ++d) {
+        int shift = SHIFTS[d];
+        uint64_t pro = enemy & ENEMY_MASKS[d];
+        uint64_t left = (move << shift) & pro;
+        uint64_t right = (move >> shift) & pro;
+        for (int i = 0; i < 5; ++i) {
+            left |= (left << shift) & pro;
+            right |= (right >> shift) & pro;
         }
+        if ((left << shift) & player) flips |= left;
+        if ((right >> shift) & player) flips |= right;
     }
-    return total_flip_mask;
+    return flips;
+}
+
+#ifdef REVERSI_AVX2
+// The same propagation with the four shift amounts in the four 64-bit lanes of an AVX2 register.
+__attribute__((target("avx2"))) inline uint64_t or_lanes(__m256i x) {
+    __m128i half = _mm_or_si128(_mm256_castsi256_si128(x), _mm256_extracti128_si256(x, 1));
+    return static_cast<uint64_t>(_mm_cvtsi128_si64(_mm_or_si128(half, _mm_unpackhi_epi64(half, half))));
+}
+
+__attribute__((target("avx2"))) uint64_t legal_moves_avx2(uint64_t player, uint64_t enemy) {
+    const __m256i shifts = _mm256_set_epi64x(SHIFTS[3], SHIFTS[2], SHIFTS[1], SHIFTS[0]);
+    const __m256i shifts2 = _mm256_add_epi64(shifts, shifts);
+    const __m256i shifts4 = _mm256_add_epi64(shifts2, shifts2);
+    const __m256i pro = _mm256_and_si256(_mm256_set1_epi64x(static_cast<long long>(enemy)),
+        _mm256_set_epi64x(ENEMY_MASKS[3], ENEMY_MASKS[2], ENEMY_MASKS[1], ENEMY_MASKS[0]));
+    const __m256i own = _mm256_set1_epi64x(static_cast<long long>(player));
+
+    __m256i gen = own, pro_left = pro;
+    gen = _mm256_or_si256(gen, _mm256_and_si256(pro_left, _mm256_sllv_epi64(gen, shifts)));
+    pro_left = _mm256_and_si256(pro_left, _mm256_sllv_epi64(pro_left, shifts));
+    gen = _mm256_or_si256(gen, _mm256_and_si256(pro_left, _mm256_sllv_epi64(gen, shifts2)));
+    pro_left = _mm256_and_si256(pro_left, _mm256_sllv_epi64(pro_left, shifts2));
+    gen = _mm256_or_si256(gen, _mm256_and_si256(pro_left, _mm256_sllv_epi64(gen, shifts4)));
+    __m256i moves = _mm256_sllv_epi64(_mm256_and_si256(gen, pro), shifts);
+
+    gen = own;
+    __m256i pro_right = pro;
+    gen = _mm256_or_si256(gen, _mm256_and_si256(pro_right, _mm256_srlv_epi64(gen, shifts)));
+    pro_right = _mm256_and_si256(pro_right, _mm256_srlv_epi64(pro_right, shifts));
+    gen = _mm256_or_si256(gen, _mm256_and_si256(pro_right, _mm256_srlv_epi64(gen, shifts2)));
+    pro_right = _mm256_and_si256(pro_right, _mm256_srlv_epi64(pro_right, shifts2));
+    gen = _mm256_or_si256(gen, _mm256_and_si256(pro_right, _mm256_srlv_epi64(gen, shifts4)));
+    moves = _mm256_or_si256(moves, _mm256_srlv_epi64(_mm256_and_si256(gen, pro), shifts));
+
+    return or_lanes(moves) & ~(player | enemy);
+}
+
+__attribute__((target("avx2"))) uint64_t flips_avx2(uint64_t move, uint64_t player, uint64_t enemy) {
+    const __m256i shifts = _mm256_set_epi64x(SHIFTS[3], SHIFTS[2], SHIFTS[1], SHIFTS[0]);
+    const __m256i pro = _mm256_and_si256(_mm256_set1_epi64x(static_cast<long long>(enemy)),
+        _mm256_set_epi64x(ENEMY_MASKS[3], ENEMY_MASKS[2], ENEMY_MASKS[1], ENEMY_MASKS[0]));
+    const __m256i own = _mm256_set1_epi64x(static_cast<long long>(player));
+    const __m256i origin = _mm256_set1_epi64x(static_cast<long long>(move));
+    const __m256i zero = _mm256_setzero_si256();
+
+    __m256i left = _mm256_and_si256(_mm256_sllv_epi64(origin, shifts), pro);
+    __m256i right = _mm256_and_si256(_mm256_srlv_epi64(origin, shifts), pro);
+    for (int i = 0; i < 5; ++i) {
+        left = _mm256_or_si256(left, _mm256_and_si256(_mm256_sllv_epi64(left, shifts), pro));
+        right = _mm256_or_si256(right, _mm256_and_si256(_mm256_srlv_epi64(right, shifts), pro));
+    }
+    // Keep a run only when an own disc closes it.
+    __m256i open_left = _mm256_cmpeq_epi64(_mm256_and_si256(_mm256_sllv_epi64(left, shifts), own), zero);
+    __m256i open_right = _mm256_cmpeq_epi64(_mm256_and_si256(_mm256_srlv_epi64(right, shifts), own), zero);
+    __m256i flips = _mm256_or_si256(_mm256_andnot_si256(open_left, left), _mm256_andnot_si256(open_right, right));
+    return or_lanes(flips);
+}
+#endif
+
+struct MoveGenerator {
+    uint64_t (*legal_moves)(uint64_t player, uint64_t enemy);
+    uint64_t (*flips)(uint64_t move, uint64_t player, uint64_t enemy);
+    const char* name;
+};
+
+MoveGenerator select_move_generator() {
+#ifdef REVERSI_AVX2
+    __builtin_cpu_init();
+    if (__builtin_cpu_supports("avx2")) {
+        return MoveGenerator{legal_moves_avx2, flips_avx2, "avx2"};
+    }
+#endif
+    return MoveGenerator{legal_moves_scalar, flips_scalar, "scalar"};
+}
+
+const MoveGenerator move_generator = select_move_generator();
+
+} // namespace
+
+const char* move_generator_name() {
+    return move_generator.name;
+}
+
+uint64_t generate_legal_moves(uint64_t player_board, uint64_t enemy_board) {
+    return move_generator.legal_moves(player_board, enemy_board);
+}
+
+uint64_t generate_flips(int move_bit, uint64_t player_board, uint64_t enemy_board) {
+    return move_generator.flips(1ULL << move_bit, player_board, enemy_board);
+}
+
+uint64_t ReversiBitboard::_calculate_flips(int move_bit, uint64_t player_board, uint64_t enemy_board) const {
+    return generate_flips(move_bit, player_board, enemy_board);
 }
 
 uint64_t ReversiBitboard::get_legal_moves_bitboard() const {
     uint64_t player_board = (current_player == 1) ? black_board : white_board;
     uint64_t enemy_board = (current_player == 1) ? white_board : black_board;
-    uint64_t empty_squares = ~(player_board | enemy_board) & ALL_MASK;
-    uint64_t legal_moves = 0ULL;
-
-    for (int i = 0; i < BOARD_SIZE; ++i) {
-        if (((1ULL << i) & empty_squares)) {
-            if (_calculate_flips(i, player_board, enemy_board) != 0ULL) {
-                legal_moves |= (1ULL << i);
-            }
-        }
-    }
-    return legal_moves;
+    return generate_legal_moves(player_board, enemy_board);
 }
 
 void ReversiBitboard::apply_move(int move_bit) {
@@ -120,21 +226,15 @@ int ReversiBitboard::get_winner() const {
 }
 
 int ReversiBitboard::count_set_bits(uint64_t n) const {
-    int count = 0;
-    while (n > 0ULL) {
-        n &= (n - 1ULL);
-        count++;
-    }
-    return count;
+    return __builtin_popcountll(n);
 }
 
 std::vector<int> ReversiBitboard::get_legal_moves() const {
     uint64_t bitboard = get_legal_moves_bitboard();
     std::vector<int> moves;
-    for (int i = 0; i < BOARD_SIZE; ++i) {
-        if ((bitboard >> i) & 1ULL) {
-            moves.push_back(i);
-        }
+    moves.reserve(__builtin_popcountll(bitboard));
+    for (; bitboard != 0ULL; bitboard &= bitboard - 1ULL) {
+        moves.push_back(__builtin_ctzll(bitboard));
     }
     return moves;
 }
@@ -154,68 +254,163 @@ std::vector<int8_t> ReversiBitboard::board_to_numpy() const {
     return board_1d;
 }
 
-int get_row(int bit_index) { return bit_index / ReversiBitboard::BOARD_LENGTH; }
-int get_col(int bit_index) { return bit_index % ReversiBitboard::BOARD_LENGTH; }
-int get_bit_index(int row, int col) { return row * ReversiBitboard::BOARD_LENGTH + col; }
+int transform_square(int symmetry, int square) {
+    int row = square / ReversiBitboard::BOARD_LENGTH;
+    int col = square % ReversiBitboard::BOARD_LENGTH;
+    switch (symmetry) {
+        case 1: return row * 8 + (7 - col);           // horizontal flip
+        case 2: return (7 - row) * 8 + col;           // vertical flip
+        case 3: return (7 - row) * 8 + (7 - col);     // 180 rotation
+        case 4: return col * 8 + row;                 // main diagonal transpose
+        case 5: return (7 - col) * 8 + (7 - row);     // anti-diagonal transpose
+        case 6: return col * 8 + (7 - row);           // 90 rotation
+        case 7: return (7 - col) * 8 + row;           // 270 rotation
+        default: return square;
+    }
+}
+
+// Whole-board versions of the symmetries: a byte swap reverses the rows, and
+// delta swaps mirror the files or exchange the squares across a diagonal.
+namespace {
 
-int transform_horizontal(int bit_index) {
-    int row = get_row(bit_index);
-    int col = get_col(bit_index);
-    return get_bit_index(row, 7 - col);
+inline uint64_t mirror_files(uint64_t x) {
+    x = ((x >> 1) & 0x5555555555555555ULL) | ((x & 0x5555555555555555ULL) << 1);
+    x = ((x >> 2) & 0x3333333333333333ULL) | ((x & 0x3333333333333333ULL) << 2);
+    x = ((x >> 4) & 0x0f0f0f0f0f0f0f0fULL) | ((x & 0x0f0f0f0f0f0f0f0fULL) << 4);
+    return x;
 }
 
-int transform_vertical(int bit_index) {
-    int row = get_row(bit_index);
-    int col = get_col(bit_index);
-    return get_bit_index(7 - row, col);
+inline uint64_t flip_ranks(uint64_t x) {
+    return __builtin_bswap64(x);
 }
 
-int transform_transpose_main(int bit_index) {
-    int row = get_row(bit_index);
-    int col = get_col(bit_index);
-    return get_bit_index(col, row);
+inline uint64_t transpose_main_diagonal(uint64_t x) {
+    uint64_t t;
+    t = 0x0f0f0f0f00000000ULL & (x ^ (x << 28));
+    x ^= t ^ (t >> 28);
+    t = 0x3333000033330000ULL & (x ^ (x << 14));
+    x ^= t ^ (t >> 14);
+    t = 0x5500550055005500ULL & (x ^ (x << 7));
+    x ^= t ^ (t >> 7);
+    return x;
 }
 
-int transform_transpose_anti(int bit_index) {
-    int row = get_row(bit_index);
-    int col = get_col(bit_index);
-    return get_bit_index(7 - col, 7 - row);
+inline uint64_t transpose_anti_diagonal(uint64_t x) {
+    uint64_t t;
+    t = x ^ (x << 36);
+    x ^= 0xf0f0f0f00f0f0f0fULL & (t ^ (x >> 36));
+    t = 0xcccc0000cccc0000ULL & (x ^ (x << 18));
+    x ^= t ^ (t >> 18);
+    t = 0xaa00aa00aa00aa00ULL & (x ^ (x << 9));
+    x ^= t ^ (t >> 9);
+    return x;
 }
 
-uint64_t apply_board_transform(uint64_t board, int (*transform_func)(int)) {
-    uint64_t transformed_board = 0ULL;
-    for (int i = 0; i < ReversiBitboard::BOARD_SIZE; ++i) {
-        if ((board >> i) & 1ULL) {
-            transformed_board |= (1ULL << transform_func(i));
+} // namespace
+
+uint64_t transform_bitboard(int symmetry, uint64_t board) {
+    switch (symmetry) {
+        case 1: return mirror_files(board);
+        case 2: return flip_ranks(board);
+        case 3: return flip_ranks(mirror_files(board));
+        case 4: return transpose_main_diagonal(board);
+        case 5: return transpose_anti_diagonal(board);
+        case 6: return mirror_files(transpose_main_diagonal(board));
+        case 7: return flip_ranks(transpose_main_diagonal(board));
+        default: return board;
+    }
+}
+
+int canonical_symmetry(uint64_t black_board, uint64_t white_board) {
+    uint64_t best_black = black_board;
+    uint64_t best_white = white_board;
+    int symmetry = 0;
+    for (int s = 1; s < ReversiBitboard::NUM_SYMMETRIES; ++s) {
+        uint64_t black = transform_bitboard(s, black_board);
+        uint64_t white = transform_bitboard(s, white_board);
+        if (black < best_black || (black == best_black && white < best_white)) {
+            best_black = black;
+            best_white = white;
+            symmetry = s;
         }
     }
-    return transformed_board;
+    return symmetry;
 }
 
-ReversiBitboard ReversiBitboard::flip_horizontal() const {
+ReversiBitboard ReversiBitboard::transform(int symmetry) const {
     ReversiBitboard new_board = *this;
-    new_board.black_board = apply_board_transform(black_board, transform_horizontal);
-    new_board.white_board = apply_board_transform(white_board, transform_horizontal);
+    new_board.black_board = transform_bitboard(symmetry, black_board);
+    new_board.white_board = transform_bitboard(symmetry, white_board);
     return new_board;
 }
 
+std::pair<ReversiBitboard, int> ReversiBitboard::canonical() const {
+    int symmetry = canonical_symmetry(black_board, white_board);
+    return {transform(symmetry), symmetry};
+}
+
+ReversiBitboard ReversiBitboard::flip_horizontal() const {
+    return transform(1);
+}
+
 ReversiBitboard ReversiBitboard::flip_vertical() const {
-    ReversiBitboard new_board = *this;
-    new_board.black_board = apply_board_transform(black_board, transform_vertical);
-    new_board.white_board = apply_board_transform(white_board, transform_vertical);
-    return new_board;
+    return transform(2);
 }
 
 ReversiBitboard ReversiBitboard::transpose_main() const {
-    ReversiBitboard new_board = *this;
-    new_board.black_board = apply_board_transform(black_board, transform_transpose_main);
-    new_board.white_board = apply_board_transform(white_board, transform_transpose_main);
-    return new_board;
+    return transform(4);
 }
 
 ReversiBitboard ReversiBitboard::transpose_anti() const {
-    ReversiBitboard new_board = *this;
-    new_board.black_board = apply_board_transform(black_board, transform_transpose_anti);
-    new_board.white_board = apply_board_transform(white_board, transform_transpose_anti);
-    return new_board;
-}
\ No newline at end of file
+    return transform(5);
+}
+
+// Zobrist keys per square and colour, pre-combined per byte of the bitboard so
+// a hash takes 16 table lookups instead of one per disc.
+namespace {
+
+struct ZobristTable {
+    uint64_t bytes[2][8][256];
+    uint64_t white_to_move;
+
+    ZobristTable() {
+        uint64_t state = 0x2545f4914f6cdd1dULL;
+        auto next = [&state] {
+            uint64_t z = (state += 0x9e3779b97f4a7c15ULL);
+            z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9ULL;
+            z = (z ^ (z >> 27)) * 0x94d049bb133111ebULL;
+            return z ^ (z >> 31);
+        };
+        for (int color = 0; color < 2; ++color) {
+            for (int byte = 0; byte < 8; ++byte) {
+                uint64_t square_keys[8];
+                for (int bit = 0; bit < 8; ++bit) square_keys[bit] = next();
+                for (int value = 0; value < 256; ++value) {
+                    uint64_t key = 0ULL;
+                    for (int bit = 0; bit < 8; ++bit) {
+                        if ((value >> bit) & 1) key ^= square_keys[bit];
+                    }
+                    bytes[color][byte][value] = key;
+                }
+            }
+        }
+        white_to_move = next();
+    }
+};
+
+const ZobristTable zobrist;
+
+} // namespace
+
+uint64_t zobrist_hash(uint64_t black_board, uint64_t white_board, int player) {
+    uint64_t h = player == 2 ? zobrist.white_to_move : 0ULL;
+    for (int byte = 0; byte < 8; ++byte) {
+        h ^= zobrist.bytes[0][byte][(black_board >> (8 * byte)) & 0xff];
+        h ^= zobrist.bytes[1][byte][(white_board >> (8 * byte)) & 0xff];
+    }
+    return h;
+}
+
+uint64_t ReversiBitboard::hash() const {
+    return zobrist_hash(black_board, white_board, current_player);
+}
@@ -4,6 +4,7 @@
 #include <cstdint>
 #include <vector>
 #include <numeric>
+#include <utility>
 
 class ReversiBitboard {
 public:
@@ -22,6 +23,7 @@ public:
     static const uint64_t R_MASK = 0x8080808080808080ULL;
     static const uint64_t BLACK_INIT_BOARD = 0x0000001008000000ULL;
     static const uint64_t WHITE_INIT_BOARD = 0x0000000810000000ULL;
+    static const int NUM_SYMMETRIES = 8;
 
     ReversiBitboard();
     void reset();
@@ -39,9 +41,32 @@ public:
     ReversiBitboard flip_vertical() const;
     ReversiBitboard transpose_main() const;
     ReversiBitboard transpose_anti() const;
+    // Board under one of the NUM_SYMMETRIES symmetries (see transform_square).
+    ReversiBitboard transform(int symmetry) const;
+    // The symmetric form with the smallest (black, white) boards and the symmetry that produces it.
+    std::pair<ReversiBitboard, int> canonical() const;
+    // Zobrist hash of the discs and the side to move.
+    uint64_t hash() const;
 
 private:
     uint64_t _calculate_flips(int move_bit, uint64_t player_board, uint64_t enemy_board) const;
 };
 
+// The 8 symmetries of the board, applied to a square index or a whole bitboard:
+// 0 identity, 1 horizontal flip, 2 vertical flip, 3 180 rotation, 4 main
+// diagonal transpose, 5 anti-diagonal transpose, 6 90 rotation, 7 270 rotation.
+int transform_square(int symmetry, int square);
+uint64_t transform_bitboard(int symmetry, uint64_t board);
+// Symmetry that takes (black, white) to its canonical form.
+int canonical_symmetry(uint64_t black_board, uint64_t white_board);
+
+uint64_t zobrist_hash(uint64_t black_board, uint64_t white_board, int player);
+
+// Legal-move mask and flipped discs for raw bitboards of the side to move and its opponent.
+uint64_t generate_legal_moves(uint64_t player_board, uint64_t enemy_board);
+uint64_t generate_flips(int move_bit, uint64_t player_board, uint64_t enemy_board);
+
+// Move generation path picked for this CPU at load time: "avx2" or "scalar".
+const char* move_generator_name();
+
 #endif
\ No newline at end of file
@@ -0,0 +1,107 @@
+#include "transposition_table.h"
+#include <algorithm>
+#include <cstring>
+#include <stdexcept>
+
+static uint64_t mix64(uint64_t x) {
+    x ^= x >> 30;
+    x *= 0xbf58476d1ce4e5b9ULL;
+    x ^= x >> 27;
+    x *= 0x94d049bb133111ebULL;
+    x ^= x >> 31;
+    return x;
+}
+
+TranspositionTable::TranspositionTable(size_t max_entries, const std::string& replacement) {
+    if (replacement == "always") {
+        replace_always = true;
+    } else if (replacement == "visits") {
+        replace_always = false;
+    } else {
+        throw std::invalid_argument("Unknown transposition table replacement policy: " + replacement);
+    }
+    size_t num_buckets = 1;
+    while (num_buckets * 2 * 2 <= max_entries) {
+        num_buckets *= 2;
+    }
+    bucket_mask = num_buckets - 1;
+    entries.resize(num_buckets * 2);
+    clear();
+}
+
+void TranspositionTable::clear() {
+    for (auto& entry : entries) {
+        entry.player = 0;
+    }
+    used = 0;
+}
+
+size_t TranspositionTable::bucket_index(uint64_t black_board, uint64_t white_board, int player) const {
+    uint64_t h = mix64(black_board ^ mix64(white_board ^ static_cast<uint64_t>(player)));
+    return (h & bucket_mask) * 2;
+}
+
+TTEntry* TranspositionTable::find(uint64_t black_board, uint64_t white_board, int player) {
+    size_t index = bucket_index(black_board, white_board, player);
+    for (size_t slot = index; slot < index + 2; ++slot) {
+        TTEntry& entry = entries[slot];
+        if (entry.player == player && entry.black_board == black_board && entry.white_board == white_board) {
+            return &entry;
+        }
+    }
+    return nullptr;
+}
+
+const TTEntry* TranspositionTable::probe(uint64_t black_board, uint64_t white_board, int player) {
+    TTEntry* entry = find(black_board, white_board, player);
+    if (entry != nullptr) {
+        hits++;
+        entry->generation = generation;
+    } else {
+        misses++;
+    }
+    return entry;
+}
+
+void TranspositionTable::store(uint64_t black_board, uint64_t white_board, int player, const float* policy, float value) {
+    TTEntry* target = find(black_board, white_board, player);
+    if (target == nullptr) {
+        size_t index = bucket_index(black_board, white_board, player);
+        TTEntry* first = &entries[index];
+        TTEntry* second = &entries[index + 1];
+        if (first->player == 0) {
+            target = first;
+        } else if (second->player == 0) {
+            target = second;
+        } else if (replace_always) {
+            target = second;
+        } else if (first->generation != second->generation) {
+            target = first->generation < second->generation ? first : second;
+        } else {
+            target = first->n_visits < second->n_visits ? first : second;
+        }
+
+        if (target->player == 0) {
+            used++;
+        } else {
+            evictions++;
+        }
+        target->black_board = black_board;
+        target->white_board = white_board;
+        target->player = static_cast<uint8_t>(player);
+        target->n_visits = 0;
+        target->sum_value = 0.0f;
+    }
+    target->generation = generation;
+    target->value = value;
+    std::memcpy(target->policy, policy, sizeof(target->policy));
+    stores++;
+}
+
+void TranspositionTable::add_visit(uint64_t black_board, uint64_t white_board, int player, double value) {
+    TTEntry* entry = find(black_board, white_board, player);
+    if (entry != nullptr) {
+        entry->n_visits++;
+        entry->sum_value += static_cast<float>(value);
+    }
+}
@@ -0,0 +1,53 @@
+#ifndef TRANSPOSITION_TABLE_H
+#define TRANSPOSITION_TABLE_H
+
+#include <cstdint>
+#include <vector>
+#include <string>
+
+struct TTEntry {
+    uint64_t black_board;
+    uint64_t white_board;
+    uint8_t player;      // 0 marks an empty slot
+    uint32_t generation;
+    float value;
+    float policy[64];
+    // Visit statistics summed over every tree node holding this position.
+    int32_t n_visits;
+    float sum_value;
+};
+
+// Fixed-size table of two-slot buckets keyed by (black_board, white_board, player).
+// On a full bucket the replacement policy picks the victim:
+//   "always" - the newest entry always goes in, evicting the second slot
+//   "visits" - evict entries from older searches first, then the one with fewer visits
+class TranspositionTable {
+public:
+    TranspositionTable(size_t max_entries, const std::string& replacement);
+
+    const TTEntry* probe(uint64_t black_board, uint64_t white_board, int player);
+    void store(uint64_t black_board, uint64_t white_board, int player, const float* policy, float value);
+    void add_visit(uint64_t black_board, uint64_t white_board, int player, double value);
+    void new_search() { generation++; }
+    void clear();
+
+    size_t capacity() const { return entries.size(); }
+    size_t size() const { return used; }
+
+    long long hits = 0;
+    long long misses = 0;
+    long long stores = 0;
+    long long evictions = 0;
+
+private:
+    std::vector<TTEntry> entries;
+    size_t bucket_mask;
+    size_t used = 0;
+    uint32_t generation = 0;
+    bool replace_always;
+
+    TTEntry* find(uint64_t black_board, uint64_t white_board, int player);
+    size_t bucket_index(uint64_t black_board, uint64_t white_board, int player) const;
+};
+
+#endif // TRANSPOSITION_TABLE_H
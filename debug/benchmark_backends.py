@@ -0,0 +1,80 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import Model_Path
+from evaluators import BACKENDS, load_evaluator
+
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+MIN_REPEATS = 5
+MIN_SECONDS = 0.5
+PARITY_POSITIONS = 256
+
+def time_batch(evaluator, batch_size):
+    rng = np.random.default_rng(batch_size)
+    planes = (rng.random((batch_size, 8, 8, 2)) < 0.3).astype(np.float32)
+    evaluator._predict_planes_cpp(planes)
+
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < MIN_REPEATS or time.perf_counter() - start < MIN_SECONDS:
+        batch_start = time.perf_counter()
+        policy, value = evaluator._predict_planes_cpp(planes)
+        np.asarray(policy), np.asarray(value)
+        timings.append(time.perf_counter() - batch_start)
+    return np.median(timings)
+
+def report_parity(evaluators):
+    if 'keras' not in evaluators:
+        print("keras unavailable, skipping parity check")
+        return
+    rng = np.random.default_rng(0)
+    stones = rng.random((PARITY_POSITIONS, 8, 8))
+    planes = np.zeros((PARITY_POSITIONS, 8, 8, 2), dtype=np.float32)
+    planes[..., 0] = stones < 0.3
+    planes[..., 1] = (stones >= 0.3) & (stones < 0.6)
+
+    keras_policy, keras_value = evaluators['keras']._predict_planes_cpp(planes)
+    keras_policy, keras_value = np.asarray(keras_policy), np.asarray(keras_value).reshape(-1)
+    print(f"\n--- Max absolute error against keras, {PARITY_POSITIONS} positions ---")
+    for backend, evaluator in evaluators.items():
+        if backend == 'keras':
+            continue
+        policy, value = evaluator._predict_planes_cpp(planes)
+        policy_error = np.abs(np.asarray(policy) - keras_policy).max()
+        value_error = np.abs(np.asarray(value).reshape(-1) - keras_value).max()
+        print(f"{backend:>8}: policy {policy_error:.2e}, value {value_error:.2e}")
+
+def benchmark(model_path, backends):
+    results = {}
+    evaluators = {}
+    for backend in backends:
+        load_start = time.perf_counter()
+        try:
+            evaluator = load_evaluator(model_path, backend)
+        except Exception as e:
+            print(f"{backend}: unavailable ({e})")
+            continue
+        print(f"{backend}: loaded in {time.perf_counter() - load_start:.2f}s")
+        evaluators[backend] = evaluator
+        results[backend] = [time_batch(evaluator, batch_size) for batch_size in BATCH_SIZES]
+
+    print(f"\n--- Per-batch latency (ms), {model_path} ---")
+    print("batch " + "".join(f"{backend:>12}" for backend in results))
+    for i, batch_size in enumerate(BATCH_SIZES):
+        print(f"{batch_size:>5} " + "".join(f"{results[backend][i] * 1000:>12.3f}" for backend in results))
+
+    print("\n--- Per-position latency (us) ---")
+    print("batch " + "".join(f"{backend:>12}" for backend in results))
+    for i, batch_size in enumerate(BATCH_SIZES):
+        print(f"{batch_size:>5} " + "".join(f"{results[backend][i] * 1e6 / batch_size:>12.1f}" for backend in results))
+
+    report_parity(evaluators)
+
+if __name__ == "__main__":
+    model_path = sys.argv[1] if len(sys.argv) > 1 else Model_Path
+    backends = sys.argv[2].split(',') if len(sys.argv) > 2 else list(BACKENDS)
+    benchmark(model_path, backends)
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from reversi_bitboard_cpp import BatchBoard, move_generator
+
+# Usage: python debug/benchmark_batch_board.py [num games]
+# Plays uniformly random games with BatchBoard, then times each batch call.
+
+def random_moves(boards, rng):
+    mask = boards.legal_mask()
+    moves = np.argmax(rng.random(mask.shape) * mask, axis=1)
+    moves[~mask.any(axis=1)] = -1
+    return moves
+
+def play_random_games(num_games, seed=0):
+    rng = np.random.default_rng(seed)
+    boards = BatchBoard(num_games)
+    positions = 0
+    hashes = []
+    start_time = time.perf_counter()
+    while True:
+        active = ~boards.is_game_over()
+        if not active.any():
+            break
+        positions += int(active.sum())
+        canonical, _ = boards.canonical()
+        hashes.append(canonical.hashes()[active])
+        boards.apply_moves(random_moves(boards, rng))
+    elapsed = time.perf_counter() - start_time
+
+    winners = np.bincount(boards.winners(), minlength=3)
+    discs = boards.disc_counts()
+    unique = len(np.unique(np.concatenate(hashes)))
+    print(f"{num_games} random games, {positions} positions in {elapsed:.2f}s ({positions / elapsed / 1e6:.2f}M positions/s)")
+    print(f"Black {winners[1] / num_games:.1%}, White {winners[2] / num_games:.1%}, Draw {winners[0] / num_games:.1%}")
+    print(f"Ave discs - Black: {discs[:, 0].mean():.1f}, White: {discs[:, 1].mean():.1f}")
+    print(f"Unique positions up to symmetry: {unique} ({unique / positions:.1%})")
+
+def time_calls(num_positions, num_plies=20, seed=0):
+    rng = np.random.default_rng(seed)
+    boards = BatchBoard(num_positions)
+    for _ in range(num_plies):
+        boards.apply_moves(random_moves(boards, rng))
+    moves = random_moves(boards, rng)
+
+    calls = {
+        'legal_moves': boards.legal_moves,
+        'legal_mask': boards.legal_mask,
+        'is_game_over': boards.is_game_over,
+        'winners': boards.winners,
+        'transform': lambda: boards.transform(6),
+        'canonical': boards.canonical,
+        'hashes': boards.hashes,
+        'planes': boards.planes,
+        'apply_moves': lambda: boards.copy().apply_moves(moves),
+    }
+    print(f"\n--- {num_positions} positions after {num_plies} random plies ({move_generator()} move generator) ---")
+    for name, call in calls.items():
+        start_time = time.perf_counter()
+        call()
+        elapsed = time.perf_counter() - start_time
+        print(f"{name:>14}: {num_positions / elapsed / 1e6:8.1f}M positions/s")
+
+if __name__ == "__main__":
+    num_games = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    play_random_games(num_games)
+    time_calls(1000000)
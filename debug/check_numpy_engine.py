@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import Model_Path
+from evaluators import NumpyEvaluator, _read_h5_layers
+
+NUM_POSITIONS = 512
+POLICY_TOLERANCE = 1e-4
+VALUE_TOLERANCE = 1e-4
+
+def keras_predict(model_path, planes):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+    return model.predict(planes, batch_size=256, verbose=0)
+
+def _inbound_names(layer):
+    if not layer['inbound_nodes']:
+        return []
+    node = layer['inbound_nodes'][0]
+    if isinstance(node, dict):
+        args = node['args'][0]
+        return [arg['config']['keras_history'][0] for arg in (args if isinstance(args, list) else [args])]
+    return [inbound[0] for inbound in node]
+
+def _conv_same(x, kernel, bias):
+    kh, kw = kernel.shape[:2]
+    padded = np.pad(x, ((0, 0), (kh // 2, kh // 2), (kw // 2, kw // 2), (0, 0)))
+    out = np.zeros(x.shape[:3] + (kernel.shape[-1],))
+    for dy in range(kh):
+        for dx in range(kw):
+            out += padded[:, dy:dy + 8, dx:dx + 8] @ kernel[dy, dx]
+    return out + bias
+
+def _activate(x, activation):
+    if activation == 'relu':
+        return np.maximum(x, 0)
+    if activation == 'tanh':
+        return np.tanh(x)
+    if activation == 'softmax':
+        e = np.exp(x - x.max(axis=-1, keepdims=True))
+        return e / e.sum(axis=-1, keepdims=True)
+    if activation == 'linear':
+        return x
+    raise ValueError(f"unsupported activation '{activation}'")
+
+# Walks the Keras graph in the .h5 config in float64 with BatchNorm kept separate,
+# for machines without TensorFlow. It shares only the weight reader with the engine.
+def reference_predict(model_path, planes):
+    import h5py
+
+    with h5py.File(model_path, 'r') as f:
+        model_config = f.attrs['model_config']
+    model_config = json.loads(model_config.decode('utf-8') if isinstance(model_config, bytes) else model_config)['config']
+    weights = {name: [w.astype(np.float64) for w in layer_weights] for _, name, _, layer_weights in _read_h5_layers(model_path)}
+
+    outputs = {}
+    for layer in model_config['layers']:
+        class_name, config, name = layer['class_name'], layer['config'], layer['config']['name']
+        inputs = [outputs[inbound] for inbound in _inbound_names(layer)]
+        w = weights[name]
+        if class_name == 'InputLayer':
+            x = planes.astype(np.float64)
+        elif class_name == 'Conv2D':
+            x = _activate(_conv_same(inputs[0], w[0], w[1]), config.get('activation', 'linear'))
+        elif class_name == 'BatchNormalization':
+            gamma, beta, mean, variance = w
+            x = (inputs[0] - mean) / np.sqrt(variance + config.get('epsilon', 1e-3)) * gamma + beta
+        elif class_name == 'ReLU':
+            x = inputs[0]
+            x = np.where(x >= (config.get('threshold') or 0), x, (config.get('negative_slope') or 0) * (x - (config.get('threshold') or 0)))
+            if config.get('max_value') is not None:
+                x = np.minimum(x, config['max_value'])
+        elif class_name == 'Add':
+            x = sum(inputs)
+        elif class_name == 'Flatten':
+            x = inputs[0].reshape(len(inputs[0]), -1)
+        elif class_name == 'Dense':
+            x = _activate(inputs[0] @ w[0] + w[1], config.get('activation', 'linear'))
+        else:
+            raise ValueError(f"reference does not handle {class_name} layer {name}")
+        outputs[name] = x
+    return [outputs[output[0]] for output in model_config['output_layers']]
+
+def check(model_path):
+    rng = np.random.default_rng(0)
+    stones = rng.random((NUM_POSITIONS, 8, 8))
+    planes = np.zeros((NUM_POSITIONS, 8, 8, 2), dtype=np.float32)
+    planes[..., 0] = stones < 0.3
+    planes[..., 1] = (stones >= 0.3) & (stones < 0.6)
+
+    try:
+        expected_policy, expected_value = keras_predict(model_path, planes)
+        reference = "keras"
+    except ImportError:
+        expected_policy, expected_value = reference_predict(model_path, planes)
+        reference = "float64 reference (TensorFlow not installed)"
+    numpy_policy, numpy_value = NumpyEvaluator(model_path)._predict_planes_cpp(planes)
+
+    policy_error = np.abs(expected_policy - numpy_policy).max()
+    value_error = np.abs(expected_value.reshape(-1) - numpy_value).max()
+    print(f"{model_path} against {reference}: max policy error {policy_error:.2e}, max value error {value_error:.2e}")
+    ok = policy_error <= POLICY_TOLERANCE and value_error <= VALUE_TOLERANCE
+    print("OK" if ok else "MISMATCH")
+    return ok
+
+if __name__ == "__main__":
+    model_path = sys.argv[1] if len(sys.argv) > 1 else Model_Path
+    if not check(model_path):
+        sys.exit(1)
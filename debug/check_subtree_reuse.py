@@ -0,0 +1,56 @@
+import os
+import random
+import sys
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from reversi_bitboard_cpp import ReversiBitboard
+from reversi_mcts_cpp import MCTS
+
+# A root move played after a search whose children were all solved exactly:
+# the reused child has to be expanded again, not returned as a bare leaf.
+NUM_POSITIONS = 20
+ENDGAME_EMPTIES = 12
+NUM_SIMULATIONS = 200
+
+class UniformModel:
+    def _predict_internal_cpp(self, boards, players):
+        n = len(boards)
+        return np.full((n, 64), 1 / 64, dtype=np.float32), np.zeros(n, dtype=np.float32)
+
+def random_position(rng, empties):
+    while True:
+        board = ReversiBitboard()
+        while not board.is_game_over() and 64 - bin(board.black_board | board.white_board).count('1') > empties:
+            moves = board.get_legal_moves()
+            board.apply_move(rng.choice(moves) if moves else -1)
+        if not board.is_game_over() and board.get_legal_moves():
+            return board
+
+def check():
+    rng = random.Random(0)
+    failures = 0
+    for i in range(NUM_POSITIONS):
+        board = random_position(rng, ENDGAME_EMPTIES + 1)
+        mcts = MCTS(UniformModel(), c_puct=2.0, batch_size=4, endgame_empties=ENDGAME_EMPTIES)
+        result = mcts.search(board, board.current_player, NUM_SIMULATIONS, False)
+        move = int(np.argmax(result.child_stats()['visits']))
+        board.apply_move(move)
+        while not board.is_game_over() and not board.get_legal_moves():
+            board.apply_move(-1)
+        if board.is_game_over():
+            continue
+
+        result = mcts.search(board, board.current_player, NUM_SIMULATIONS, False)
+        visits = result.child_stats()['visits']
+        best_move = int(np.argmax(visits))
+        if visits.sum() == 0 or best_move not in board.get_legal_moves():
+            print(f"Position {i}: reused root has no searched children")
+            failures += 1
+    print("OK" if failures == 0 else f"{failures} FAILED")
+    return failures == 0
+
+if __name__ == "__main__":
+    if not check():
+        sys.exit(1)
@@ -0,0 +1,238 @@
+import os
+import json
+import numpy as np
+from config import INFERENCE_BACKEND, TFLITE_NUM_THREADS, TFLITE_VARIANT
+
+# Evaluator protocol used by the C++ MCTS, the inference server and the Python tools:
+#   _predict_planes_cpp(planes)          float32 [N, 8, 8, 2] (side to move first) -> (policy [N, 64], value [N])
+#   _predict_internal_cpp(boards, players)   int8 [N, 64] boards, int32 [N] players -> same outputs
+#   warmup(batch_size)
+#   cache_key                            identifies the weights in the evaluation cache
+# ModelWrapper (Keras) implements it natively; the other backends only provide
+# the planes entry point and inherit the board conversion below.
+
+BACKENDS = ('keras', 'tflite', 'numpy', 'daemon')
+
+def model_cache_key(model_path, backend):
+    return hash((os.path.abspath(model_path), os.path.getmtime(model_path), backend)) & 0xffffffffffffffff
+
+def planes_from_boards(board_batch, player_batch):
+    boards = np.asarray(board_batch, dtype=np.int8).reshape(-1, 8, 8)
+    players = np.asarray(player_batch, dtype=np.int8).reshape(-1, 1, 1)
+    return np.stack([boards == players, boards == 3 - players], axis=-1).astype(np.float32)
+
+class Evaluator:
+    def _predict_internal_cpp(self, board_batch, player_batch):
+        return self._predict_planes_cpp(planes_from_boards(board_batch, player_batch))
+
+    def warmup(self, batch_size):
+        self._predict_planes_cpp(np.zeros((batch_size, 8, 8, 2), dtype=np.float32))
+
+def tflite_path_for(model_path, variant=''):
+    suffix = f'_{variant}' if variant else ''
+    return os.path.splitext(model_path)[0] + suffix + '.tflite'
+
+def tflite_converter(model):
+    import tensorflow as tf
+
+    return tf.lite.TFLiteConverter.from_keras_model(model)
+
+# A float32 conversion must reproduce Keras on a fixed batch before it is kept.
+TFLITE_CHECK_POSITIONS = 64
+TFLITE_MAX_ERROR = 1e-3
+
+def check_tflite(model, tflite_path):
+    rng = np.random.default_rng(0)
+    stones = rng.random((TFLITE_CHECK_POSITIONS, 8, 8))
+    planes = np.zeros((TFLITE_CHECK_POSITIONS, 8, 8, 2), dtype=np.float32)
+    planes[..., 0] = stones < 0.3
+    planes[..., 1] = (stones >= 0.3) & (stones < 0.6)
+
+    keras_policy, keras_value = model.predict(planes, batch_size=TFLITE_CHECK_POSITIONS, verbose=0)
+    policy, value = TFLiteEvaluator(tflite_path)._predict_planes_cpp(planes)
+    error = max(np.abs(keras_policy - policy).max(), np.abs(keras_value.reshape(-1) - value).max())
+    if not np.isfinite(error) or error > TFLITE_MAX_ERROR:
+        raise ValueError(f"{tflite_path}: TFLite outputs differ from Keras by {error:.2e} (max {TFLITE_MAX_ERROR})")
+
+def convert_to_tflite(model_path, tflite_path):
+    import tensorflow as tf
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+    candidate_path = tflite_path + '.tmp'
+    try:
+        with open(candidate_path, 'wb') as f:
+            f.write(tflite_converter(model).convert())
+        check_tflite(model, candidate_path)
+        os.replace(candidate_path, tflite_path)
+    finally:
+        if os.path.exists(candidate_path):
+            os.remove(candidate_path)
+    print(f"TFLite model -> {tflite_path}")
+
+def _tflite_interpreter_class():
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+# Float TFLite models run on the XNNPACK CPU delegate, which the interpreter
+# applies by default.
+class TFLiteEvaluator(Evaluator):
+    def __init__(self, tflite_path, num_threads=TFLITE_NUM_THREADS):
+        Interpreter = _tflite_interpreter_class()
+        self.interpreter = Interpreter(model_path=tflite_path, num_threads=num_threads)
+        self.cache_key = model_cache_key(tflite_path, 'tflite')
+        self._input_index = self.interpreter.get_input_details()[0]['index']
+        self._policy_index = None
+        self._value_index = None
+        self._batch_size = None
+
+    def _resize(self, batch_size):
+        self.interpreter.resize_tensor_input(self._input_index, [batch_size, 8, 8, 2])
+        self.interpreter.allocate_tensors()
+        for output in self.interpreter.get_output_details():
+            if output['shape'][-1] == 64:
+                self._policy_index = output['index']
+            else:
+                self._value_index = output['index']
+        self._batch_size = batch_size
+
+    def _predict_planes_cpp(self, planes):
+        planes = np.ascontiguousarray(planes, dtype=np.float32)
+        if planes.shape[0] != self._batch_size:
+            self._resize(planes.shape[0])
+        self.interpreter.set_tensor(self._input_index, planes)
+        self.interpreter.invoke()
+        policy = self.interpreter.get_tensor(self._policy_index)
+        value = self.interpreter.get_tensor(self._value_index)
+        return policy, value.reshape(-1)
+
+def _layer_order(name):
+    suffix = name.rsplit('_', 1)[-1]
+    return int(suffix) if suffix.isdigit() else 0
+
+def _read_h5_layers(model_path):
+    import h5py
+
+    with h5py.File(model_path, 'r') as f:
+        config = f.attrs['model_config']
+        config = json.loads(config.decode('utf-8') if isinstance(config, bytes) else config)
+        weights_group = f['model_weights'] if 'model_weights' in f else f
+        layers = []
+        for layer in config['config']['layers']:
+            name = layer['config']['name']
+            weights = []
+            if name in weights_group:
+                group = weights_group[name]
+                for weight_name in group.attrs['weight_names']:
+                    weight_name = weight_name.decode('utf-8') if isinstance(weight_name, bytes) else weight_name
+                    weights.append(np.asarray(group[weight_name], dtype=np.float32))
+            layers.append((layer['class_name'], name, layer['config'], weights))
+    return layers
+
+def _conv3x3(x, kernel, bias):
+    n, channels = x.shape[0], x.shape[-1]
+    padded = np.zeros((n, 10, 10, channels), dtype=np.float32)
+    padded[:, 1:9, 1:9] = x
+    # im2col: (n, 8, 8, channels, 3, 3) windows reordered to the (dy, dx, channel) kernel layout.
+    windows = np.lib.stride_tricks.sliding_window_view(padded, (3, 3), axis=(1, 2))
+    columns = windows.transpose(0, 1, 2, 4, 5, 3).reshape(n * 64, 9 * channels)
+    return (columns @ kernel + bias).reshape(n, 8, 8, -1)
+
+def _softmax(x):
+    e = np.exp(x - x.max(axis=-1, keepdims=True))
+    return e / e.sum(axis=-1, keepdims=True)
+
+_ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'softmax': _softmax,
+}
+
+def _activation(model_path, name, config):
+    activation = config.get('activation', 'linear')
+    if activation not in _ACTIVATIONS:
+        raise ValueError(f"{model_path}: unsupported activation '{activation}' in layer {name}")
+    return _ACTIVATIONS[activation]
+
+# Forward pass of the dual ResNet from Database/createModel.py in NumPy, read
+# straight from the Keras .h5 (h5py only, no TensorFlow). BatchNorm is folded
+# into the preceding convolution and every 3x3 convolution is one GEMM over
+# im2col patches. Layers are matched by type in creation order, so only that
+# architecture is supported, but Dense activations are taken from the model
+# config; debug/check_numpy_engine.py compares it with Keras.
+class NumpyEvaluator(Evaluator):
+    def __init__(self, model_path):
+        self.cache_key = model_cache_key(model_path, 'numpy')
+        layers = sorted(_read_h5_layers(model_path), key=lambda layer: _layer_order(layer[1]))
+        convs = [weights for class_name, _, _, weights in layers if class_name == 'Conv2D']
+        norms = [(weights, config.get('epsilon', 1e-3)) for class_name, _, config, weights in layers if class_name == 'BatchNormalization']
+        dense = {name: (weights, _activation(model_path, name, config)) for class_name, name, config, weights in layers if class_name == 'Dense'}
+        for class_name, name, config, _ in layers:
+            plain_relu = config.get('max_value') is None and not config.get('negative_slope') and not config.get('threshold')
+            if (class_name == 'ReLU' and not plain_relu) or (class_name == 'Conv2D' and config.get('activation', 'linear') != 'linear'):
+                raise ValueError(f"{model_path}: layer {name} has an activation the NumPy engine does not apply")
+        if len(convs) != len(norms) or len(convs) < 3 or len(dense) != 3:
+            raise ValueError(f"{model_path} is not a create_dual_resnet_model network")
+
+        self.convs = [self._fold(kernel, bias, weights, epsilon) for (kernel, bias), (weights, epsilon) in zip(convs, norms)]
+        self.policy_dense = dense.pop('policy_output')
+        self.value_output = dense.pop('value_output')
+        self.value_dense = dense.popitem()[1]
+        self.num_blocks = (len(self.convs) - 3) // 2
+
+    @staticmethod
+    def _fold(kernel, bias, norm_weights, epsilon):
+        gamma, beta, mean, variance = norm_weights
+        scale = gamma / np.sqrt(variance + epsilon)
+        kernel = (kernel * scale).reshape(-1, kernel.shape[-1])
+        return np.ascontiguousarray(kernel, dtype=np.float32), ((bias - mean) * scale + beta).astype(np.float32)
+
+    def _conv(self, x, index):
+        kernel, bias = self.convs[index]
+        if kernel.shape[0] == x.shape[-1]:
+            return x @ kernel + bias
+        return _conv3x3(x, kernel, bias)
+
+    @staticmethod
+    def _dense(x, layer):
+        (kernel, bias), activation = layer
+        return activation(x @ kernel + bias)
+
+    def _predict_planes_cpp(self, planes):
+        x = np.asarray(planes, dtype=np.float32)
+        x = np.maximum(self._conv(x, 0), 0)
+        for block in range(self.num_blocks):
+            residual = x
+            x = np.maximum(self._conv(x, 1 + 2 * block), 0)
+            x = np.maximum(self._conv(x, 2 + 2 * block) + residual, 0)
+
+        head = 1 + 2 * self.num_blocks
+        batch_size = x.shape[0]
+        policy = np.maximum(self._conv(x, head), 0).reshape(batch_size, -1)
+        policy = self._dense(policy, self.policy_dense)
+        value = np.maximum(self._conv(x, head + 1), 0).reshape(batch_size, -1)
+        value = self._dense(self._dense(value, self.value_dense), self.value_output)
+        return policy, value.reshape(-1)
+
+def load_evaluator(model_path, backend=None):
+    backend = backend or INFERENCE_BACKEND
+    if backend == 'keras':
+        from model_wrapper import ModelWrapper
+        return ModelWrapper(model_path)
+    if backend == 'tflite':
+        tflite_path = model_path if model_path.endswith('.tflite') else tflite_path_for(model_path, TFLITE_VARIANT)
+        if not os.path.exists(tflite_path):
+            if TFLITE_VARIANT:
+                raise FileNotFoundError(f"{tflite_path} not found, create it with `python export_tflite.py {model_path}`")
+            convert_to_tflite(model_path, tflite_path)
+        return TFLiteEvaluator(tflite_path)
+    if backend == 'numpy':
+        return NumpyEvaluator(model_path)
+    if backend == 'daemon':
+        from model_daemon import DaemonClient
+        return DaemonClient(model_path)
+    raise ValueError(f"Unknown inference backend '{backend}', expected one of {BACKENDS}")
@@ -0,0 +1,125 @@
+import os
+import sys
+import glob
+import random
+import numpy as np
+import msgpack
+import tensorflow as tf
+from config import (
+    TRAINING_DATA_DIR,
+    CURRENT_GENERATION_DATA_SUBDIR,
+    EXPORT_MODEL_PATH,
+    EXPORT_CALIBRATION_SAMPLES,
+    EXPORT_VALIDATION_SAMPLES,
+    EXPORT_MAX_POLICY_KL,
+    EXPORT_MAX_VALUE_MAE
+)
+from evaluators import TFLiteEvaluator, planes_from_boards, tflite_converter, tflite_path_for
+
+# Usage: python export_tflite.py [model.h5] [training data subdir]
+# Writes <model>_float16.tflite and <model>_int8.tflite next to the .h5. An
+# artifact whose outputs drift too far from the float model is not kept.
+
+QUANTIZATIONS = ('float16', 'int8')
+
+def generation_data_subdir(model_path):
+    generation = os.path.basename(model_path).split('_')[0]
+    if generation.endswith('G') and os.path.isdir(os.path.join(TRAINING_DATA_DIR, generation)):
+        return generation
+    return CURRENT_GENERATION_DATA_SUBDIR
+
+def sample_positions(data_dir, num_samples, seed=0):
+    rng = random.Random(seed)
+    boards, players = [], []
+    seen = 0
+    for path in sorted(glob.glob(os.path.join(data_dir, '*.msgpack'))):
+        with open(path, 'rb') as f:
+            for records in msgpack.Unpacker(f, raw=False, use_list=True):
+                for record in records:
+                    seen += 1
+                    if len(boards) < num_samples:
+                        boards.append(record['board'])
+                        players.append(record['player'])
+                    else:
+                        slot = rng.randrange(seen)
+                        if slot < num_samples:
+                            boards[slot] = record['board']
+                            players[slot] = record['player']
+    if not boards:
+        raise FileNotFoundError(f"No training positions found in {data_dir}")
+    return planes_from_boards(boards, players)
+
+def convert(model, quantization, calibration_planes):
+    converter = tflite_converter(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        # Weights and activations in int8; input and output stay float32 so the
+        # artifact drops into TFLiteEvaluator unchanged.
+        converter.representative_dataset = lambda: ([planes[np.newaxis]] for planes in calibration_planes)
+    return converter.convert()
+
+def policy_kl(reference, candidate, eps=1e-7):
+    reference = np.clip(reference, eps, 1.0)
+    candidate = np.clip(candidate, eps, 1.0)
+    return float(np.mean(np.sum(reference * np.log(reference / candidate), axis=-1)))
+
+def compare(reference_policy, reference_value, tflite_path, planes, batch_size=256):
+    evaluator = TFLiteEvaluator(tflite_path)
+    policies, values = [], []
+    for start in range(0, len(planes), batch_size):
+        policy, value = evaluator._predict_planes_cpp(planes[start:start + batch_size])
+        policies.append(policy)
+        values.append(value)
+    policy = np.concatenate(policies)
+    value = np.concatenate(values)
+    return policy_kl(reference_policy, policy), float(np.mean(np.abs(reference_value - value)))
+
+def export(model_path, data_subdir=None):
+    data_subdir = data_subdir or generation_data_subdir(model_path)
+    data_dir = os.path.join(TRAINING_DATA_DIR, data_subdir)
+    planes = sample_positions(data_dir, EXPORT_CALIBRATION_SAMPLES + EXPORT_VALIDATION_SAMPLES)
+    np.random.default_rng(0).shuffle(planes)
+    calibration_planes = planes[:EXPORT_CALIBRATION_SAMPLES]
+    validation_planes = planes[EXPORT_CALIBRATION_SAMPLES:]
+    if len(validation_planes) == 0:
+        validation_planes = calibration_planes
+    print(f"Positions <- {data_dir}: {len(calibration_planes)} calibration, {len(validation_planes)} validation")
+
+    model = tf.keras.models.load_model(model_path, compile=False)
+    print(f"Model loaded <- {model_path}")
+    reference_policy, reference_value = model.predict(validation_planes, batch_size=256, verbose=0)
+    reference_value = reference_value.reshape(-1)
+
+    rejected = []
+    for quantization in QUANTIZATIONS:
+        tflite_path = tflite_path_for(model_path, quantization)
+        candidate_path = tflite_path + '.tmp'
+        try:
+            with open(candidate_path, 'wb') as f:
+                f.write(convert(model, quantization, calibration_planes))
+            kl, mae = compare(reference_policy, reference_value, candidate_path, validation_planes)
+            size_kb = os.path.getsize(candidate_path) / 1024
+            print(f"{quantization}: policy KL {kl:.5f} (max {EXPORT_MAX_POLICY_KL}), value MAE {mae:.5f} (max {EXPORT_MAX_VALUE_MAE}), {size_kb:.0f} KB")
+
+            # NaN outputs compare false against the limits, so they are rejected explicitly.
+            if not np.isfinite(kl) or not np.isfinite(mae) or kl > EXPORT_MAX_POLICY_KL or mae > EXPORT_MAX_VALUE_MAE:
+                rejected.append(quantization)
+                print(f"{quantization}: rejected")
+            else:
+                os.replace(candidate_path, tflite_path)
+                print(f"{quantization}: saved -> {tflite_path}")
+        finally:
+            if os.path.exists(candidate_path):
+                os.remove(candidate_path)
+    return rejected
+
+if __name__ == "__main__":
+    model_path = sys.argv[1] if len(sys.argv) > 1 else EXPORT_MODEL_PATH
+    data_subdir = sys.argv[2] if len(sys.argv) > 2 else None
+    if not os.path.exists(model_path):
+        print(f"Model 404 -> {model_path}")
+        sys.exit(1)
+    if export(model_path, data_subdir):
+        sys.exit(1)
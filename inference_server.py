@@ -0,0 +1,175 @@
+import multiprocessing
+import queue
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+# One evaluator process owns the model. Self-play workers write leaf boards into
+# their own slot of a shared-memory block, push (slot, n) on the request queue and
+# block on their response queue until the evaluator has written policy/value back
+# (or sent the error the model raised).
+
+def _attach_arrays(shm_names, num_slots, max_leaves):
+    blocks = [shared_memory.SharedMemory(name=name) for name in shm_names]
+    boards = np.ndarray((num_slots, max_leaves, 64), dtype=np.int8, buffer=blocks[0].buf)
+    players = np.ndarray((num_slots, max_leaves), dtype=np.int32, buffer=blocks[1].buf)
+    policies = np.ndarray((num_slots, max_leaves, 64), dtype=np.float32, buffer=blocks[2].buf)
+    values = np.ndarray((num_slots, max_leaves), dtype=np.float32, buffer=blocks[3].buf)
+    return blocks, boards, players, policies, values
+
+def _evaluator_main(model_path, spec, max_batch_size, max_wait_ms, ready_event):
+    from evaluators import load_evaluator
+
+    shm_names, num_slots, max_leaves, request_queue, response_queues, _ = spec
+    blocks, boards, players, policies, values = _attach_arrays(shm_names, num_slots, max_leaves)
+    evaluator = load_evaluator(model_path)
+    evaluator.warmup(max_batch_size)
+    ready_event.set()
+
+    max_wait = max_wait_ms / 1000.0
+    total_batches = 0
+    total_evals = 0
+    running = True
+    while running:
+        request = request_queue.get()
+        if request is None:
+            break
+
+        pending = [request]
+        num_leaves = request[1]
+        deadline = time.monotonic() + max_wait
+        while num_leaves < max_batch_size and len(pending) < num_slots:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = request_queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                running = False
+                break
+            pending.append(request)
+            num_leaves += request[1]
+
+        board_batch = np.concatenate([boards[slot, :n] for slot, n in pending])
+        player_batch = np.concatenate([players[slot, :n] for slot, n in pending])
+        try:
+            policy_batch, value_batch = evaluator._predict_internal_cpp(board_batch, player_batch)
+            policy_batch = np.asarray(policy_batch)
+            value_batch = np.asarray(value_batch)
+        except Exception as e:
+            # The waiting workers get the error instead of blocking forever; the
+            # evaluator keeps serving the next batch.
+            error = f"{type(e).__name__}: {e}"
+            print(f"Evaluator: batch of {num_leaves} failed ({error})")
+            for slot, _ in pending:
+                response_queues[slot].put(error)
+            continue
+
+        offset = 0
+        for slot, n in pending:
+            policies[slot, :n] = policy_batch[offset:offset + n]
+            values[slot, :n] = value_batch[offset:offset + n]
+            offset += n
+            response_queues[slot].put(True)
+
+        total_batches += 1
+        total_evals += num_leaves
+
+    if total_batches > 0:
+        print(f"Evaluator: {total_evals} evals in {total_batches} batches (ave batch {total_evals / total_batches:.1f})")
+    del boards, players, policies, values
+    for block in blocks:
+        block.close()
+
+class InferenceServer:
+    def __init__(self, model_path, num_slots, max_leaves, max_batch_size=256, max_wait_ms=5.0):
+        self.model_path = model_path
+        self.num_slots = num_slots
+        self.max_leaves = max_leaves
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._ctx = multiprocessing.get_context("spawn")
+
+        board_bytes = num_slots * max_leaves * 64
+        self._blocks = [
+            shared_memory.SharedMemory(create=True, size=board_bytes),
+            shared_memory.SharedMemory(create=True, size=num_slots * max_leaves * 4),
+            shared_memory.SharedMemory(create=True, size=board_bytes * 4),
+            shared_memory.SharedMemory(create=True, size=num_slots * max_leaves * 4),
+        ]
+        self._request_queue = self._ctx.Queue()
+        self._response_queues = [self._ctx.SimpleQueue() for _ in range(num_slots)]
+        self._free_slots = self._ctx.Queue()
+        for slot in range(num_slots):
+            self._free_slots.put(slot)
+        self._process = None
+
+    def client_spec(self):
+        return (
+            [block.name for block in self._blocks],
+            self.num_slots,
+            self.max_leaves,
+            self._request_queue,
+            self._response_queues,
+            self._free_slots,
+        )
+
+    def start(self):
+        ready_event = self._ctx.Event()
+        self._process = self._ctx.Process(
+            target=_evaluator_main,
+            args=(self.model_path, self.client_spec(), self.max_batch_size, self.max_wait_ms, ready_event),
+            daemon=True,
+        )
+        self._process.start()
+        while not ready_event.wait(timeout=1.0):
+            if not self._process.is_alive():
+                self.stop()
+                raise RuntimeError(f"Evaluator process failed to load model <- {self.model_path}")
+        print(f"Evaluator ready <- {self.model_path} (max batch {self.max_batch_size}, wait {self.max_wait_ms}ms)")
+
+    def stop(self):
+        if self._process is not None:
+            if self._process.is_alive():
+                self._request_queue.put(None)
+            self._process.join()
+            self._process = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+class InferenceClient:
+    def __init__(self, spec):
+        shm_names, num_slots, max_leaves, request_queue, response_queues, free_slots = spec
+        self._blocks, boards, players, policies, values = _attach_arrays(shm_names, num_slots, max_leaves)
+        self.max_leaves = max_leaves
+        self.slot = free_slots.get()
+        self._boards = boards[self.slot]
+        self._players = players[self.slot]
+        self._policies = policies[self.slot]
+        self._values = values[self.slot]
+        self._request_queue = request_queue
+        self._response_queue = response_queues[self.slot]
+
+    def _predict_internal_cpp(self, board_batch, player_batch):
+        board_batch = np.asarray(board_batch, dtype=np.int8).reshape(-1, 64)
+        n = board_batch.shape[0]
+        if n > self.max_leaves:
+            raise ValueError(f"Batch of {n} leaves exceeds slot capacity {self.max_leaves}")
+        self._boards[:n] = board_batch
+        self._players[:n] = player_batch
+        self._request_queue.put((self.slot, n))
+        response = self._response_queue.get()
+        if response is not True:
+            raise RuntimeError(f"Evaluator failed: {response}")
+        return self._policies[:n].copy(), self._values[:n].copy()
@@ -0,0 +1,210 @@
+import os
+import sys
+import time
+import queue
+import socket
+import struct
+import threading
+import numpy as np
+from config import MODEL_DAEMON_SOCKET, MODEL_DAEMON_BACKEND, INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_WAIT_MS
+from evaluators import Evaluator, model_cache_key
+
+# Keeps models warm for the CLI tools (`--daemon`) and serves policy/value over a
+# Unix socket. Wire format, little-endian:
+#   request:  u8 op, u16 path length, u32 n | model path (utf-8) | n*64 int8 boards | n int8 players
+#   response: u8 status, u32 n | n*64 float32 policy | n float32 value
+#             (status 1: n is the length of a utf-8 error message that follows)
+# Requests of all connected clients are merged into shared batches per model.
+
+OP_PREDICT = 1
+STATUS_OK = 0
+STATUS_ERROR = 1
+REQUEST_HEADER = struct.Struct('<BHI')
+RESPONSE_HEADER = struct.Struct('<BI')
+# Largest request accepted (about 4 MiB of payload); a larger n closes the
+# connection before anything is allocated for it.
+MAX_REQUEST_POSITIONS = 1 << 16
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if n == 0:
+            raise ConnectionError("Connection closed")
+        received += n
+    return buffer
+
+class _Request:
+    def __init__(self, model_path, boards, players):
+        self.model_path = model_path
+        self.boards = boards
+        self.players = players
+        self.done = threading.Event()
+        self.policy = None
+        self.value = None
+        self.error = None
+
+class ModelDaemon:
+    def __init__(self, socket_path=MODEL_DAEMON_SOCKET, backend=MODEL_DAEMON_BACKEND,
+                 max_batch_size=INFERENCE_MAX_BATCH_SIZE, max_wait_ms=INFERENCE_MAX_WAIT_MS):
+        self.socket_path = socket_path
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._requests = queue.Queue()
+        self._models = {}
+        self._total_evals = 0
+        self._total_batches = 0
+
+    def _model(self, model_path):
+        key = (os.path.abspath(model_path), os.path.getmtime(model_path))
+        evaluator = self._models.get(key)
+        if evaluator is None:
+            from evaluators import load_evaluator
+            start_time = time.perf_counter()
+            evaluator = load_evaluator(model_path, self.backend)
+            self._models = {k: v for k, v in self._models.items() if k[0] != key[0]}
+            self._models[key] = evaluator
+            print(f"Model loaded <- {model_path} ({self.backend}, {time.perf_counter() - start_time:.2f}s)")
+        return evaluator
+
+    def _evaluate(self, pending):
+        groups = {}
+        for request in pending:
+            groups.setdefault(request.model_path, []).append(request)
+        for model_path, requests in groups.items():
+            try:
+                evaluator = self._model(model_path)
+                board_batch = np.concatenate([request.boards for request in requests])
+                player_batch = np.concatenate([request.players for request in requests])
+                policy_batch, value_batch = evaluator._predict_internal_cpp(board_batch, player_batch)
+                policy_batch = np.asarray(policy_batch, dtype=np.float32)
+                value_batch = np.asarray(value_batch, dtype=np.float32).reshape(-1)
+                offset = 0
+                for request in requests:
+                    n = len(request.boards)
+                    request.policy = policy_batch[offset:offset + n]
+                    request.value = value_batch[offset:offset + n]
+                    offset += n
+                self._total_evals += len(board_batch)
+                self._total_batches += 1
+            except Exception as e:
+                for request in requests:
+                    request.error = f"{type(e).__name__}: {e}"
+            for request in requests:
+                request.done.set()
+
+    def _evaluator_loop(self):
+        while True:
+            pending = [self._requests.get()]
+            num_positions = len(pending[0].boards)
+            deadline = time.monotonic() + self.max_wait
+            while num_positions < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                pending.append(request)
+                num_positions += len(request.boards)
+            self._evaluate(pending)
+
+    def _serve_client(self, conn):
+        with conn:
+            try:
+                while True:
+                    op, path_length, n = REQUEST_HEADER.unpack(_recv_exact(conn, REQUEST_HEADER.size))
+                    if n > MAX_REQUEST_POSITIONS:
+                        self._send_error(conn, f"Request of {n} positions exceeds the limit of {MAX_REQUEST_POSITIONS}")
+                        return
+                    model_path = _recv_exact(conn, path_length).decode('utf-8')
+                    payload = _recv_exact(conn, n * 65)
+                    if op != OP_PREDICT:
+                        self._send_error(conn, f"Unknown op {op}")
+                        continue
+                    boards = np.frombuffer(payload, dtype=np.int8, count=n * 64).reshape(n, 64)
+                    players = np.frombuffer(payload, dtype=np.int8, offset=n * 64).astype(np.int32)
+                    request = _Request(model_path, boards, players)
+                    self._requests.put(request)
+                    request.done.wait()
+                    if request.error is not None:
+                        self._send_error(conn, request.error)
+                        continue
+                    conn.sendall(RESPONSE_HEADER.pack(STATUS_OK, n) + request.policy.tobytes() + request.value.tobytes())
+            except ConnectionError:
+                pass
+
+    def _send_error(self, conn, message):
+        message = message.encode('utf-8')
+        conn.sendall(RESPONSE_HEADER.pack(STATUS_ERROR, len(message)) + message)
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                    probe.connect(self.socket_path)
+                raise RuntimeError(f"A model daemon is already listening on {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+
+        threading.Thread(target=self._evaluator_loop, daemon=True).start()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen()
+        print(f"Model daemon listening on {self.socket_path} ({self.backend}, max batch {self.max_batch_size}, wait {self.max_wait * 1000:.1f}ms)")
+        try:
+            while True:
+                conn, _ = server.accept()
+                threading.Thread(target=self._serve_client, args=(conn,), daemon=True).start()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.close()
+            os.unlink(self.socket_path)
+            if self._total_batches > 0:
+                print(f"Model daemon: {self._total_evals} evals in {self._total_batches} batches (ave batch {self._total_evals / self._total_batches:.1f})")
+
+class DaemonClient(Evaluator):
+    def __init__(self, model_path, socket_path=MODEL_DAEMON_SOCKET):
+        self.model_path = os.path.abspath(model_path)
+        self.cache_key = model_cache_key(model_path, 'daemon')
+        self._path_bytes = self.model_path.encode('utf-8')
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self._sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            self._sock.close()
+            raise ConnectionError(f"No model daemon on {socket_path}, start it with `python model_daemon.py`")
+
+    def _predict_internal_cpp(self, board_batch, player_batch):
+        boards = np.ascontiguousarray(board_batch, dtype=np.int8).reshape(-1, 64)
+        players = np.ascontiguousarray(player_batch, dtype=np.int8).reshape(-1)
+        n = boards.shape[0]
+        if n > MAX_REQUEST_POSITIONS:
+            raise ValueError(f"Batch of {n} positions exceeds the daemon limit of {MAX_REQUEST_POSITIONS}")
+        self._sock.sendall(REQUEST_HEADER.pack(OP_PREDICT, len(self._path_bytes), n) + self._path_bytes + boards.tobytes() + players.tobytes())
+        status, size = RESPONSE_HEADER.unpack(_recv_exact(self._sock, RESPONSE_HEADER.size))
+        if status != STATUS_OK:
+            raise RuntimeError(f"Model daemon: {_recv_exact(self._sock, size).decode('utf-8')}")
+        payload = _recv_exact(self._sock, size * 65 * 4)
+        policy = np.frombuffer(payload, dtype=np.float32, count=size * 64).reshape(size, 64)
+        value = np.frombuffer(payload, dtype=np.float32, offset=size * 64 * 4)
+        return policy, value
+
+    # Planes only encode side to move vs. opponent, so they map back to boards
+    # with the side to move as player 1.
+    def _predict_planes_cpp(self, planes):
+        planes = np.asarray(planes)
+        boards = (planes[..., 0] + 2 * planes[..., 1]).astype(np.int8).reshape(-1, 64)
+        return self._predict_internal_cpp(boards, np.ones(len(boards), dtype=np.int8))
+
+    def close(self):
+        self._sock.close()
+
+if __name__ == "__main__":
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else MODEL_DAEMON_SOCKET
+    ModelDaemon(socket_path).serve_forever()
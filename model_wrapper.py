@@ -0,0 +1,58 @@
+import os
+import tensorflow as tf
+
+gpus = tf.config.experimental.list_physical_devices('GPU')
+if gpus:
+    try:
+        for gpu in gpus:
+            tf.config.experimental.set_memory_growth(gpu, True)
+        logical_gpus = tf.config.experimental.list_logical_devices('GPU')
+        print(len(gpus), "Physical GPUs,", len(logical_gpus), "Logical GPUs")
+    except RuntimeError as e:
+        print(e)
+
+def board_to_input_planes_tf(board_1d_batch_tf, current_player_batch_tf):
+    batch_size = tf.shape(board_1d_batch_tf)[0]
+    player_plane = tf.zeros((batch_size, 8, 8), dtype=tf.float32)
+    opponent_plane = tf.zeros((batch_size, 8, 8), dtype=tf.float32)
+    board_2d_batch_tf = tf.reshape(board_1d_batch_tf, (batch_size, 8, 8))
+    current_player_batch_expanded = tf.expand_dims(tf.expand_dims(current_player_batch_tf, -1), -1)
+    current_player_mask = tf.cast(tf.equal(board_2d_batch_tf, current_player_batch_expanded), tf.float32)
+    opponent_player_mask = tf.cast(tf.equal(board_2d_batch_tf, 3 - current_player_batch_expanded), tf.float32)
+
+    player_plane += current_player_mask
+    opponent_plane += opponent_player_mask
+
+    return tf.stack([player_plane, opponent_plane], axis=-1)
+
+class ModelWrapper:
+    def __init__(self, model_path):
+        self.model = tf.keras.models.load_model(model_path, compile=False)
+        self.cache_key = hash((os.path.abspath(model_path), os.path.getmtime(model_path))) & 0xffffffffffffffff
+        self._predict_internal_cpp = tf.function(
+            self._predict_for_cpp,
+            input_signature=[
+                tf.TensorSpec(shape=[None, 64], dtype=tf.int8),
+                tf.TensorSpec(shape=[None], dtype=tf.int32)
+            ]
+        )
+        self._predict_planes_cpp = tf.function(
+            self._predict_from_planes,
+            input_signature=[tf.TensorSpec(shape=[None, 8, 8, 2], dtype=tf.float32)]
+        )
+
+    def warmup(self, batch_size):
+        board_batch = tf.zeros((batch_size, 64), dtype=tf.int8)
+        player_batch = tf.ones((batch_size,), dtype=tf.int32)
+        self._predict_internal_cpp(board_batch, player_batch)
+        self._predict_planes_cpp(tf.zeros((batch_size, 8, 8, 2), dtype=tf.float32))
+
+    def _predict_for_cpp(self, board_batch_tensor, player_batch_tensor):
+        input_planes_batch = board_to_input_planes_tf(tf.cast(board_batch_tensor, tf.int32), tf.cast(player_batch_tensor, tf.int32))
+
+        policy, value = self.model(input_planes_batch, training=False)
+        return policy, tf.squeeze(value, axis=-1)
+
+    def _predict_from_planes(self, input_planes_batch):
+        policy, value = self.model(input_planes_batch, training=False)
+        return policy, tf.squeeze(value, axis=-1)
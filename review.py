@@ -1,23 +1,16 @@
+import sys
 import numpy as np
 import random
-import tensorflow as tf
-from config import R_SIMS_N, C_PUCT, Model_Path, Play_Games_Num
+from config import R_SIMS_N, C_PUCT, Model_Path, Play_Games_Num, EVAL_CACHE_SIZE, REVIEW_BACKEND
 import math
 from reversi_bitboard_cpp import ReversiBitboard
+from evaluators import load_evaluator, planes_from_boards
+from reversi_mcts_cpp import eval_cache
 
 NUM_GAMES_TO_PLAY = Play_Games_Num
 MCTS_SIMS_PER_MOVE = R_SIMS_N
 MODEL_PATH = Model_Path
-
-def board_to_input_planes_tf(board_1d_tf, current_player_tf):
-    player_plane = tf.zeros((8, 8), dtype=tf.float32)
-    opponent_plane = tf.zeros((8, 8), dtype=tf.float32)
-    board_2d_tf = tf.reshape(board_1d_tf, (8, 8))
-    current_player_mask = tf.cast(tf.equal(board_2d_tf, current_player_tf), tf.float32)
-    opponent_player_mask = tf.cast(tf.equal(board_2d_tf, 3 - current_player_tf), tf.float32)
-    player_plane += current_player_mask
-    opponent_plane += opponent_player_mask
-    return tf.stack([player_plane, opponent_plane], axis=-1)
+BACKEND = 'daemon' if '--daemon' in sys.argv else REVIEW_BACKEND
 
 def print_board_from_numpy(board_1d):
     print("  0 1 2 3 4 5 6 7")
@@ -66,25 +59,15 @@ class MCTS:
     def __init__(self, model, c_puct=C_PUCT):
         self.model = model
         self.c_puct = c_puct
-        self._predict_graph = tf.function(
-            self._predict_internal,
-            input_signature=[
-                tf.TensorSpec(shape=[64], dtype=tf.int8),
-                tf.TensorSpec(shape=(), dtype=tf.int8)
-            ]
-        )
-
-    def _predict_internal(self, board_tensor, player_tensor):
-        input_planes = board_to_input_planes_tf(board_tensor, player_tensor)
-        input_tensor_batch = tf.expand_dims(input_planes, axis=0)
-        policy, value = self.model(input_tensor_batch, training=False)
-        return policy[0], value[0][0]
-
-    def _predict(self, board, player):
-        board_tensor = tf.convert_to_tensor(board, dtype=tf.int8)
-        player_tensor = tf.convert_to_tensor(player, dtype=tf.int8)
-        policy, value = self._predict_graph(board_tensor, player_tensor)
-        return policy.numpy(), value.numpy()
+
+    def _predict(self, game_board, player):
+        cached = eval_cache.lookup(self.model.cache_key, game_board.black_board, game_board.white_board, player)
+        if cached is not None:
+            return cached
+        policy, value = self.model._predict_planes_cpp(planes_from_boards(game_board.board_to_numpy(), player))
+        policy, value = np.asarray(policy)[0], float(np.asarray(value)[0])
+        eval_cache.insert(self.model.cache_key, game_board.black_board, game_board.white_board, player, policy, value)
+        return policy, value
 
     def search(self, game_board: ReversiBitboard, player, num_simulations):
         self.root = MCTSNode(game_board, player)
@@ -109,7 +92,7 @@ class MCTS:
             if not sim_game_board.is_game_over():
                 valid_moves = sim_game_board.get_legal_moves()
                 if valid_moves:
-                    policy, value = self._predict(sim_game_board.board_to_numpy(), sim_player)
+                    policy, value = self._predict(sim_game_board, sim_player)
                     masked_policy = {move: policy[move] for move in valid_moves}
                     policy_sum = sum(masked_policy.values())
                     if policy_sum > 0:
@@ -130,7 +113,7 @@ class MCTS:
                 else:
                     pass_player = 3 - sim_player
                     if sim_game_board.get_legal_moves():
-                        _, value = self._predict(sim_game_board.board_to_numpy(), pass_player)
+                        _, value = self._predict(sim_game_board, pass_player)
                         value = -value
                     else:
                         winner = sim_game_board.get_winner()
@@ -191,8 +174,9 @@ def play_game(mcts_ai, random_ai, mcts_player_is_black):
 
 if __name__ == "__main__":
     print("--- AI vs Random bot ---")
+    eval_cache.resize(EVAL_CACHE_SIZE)
     try:
-        model = tf.keras.models.load_model(MODEL_PATH, compile=False)
+        model = load_evaluator(MODEL_PATH, BACKEND)
         print(f"Model loaded <- {MODEL_PATH}")
         mcts_ai = MCTS(model)
     except Exception as e:
@@ -250,4 +234,6 @@ if __name__ == "__main__":
     if all_mcts_q_values:
         print(f"AI average Q value: {np.mean(all_mcts_q_values):.4f}")
     else:
-        print("No Q value data for AI.")
\ No newline at end of file
+        print("No Q value data for AI.")
+    if eval_cache.enabled:
+        print(f"Eval cache: {eval_cache.stats()}")
\ No newline at end of file
@@ -2,29 +2,26 @@ import sys
 import os
 import random
 import numpy as np
-import tensorflow as tf
 import math
 from reversi_bitboard_cpp import ReversiBitboard
+from evaluators import load_evaluator, planes_from_boards
+from reversi_mcts_cpp import MCTS as MCTS_CPP, eval_cache
 from config import (
     R_SIMS_N,
+    R_SEARCH_THREADS,
+    R_SEARCH_BATCH_SIZE,
+    R_TIME_LIMIT,
     Model_Path,
-    C_PUCT
+    C_PUCT,
+    EVAL_CACHE_SIZE,
+    REVIEW_BACKEND
 )
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__))))
 
 MCTS_SIMS_PER_MOVE = R_SIMS_N
 MODEL_PATH = Model_Path
-
-def board_to_input_planes_tf(board_1d_tf, current_player_tf):
-    player_plane = tf.zeros((8, 8), dtype=tf.float32)
-    opponent_plane = tf.zeros((8, 8), dtype=tf.float32)
-    board_2d_tf = tf.reshape(board_1d_tf, (8, 8))
-    current_player_mask = tf.cast(tf.equal(board_2d_tf, current_player_tf), tf.float32)
-    opponent_player_mask = tf.cast(tf.equal(board_2d_tf, 3 - current_player_tf), tf.float32)
-    player_plane += current_player_mask
-    opponent_plane += opponent_player_mask
-    return tf.stack([player_plane, opponent_plane], axis=-1)
+BACKEND = 'daemon' if '--daemon' in sys.argv else REVIEW_BACKEND
 
 class MCTSNode:
     def __init__(self, game_board: ReversiBitboard, player, parent=None, move=None, prior_p=0.0):
@@ -55,25 +52,15 @@ class MCTS:
     def __init__(self, model, c_puct=C_PUCT):
         self.model = model
         self.c_puct = c_puct
-        self._predict_graph = tf.function(
-            self._predict_internal,
-            input_signature=[
-                tf.TensorSpec(shape=[64], dtype=tf.int8),
-                tf.TensorSpec(shape=(), dtype=tf.int8)
-            ]
-        )
-
-    def _predict_internal(self, board_tensor, player_tensor):
-        input_planes = board_to_input_planes_tf(board_tensor, player_tensor)
-        input_tensor_batch = tf.expand_dims(input_planes, axis=0)
-        policy, value = self.model(input_tensor_batch, training=False)
-        return policy[0], value[0][0]
-
-    def _predict(self, board, player):
-        board_tensor = tf.convert_to_tensor(board, dtype=tf.int8)
-        player_tensor = tf.convert_to_tensor(player, dtype=tf.int8)
-        policy, value = self._predict_graph(board_tensor, player_tensor)
-        return policy.numpy(), value.numpy()
+
+    def _predict(self, game_board, player):
+        cached = eval_cache.lookup(self.model.cache_key, game_board.black_board, game_board.white_board, player)
+        if cached is not None:
+            return cached
+        policy, value = self.model._predict_planes_cpp(planes_from_boards(game_board.board_to_numpy(), player))
+        policy, value = np.asarray(policy)[0], float(np.asarray(value)[0])
+        eval_cache.insert(self.model.cache_key, game_board.black_board, game_board.white_board, player, policy, value)
+        return policy, value
 
     def search(self, game_board: ReversiBitboard, player, num_simulations):
         self.root = MCTSNode(game_board, player)
@@ -98,7 +85,7 @@ class MCTS:
             if not sim_game_board.is_game_over():
                 valid_moves = sim_game_board.get_legal_moves()
                 if valid_moves:
-                    policy, value = self._predict(sim_game_board.board_to_numpy(), sim_player)
+                    policy, value = self._predict(sim_game_board, sim_player)
                     masked_policy = {move: policy[move] for move in valid_moves}
                     policy_sum = sum(masked_policy.values())
                     if policy_sum > 0:
@@ -119,7 +106,7 @@ class MCTS:
                 else:
                     pass_player = 3 - sim_player
                     if sim_game_board.get_legal_moves():
-                        _, value = self._predict(sim_game_board.board_to_numpy(), pass_player)
+                        _, value = self._predict(sim_game_board, pass_player)
                         value = -value
                     else:
                         winner = sim_game_board.get_winner()
@@ -139,6 +126,28 @@ class MCTS:
         return best_move, self.root.children[best_move].n_visits, self.root.children[best_move].q_value
 
 
+class ThreadedMCTS:
+    def __init__(self, model_path, num_threads, c_puct=C_PUCT, time_limit=R_TIME_LIMIT):
+        self.model = load_evaluator(model_path, BACKEND)
+        self.mcts = MCTS_CPP(self.model, c_puct, batch_size=R_SEARCH_BATCH_SIZE, num_threads=num_threads)
+        self.time_limit = time_limit
+
+    def search(self, game_board: ReversiBitboard, player, num_simulations):
+        if self.time_limit > 0:
+            root = self.mcts.search(game_board, player, 0, time_limit=self.time_limit, progress=self._progress, progress_interval=0.5)
+            print(f"\r{self.mcts.simulations_done} sims in {self.time_limit:.1f}s" + " " * 20)
+        else:
+            root = self.mcts.search(game_board, player, num_simulations)
+        children = root.children
+        if not children:
+            return None, 0, 0
+        best_move = max(children.keys(), key=lambda move: children[move].n_visits)
+        return best_move, children[best_move].n_visits, children[best_move].q_value
+
+    @staticmethod
+    def _progress(simulations, elapsed, best_move):
+        print(f"\r{elapsed:.1f}s {simulations} sims, best {index_to_coord(best_move)}", end='', flush=True)
+
 def print_board(board_1d):
     print("  A B C D E F G H")
     for r in range(8):
@@ -195,6 +204,7 @@ def index_to_coord(index):
     return f"{chr(ord('A') + col)}{row + 1}"
 
 def main():
+    eval_cache.resize(EVAL_CACHE_SIZE)
     game_board = ReversiBitboard()
 
     human_player = random.choice([1, 2])
@@ -207,9 +217,12 @@ def main():
     current_player = 1
 
     try:
-        model = tf.keras.models.load_model(MODEL_PATH)
+        if R_SEARCH_THREADS > 0:
+            mcts_ai = ThreadedMCTS(MODEL_PATH, R_SEARCH_THREADS)
+        else:
+            model = load_evaluator(MODEL_PATH, BACKEND)
+            mcts_ai = MCTS(model)
         print(f"Model loaded <- {MODEL_PATH}")
-        mcts_ai = MCTS(model)
     except Exception as e:
         print(f"Error while loading model {e}")
         sys.exit(1)
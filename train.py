@@ -1,5 +1,4 @@
 import numpy as np
-import tensorflow as tf
 import math
 import random
 import time
@@ -8,8 +7,10 @@ import msgpack
 import multiprocessing
 import json
 
-from reversi_bitboard_cpp import ReversiBitboard
-from reversi_mcts_cpp import MCTS as MCTS_CPP
+from reversi_bitboard_cpp import ReversiBitboard, EndgameSolver
+from reversi_mcts_cpp import MCTS as MCTS_CPP, search_lockstep, eval_cache
+from evaluators import load_evaluator
+from inference_server import InferenceServer, InferenceClient
 
 def _print_numpy_board(board_1d):
     print("  0 1 2 3 4 5 6 7")
@@ -24,19 +25,11 @@ def _print_numpy_board(board_1d):
         print(row_str)
     print("-----------------")
 
-gpus = tf.config.experimental.list_physical_devices('GPU')
-if gpus:
-    try:
-        for gpu in gpus:
-            tf.config.experimental.set_memory_growth(gpu, True)
-        logical_gpus = tf.config.experimental.list_logical_devices('GPU')
-        print(len(gpus), "Physical GPUs,", len(logical_gpus), "Logical GPUs")
-    except RuntimeError as e:
-        print(e)
-
 from config import (
     NUM_PARALLEL_GAMES,
     SIMS_N,
+    PLAYOUT_CAP_FULL_PROBABILITY,
+    PLAYOUT_CAP_FAST_SIMS,
     C_PUCT,
     TOTAL_GAMES,
     TRAINING_HOURS,
@@ -44,111 +37,292 @@ from config import (
     CURRENT_GENERATION_DATA_SUBDIR,
     SAVE_DATA_EVERY_N_GAMES,
     SELF_PLAY_MODEL_PATH,
-    MCTS_PREDICT_BATCH_SIZE
+    MCTS_PREDICT_BATCH_SIZE,
+    MCTS_VIRTUAL_LOSS,
+    MCTS_TT_SIZE,
+    MCTS_TT_SHARE_STATS,
+    MCTS_EARLY_STOP,
+    MCTS_GUMBEL_ACTIONS,
+    EVAL_CACHE_SIZE,
+    SELF_PLAY_MODE,
+    INFERENCE_MAX_BATCH_SIZE,
+    INFERENCE_MAX_WAIT_MS,
+    LOCKSTEP_GAMES,
+    ENDGAME_SOLVER_EMPTIES
 )
 
-def board_to_input_planes_tf(board_1d_batch_tf, current_player_batch_tf):
-    batch_size = tf.shape(board_1d_batch_tf)[0]
-    player_plane = tf.zeros((batch_size, 8, 8), dtype=tf.float32)
-    opponent_plane = tf.zeros((batch_size, 8, 8), dtype=tf.float32)
-    board_2d_batch_tf = tf.reshape(board_1d_batch_tf, (batch_size, 8, 8))
-    current_player_batch_expanded = tf.expand_dims(tf.expand_dims(current_player_batch_tf, -1), -1)
-    current_player_mask = tf.cast(tf.equal(board_2d_batch_tf, current_player_batch_expanded), tf.float32)
-    opponent_player_mask = tf.cast(tf.equal(board_2d_batch_tf, 3 - current_player_batch_expanded), tf.float32)
-
-    player_plane += current_player_mask
-    opponent_plane += opponent_player_mask
-
-    return tf.stack([player_plane, opponent_plane], axis=-1)
-
-class ModelWrapper:
-    def __init__(self, model_path):
-        self.model = tf.keras.models.load_model(model_path, compile=False)
-        self._predict_internal_cpp = tf.function(
-            self._predict_for_cpp,
-            input_signature=[
-                tf.TensorSpec(shape=[None, 64], dtype=tf.int8),
-                tf.TensorSpec(shape=[None], dtype=tf.int32)
-            ]
-        )
+# TensorFlow is only imported where a model is actually loaded, so that
+# spawned workers in "server" mode stay free of the TF runtime.
+_inference_client = None
+_model_cache = {}
+_endgame_solver = None
+
+def _init_self_play_worker(server_spec, preload_model_path=None):
+    global _inference_client
+    eval_cache.resize(EVAL_CACHE_SIZE)
+    if server_spec is not None:
+        _inference_client = InferenceClient(server_spec)
+    if preload_model_path is not None:
+        start_time = time.perf_counter()
+        _get_cached_model(preload_model_path)
+        print(f"Worker {os.getpid()}: Model warmed up in {time.perf_counter() - start_time:.2f}s")
+
+def _get_cached_model(model_path):
+    key = (os.path.abspath(model_path), os.path.getmtime(model_path))
+    model_wrapper = _model_cache.get(key)
+    if model_wrapper is None:
+        _model_cache.clear()
+        model_wrapper = load_evaluator(model_path)
+        model_wrapper.warmup(MCTS_PREDICT_BATCH_SIZE)
+        _model_cache[key] = model_wrapper
+    return model_wrapper
+
+def _load_evaluator(model_path):
+    if _inference_client is not None:
+        return _inference_client
+    if SELF_PLAY_MODE == 'persistent':
+        return _get_cached_model(model_path)
+    return load_evaluator(model_path)
+
+def _new_mcts(model_wrapper, c_puct):
+    return MCTS_CPP(
+        model_wrapper,
+        c_puct=c_puct,
+        batch_size=MCTS_PREDICT_BATCH_SIZE,
+        virtual_loss=MCTS_VIRTUAL_LOSS,
+        tt_size=MCTS_TT_SIZE,
+        tt_share_stats=MCTS_TT_SHARE_STATS,
+        endgame_empties=ENDGAME_SOLVER_EMPTIES,
+        gumbel_actions=MCTS_GUMBEL_ACTIONS
+    )
+
+def _in_endgame(game_board):
+    empties = 64 - game_board.count_set_bits(game_board.black_board | game_board.white_board)
+    return ENDGAME_SOLVER_EMPTIES > 0 and empties <= ENDGAME_SOLVER_EMPTIES
+
+# Plays the rest of the game with the exact solver. Recorded moves get the
+# solver's move as policy and the exact result as value.
+def _play_out_endgame(game_board, game_history):
+    global _endgame_solver
+    if _endgame_solver is None:
+        _endgame_solver = EndgameSolver()
+    while not game_board.is_game_over():
+        if not game_board.get_legal_moves():
+            game_board.apply_move(-1)
+            continue
+        result = _endgame_solver.solve(game_board, False)
+        policy_target = np.zeros(64, dtype=np.float32)
+        policy_target[result.best_move] = 1.0
+        game_history.append({
+            'board': game_board.board_to_numpy().tolist(),
+            'player': game_board.current_player,
+            'policy': policy_target.tolist(),
+            'value': float(np.sign(result.score)),
+            'exact': True
+        })
+        game_board.apply_move(result.best_move)
+
+# Playout cap randomization: most moves can be played from a cheap search
+# without noise, played greedily; only the full searches are recorded.
+def _playout_cap(sims_n):
+    if PLAYOUT_CAP_FULL_PROBABILITY >= 1.0 or random.random() < PLAYOUT_CAP_FULL_PROBABILITY:
+        return sims_n, True
+    return PLAYOUT_CAP_FAST_SIMS, False
+
+# A Gumbel search already samples its move while the root noise is on, and is
+# trained on the improved policy instead of the visit counts.
+def _record_and_choose_move(mcts_ai, root_node, game_board, current_player, legal_moves, game_history, full_search=True):
+    if MCTS_GUMBEL_ACTIONS > 0:
+        policy_target = mcts_ai.improved_policy()
+        best_move = mcts_ai.best_move
+        if best_move not in legal_moves:
+            best_move = random.choice(legal_moves)
+    else:
+        visits = root_node.child_stats()['visits']
+        total_visits = visits.sum()
+        policy_target = visits / total_visits if total_visits > 0 else np.zeros(64)
+        if total_visits == 0:
+            best_move = random.choice(legal_moves)
+        elif full_search and len(game_board.history) < 30:
+            best_move = int(np.random.choice(64, p=policy_target))
+        else:
+            best_move = int(np.argmax(visits))
+
+    if full_search:
+        game_history.append({
+            'board': game_board.board_to_numpy().tolist(),
+            'player': current_player,
+            'policy': policy_target.astype(np.float32).tolist(),
+            'exact': False
+        })
+    return best_move
 
-    def _predict_for_cpp(self, board_batch_tensor, player_batch_tensor):
-        input_planes_batch = board_to_input_planes_tf(tf.cast(board_batch_tensor, tf.int32), tf.cast(player_batch_tensor, tf.int32))
-        
-        policy, value = self.model(input_planes_batch, training=False)
-        return policy, tf.squeeze(value, axis=-1)
+def _assign_game_values(game_history, winner):
+    for record in game_history:
+        if 'value' in record:
+            continue
+        if winner == 0:
+            record['value'] = 0.0
+        elif record['player'] == winner:
+            record['value'] = 1.0
+        else:
+            record['value'] = -1.0
 
 def run_self_play_game_worker(game_id, model_path, sims_n, c_puct):
     print(f"G{game_id}: Game start")
+    game_start_time = time.perf_counter()
     seed = (os.getpid() + int(time.time() * 1000) + game_id) % (2**32)
     random.seed(seed)
     np.random.seed(seed)
     
     try:
-        model_wrapper = ModelWrapper(model_path)
+        model_wrapper = _load_evaluator(model_path)
     except Exception as e:
         print(f"G{game_id}: Model load error: {e}")
         return None
+    load_time = time.perf_counter() - game_start_time
+    search_time = 0.0
+    simulations = 0
+    moves_played = 0
+    full_searches = 0
 
     game_board = ReversiBitboard()
     game_board.history = []
     current_player = 1
     game_board.current_player = current_player
 
-    mcts_ai = MCTS_CPP(model_wrapper, c_puct=c_puct, batch_size=MCTS_PREDICT_BATCH_SIZE)
+    mcts_ai = _new_mcts(model_wrapper, c_puct)
 
     game_history = []
 
     while not game_board.is_game_over():
+        if _in_endgame(game_board):
+            search_start_time = time.perf_counter()
+            _play_out_endgame(game_board, game_history)
+            search_time += time.perf_counter() - search_start_time
+            break
+
         legal_moves = game_board.get_legal_moves()
         if not legal_moves:
             game_board.apply_move(-1)
             current_player = game_board.current_player
             continue
 
-        add_noise = len(game_board.history) < 30
-        root_node = mcts_ai.search(game_board, current_player, sims_n, add_noise)
-
-        policy_target = np.zeros(64, dtype=np.float32)
-        if root_node.children:
-            total_visits = 0
-            for move, child in root_node.children.items():
-                total_visits += child.n_visits
-            if total_visits > 0:
-                for move, child in root_node.children.items():
-                    policy_target[move] = child.n_visits / total_visits
-
-        game_history.append({
-            'board': game_board.board_to_numpy().tolist(),
-            'player': current_player,
-            'policy': policy_target.tolist()
-        })
-
-        if len(game_board.history) < 30:
-            moves = list(root_node.children.keys())
-            visits = [child.n_visits for child in root_node.children.values()]
-            if sum(visits) == 0:
-                best_move = random.choice(legal_moves)
-            else:
-                probabilities = np.array(visits, dtype=np.float32) / sum(visits)
-                best_move = np.random.choice(moves, p=probabilities)
-        else:
-            best_move = max(root_node.children.items(), key=lambda item: item[1].n_visits)[0]
+        move_sims, full_search = _playout_cap(sims_n)
+        add_noise = full_search and len(game_board.history) < 30
+        search_start_time = time.perf_counter()
+        root_node = mcts_ai.search(game_board, current_player, move_sims, add_noise, early_stop=MCTS_EARLY_STOP)
+        search_time += time.perf_counter() - search_start_time
+        simulations += mcts_ai.simulations_done
+        moves_played += 1
+        full_searches += full_search
 
+        best_move = _record_and_choose_move(mcts_ai, root_node, game_board, current_player, legal_moves, game_history, full_search)
         game_board.apply_move(best_move)
         current_player = game_board.current_player
 
     winner = game_board.get_winner()
-    print(f"G{game_id}: Game finish, winner: {winner}")
-    for record in game_history:
-        if winner == 0:
-            record['value'] = 0.0
-        elif record['player'] == winner:
-            record['value'] = 1.0
-        else:
-            record['value'] = -1.0
-            
-    return game_history
+    total_time = time.perf_counter() - game_start_time
+    timing = {
+        'load': load_time,
+        'search': search_time,
+        'other': total_time - load_time - search_time,
+        'total': total_time
+    }
+    print(f"G{game_id}: Game finish, winner: {winner} "
+          f"(load {load_time:.2f}s, search {search_time:.2f}s, total {total_time:.2f}s, {simulations} sims, "
+          f"{full_searches}/{moves_played} full searches)")
+    _assign_game_values(game_history, winner)
+    return game_history, timing
+
+class _LockstepGame:
+    def __init__(self, game_id, model_wrapper, c_puct):
+        self.game_id = game_id
+        self.start_time = time.perf_counter()
+        self.search_time = 0.0
+        self.simulations = 0
+        self.moves_played = 0
+        self.full_searches = 0
+        self.full_search = True
+        self.game_board = ReversiBitboard()
+        self.game_board.history = []
+        self.game_board.current_player = 1
+        self.current_player = 1
+        self.mcts_ai = _new_mcts(model_wrapper, c_puct)
+        self.game_history = []
+
+def run_lockstep_self_play(model_path, total_games, num_lockstep_games, sims_n, c_puct):
+    seed = (os.getpid() + int(time.time() * 1000)) % (2**32)
+    random.seed(seed)
+    np.random.seed(seed)
+
+    eval_cache.resize(EVAL_CACHE_SIZE)
+    load_start_time = time.perf_counter()
+    model_wrapper = load_evaluator(model_path)
+    model_wrapper.warmup(num_lockstep_games * MCTS_PREDICT_BATCH_SIZE)
+    print(f"Lockstep: Model loaded in {time.perf_counter() - load_start_time:.2f}s, {num_lockstep_games} games per step")
+
+    games = []
+    next_game_id = 1
+    while True:
+        while len(games) < num_lockstep_games and (total_games <= 0 or next_game_id <= total_games):
+            print(f"G{next_game_id}: Game start")
+            games.append(_LockstepGame(next_game_id, model_wrapper, c_puct))
+            next_game_id += 1
+
+        for game in list(games):
+            if not game.game_board.is_game_over() and _in_endgame(game.game_board):
+                search_start_time = time.perf_counter()
+                _play_out_endgame(game.game_board, game.game_history)
+                game.search_time += time.perf_counter() - search_start_time
+            while not game.game_board.is_game_over() and not game.game_board.get_legal_moves():
+                game.game_board.apply_move(-1)
+                game.current_player = game.game_board.current_player
+            if game.game_board.is_game_over():
+                games.remove(game)
+                winner = game.game_board.get_winner()
+                total_time = time.perf_counter() - game.start_time
+                timing = {
+                    'load': 0.0,
+                    'search': game.search_time,
+                    'other': total_time - game.search_time,
+                    'total': total_time
+                }
+                print(f"G{game.game_id}: Game finish, winner: {winner} "
+                      f"(search {game.search_time:.2f}s, total {total_time:.2f}s, {game.simulations} sims, "
+                      f"{game.full_searches}/{game.moves_played} full searches)")
+                _assign_game_values(game.game_history, winner)
+                yield game.game_history, timing
+
+        if not games:
+            return
+
+        game_sims = []
+        for game in games:
+            move_sims, game.full_search = _playout_cap(sims_n)
+            game_sims.append(move_sims)
+
+        search_start_time = time.perf_counter()
+        root_nodes = search_lockstep(
+            model_wrapper,
+            [game.mcts_ai for game in games],
+            [game.game_board for game in games],
+            [game.current_player for game in games],
+            game_sims,
+            [game.full_search and len(game.game_board.history) < 30 for game in games],
+            MCTS_EARLY_STOP
+        )
+        search_share = (time.perf_counter() - search_start_time) / len(games)
+
+        for game, root_node in zip(games, root_nodes):
+            game.search_time += search_share
+            game.simulations += game.mcts_ai.simulations_done
+            game.moves_played += 1
+            game.full_searches += game.full_search
+            legal_moves = game.game_board.get_legal_moves()
+            best_move = _record_and_choose_move(game.mcts_ai, root_node, game.game_board, game.current_player, legal_moves, game.game_history, game.full_search)
+            game.game_board.apply_move(best_move)
+            game.current_player = game.game_board.current_player
 
 def _worker_wrapper(args):
     return run_self_play_game_worker(*args)
@@ -161,17 +335,42 @@ def train_model_main():
     generation_data_path = os.path.join(TRAINING_DATA_DIR, CURRENT_GENERATION_DATA_SUBDIR)
     os.makedirs(generation_data_path, exist_ok=True)
 
-    ctx = multiprocessing.get_context("spawn")
-    with ctx.Pool(NUM_PARALLEL_GAMES) as pool:
-        game_args = [(i + 1, SELF_PLAY_MODEL_PATH, SIMS_N, C_PUCT) for i in range(TOTAL_GAMES)]
+    inference_server = None
+    server_spec = None
+    if SELF_PLAY_MODE == 'server':
+        inference_server = InferenceServer(
+            SELF_PLAY_MODEL_PATH,
+            num_slots=NUM_PARALLEL_GAMES,
+            max_leaves=MCTS_PREDICT_BATCH_SIZE,
+            max_batch_size=INFERENCE_MAX_BATCH_SIZE,
+            max_wait_ms=INFERENCE_MAX_WAIT_MS
+        )
+        inference_server.start()
+        server_spec = inference_server.client_spec()
+
+    preload_model_path = SELF_PLAY_MODEL_PATH if SELF_PLAY_MODE == 'persistent' else None
+    timing_totals = {'load': 0.0, 'search': 0.0, 'other': 0.0, 'total': 0.0}
+
+    pool = None
+    try:
+        if SELF_PLAY_MODE == 'lockstep':
+            game_results = run_lockstep_self_play(SELF_PLAY_MODEL_PATH, TOTAL_GAMES, LOCKSTEP_GAMES, SIMS_N, C_PUCT)
+        else:
+            ctx = multiprocessing.get_context("spawn")
+            pool = ctx.Pool(NUM_PARALLEL_GAMES, initializer=_init_self_play_worker, initargs=(server_spec, preload_model_path))
+            game_args = [(i + 1, SELF_PLAY_MODEL_PATH, SIMS_N, C_PUCT) for i in range(TOTAL_GAMES)]
+            game_results = pool.imap_unordered(_worker_wrapper, game_args)
 
-        for game_history_result in pool.imap_unordered(_worker_wrapper, game_args):
-            if game_history_result is None:
+        for game_result in game_results:
+            if game_result is None:
                 print(f"Main process: Skiped game due to worker error.")
                 continue
 
+            game_history_result, timing = game_result
             game_results_buffer.extend(game_history_result)
             games_played += 1
+            for key in timing_totals:
+                timing_totals[key] += timing[key]
 
             if games_played > 0 and games_played % SAVE_DATA_EVERY_N_GAMES == 0:
                 data_filename = f"mcts_tree_{games_played}.msgpack"
@@ -187,8 +386,16 @@ def train_model_main():
             if TOTAL_GAMES > 0 and games_played >= TOTAL_GAMES:
                 print("Reaching finish games")
                 break
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+        if inference_server is not None:
+            inference_server.stop()
 
     print(f"Train finish, Games: {games_played}")
+    if games_played > 0:
+        print("Ave per game: " + ", ".join(f"{key} {value / games_played:.2f}s" for key, value in timing_totals.items()))
 
     if game_results_buffer:
         final_data_filename = f"mcts_tree_{games_played}.msgpack"